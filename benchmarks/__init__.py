@@ -0,0 +1,7 @@
+"""Benchmarks for pip_compile
+
+The benchmarks compile synthetic dependency graphs published in a local
+package index, so they run without network access and give comparable results
+across pip_compile versions. See :mod:`benchmarks.run` for running them.
+
+"""
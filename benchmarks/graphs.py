@@ -0,0 +1,210 @@
+"""Synthetic dependency graphs published as a local package index
+
+A graph maps package names to :class:`Package` objects. Each package is
+published in several versions with the same dependencies. Dependencies are
+unpinned, and the constraints file generated along with the index pins every
+package to its latest version, like a typical pip_compile setup.
+
+"""
+import base64
+import hashlib
+import io
+import os
+import random
+import tarfile
+import zipfile
+from collections import OrderedDict
+
+from pip.download import path_to_url
+
+from pip_compile.utils import ensure_dir
+
+SHAPES = ('wide', 'deep', 'diamond', 'sdist')
+
+
+class Package(object):
+    def __init__(self, name, dependencies=(), sdist=False):
+        """Describe a package of a synthetic graph
+
+        :param name: Name of the package
+        :param dependencies: Names of the packages it depends on
+        :param sdist: Publish the package as a source distribution instead of
+                      a wheel, which makes pip run ``setup.py egg_info``
+
+        """
+        self.name = name
+        self.dependencies = list(dependencies)
+        self.sdist = sdist
+
+
+def _names(size):
+    return ['pkg{}'.format(index) for index in range(size)]
+
+
+def generate(shape, size, seed=0):
+    """Generate a dependency graph
+
+    :param shape: One of :data:`SHAPES`:
+
+                  - ``wide``: one top-level package depending on all others
+                  - ``deep``: a chain where each package depends on the next
+                  - ``diamond``: layers in which each package depends on up to
+                    three packages of the next layer, so most packages are
+                    reached along several paths
+                  - ``sdist``: like ``wide``, but published as sdists
+    :param size: Number of packages
+    :param seed: Seed for the random choices of ``diamond``
+    :return: A mapping from names to packages. The first package is the only
+             top-level requirement.
+    :rtype: collections.OrderedDict
+
+    """
+    if shape not in SHAPES:
+        raise ValueError('Unknown graph shape {!r}'.format(shape))
+    if size < 1:
+        raise ValueError('A graph needs at least one package')
+    names = _names(size)
+    graph = OrderedDict()
+    if shape in ('wide', 'sdist'):
+        graph[names[0]] = Package(names[0], names[1:], sdist=shape == 'sdist')
+        for name in names[1:]:
+            graph[name] = Package(name, sdist=shape == 'sdist')
+    elif shape == 'deep':
+        for name, dependency in zip(names, names[1:] + [None]):
+            graph[name] = Package(name, [dependency] if dependency else [])
+    else:
+        rng = random.Random(seed)
+        width = max(1, int(size ** 0.5))
+        layers = [names[:1]] + [names[start:start + width]
+                                for start in range(1, size, width)]
+        for layer, next_layer in zip(layers, layers[1:] + [[]]):
+            for name in layer:
+                dependencies = rng.sample(next_layer, min(3, len(next_layer)))
+                graph[name] = Package(name, sorted(dependencies))
+        # Make sure every package is reachable from the top-level package
+        for layer, next_layer in zip(layers, layers[1:]):
+            reached = {dependency for name in layer
+                       for dependency in graph[name].dependencies}
+            for index, name in enumerate(next_layer):
+                if name not in reached:
+                    graph[layer[index % len(layer)]].dependencies.append(name)
+    return graph
+
+
+def _record_hash(data):
+    digest = hashlib.sha256(data).digest()
+    return 'sha256=' + base64.urlsafe_b64encode(digest).decode(
+        'ascii').rstrip('=')
+
+
+def build_wheel(package, version, directory):
+    """Write a pure Python wheel for a package version
+
+    :return: The filename of the wheel
+    :rtype: str
+
+    """
+    filename = '{}-{}-py2.py3-none-any.whl'.format(package.name, version)
+    dist_info = '{}-{}.dist-info'.format(package.name, version)
+    metadata = ['Metadata-Version: 2.0',
+                'Name: {}'.format(package.name),
+                'Version: {}'.format(version)]
+    metadata.extend('Requires-Dist: {}'.format(dependency)
+                    for dependency in package.dependencies)
+    files = OrderedDict([
+        ('{}.py'.format(package.name), b''),
+        ('{}/METADATA'.format(dist_info),
+         ('\n'.join(metadata) + '\n').encode('utf-8')),
+        ('{}/WHEEL'.format(dist_info),
+         b'Wheel-Version: 1.0\nGenerator: benchmarks\n'
+         b'Root-Is-Purelib: true\nTag: py2-none-any\nTag: py3-none-any\n')])
+    record = ''.join('{},{},{}\n'.format(name, _record_hash(data), len(data))
+                     for name, data in files.items())
+    record += '{}/RECORD,,\n'.format(dist_info)
+    files['{}/RECORD'.format(dist_info)] = record.encode('utf-8')
+    with zipfile.ZipFile(os.path.join(directory, filename), 'w') as wheel:
+        for name, data in files.items():
+            wheel.writestr(name, data)
+    return filename
+
+
+def build_sdist(package, version, directory):
+    """Write a source distribution for a package version
+
+    :return: The filename of the sdist
+    :rtype: str
+
+    """
+    base = '{}-{}'.format(package.name, version)
+    files = OrderedDict([
+        ('setup.py',
+         'from setuptools import setup\n'
+         'setup(name={!r}, version={!r}, py_modules=[{!r}],\n'
+         '      install_requires={!r})\n'
+         .format(package.name, version, package.name,
+                 package.dependencies)),
+        ('{}.py'.format(package.name), ''),
+        ('PKG-INFO',
+         'Metadata-Version: 1.0\nName: {}\nVersion: {}\n'
+         .format(package.name, version))])
+    filename = '{}.tar.gz'.format(base)
+    with tarfile.open(os.path.join(directory, filename), 'w:gz') as sdist:
+        for name, text in files.items():
+            data = text.encode('utf-8')
+            info = tarfile.TarInfo('{}/{}'.format(base, name))
+            info.size = len(data)
+            sdist.addfile(info, io.BytesIO(data))
+    return filename
+
+
+def publish(graph, directory, versions=3, layout='find-links'):
+    """Publish a graph as a local package index
+
+    Creates the requirements and constraints files, and either a
+    ``--find-links`` directory or a PEP 503 simple index.
+
+    :param graph: A graph as returned by :func:`generate`
+    :param directory: An empty directory to publish the index in
+    :param versions: Number of versions to publish of each package
+    :param layout: ``find-links`` or ``simple``
+    :return: The pip_compile command line arguments for compiling the graph
+    :rtype: list of str
+
+    """
+    if layout not in ('find-links', 'simple'):
+        raise ValueError('Unknown index layout {!r}'.format(layout))
+    directory = os.path.abspath(directory)
+    packages_dir = os.path.join(directory, 'packages')
+    ensure_dir(packages_dir)
+    all_versions = ['{}.0'.format(number) for number in range(1, versions + 1)]
+    files = OrderedDict()
+    for package in graph.values():
+        build = build_sdist if package.sdist else build_wheel
+        files[package.name] = [build(package, version, packages_dir)
+                               for version in all_versions]
+
+    requirements = os.path.join(directory, 'requirements.txt')
+    with open(requirements, 'w') as f:
+        f.write('{}\n'.format(next(iter(graph))))
+    constraints = os.path.join(directory, 'constraints.txt')
+    with open(constraints, 'w') as f:
+        f.writelines('{}=={}\n'.format(name, all_versions[-1])
+                     for name in graph)
+    args = ['-r', requirements, '-c', constraints]
+
+    if layout == 'find-links':
+        return args + ['--no-index', '--find-links', packages_dir]
+    simple_dir = os.path.join(directory, 'simple')
+    for name, filenames in files.items():
+        ensure_dir(os.path.join(simple_dir, name))
+        with open(os.path.join(simple_dir, name, 'index.html'), 'w') as f:
+            f.write('<html><body>\n')
+            f.writelines('<a href="../../packages/{0}">{0}</a>\n'
+                         .format(filename) for filename in filenames)
+            f.write('</body></html>\n')
+    with open(os.path.join(simple_dir, 'index.html'), 'w') as f:
+        f.write('<html><body>\n')
+        f.writelines('<a href="{0}/">{0}</a>\n'.format(name)
+                     for name in files)
+        f.write('</body></html>\n')
+    return args + ['--index-url', path_to_url(simple_dir)]
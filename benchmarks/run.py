@@ -0,0 +1,262 @@
+"""Time pip_compile on synthetic dependency graphs
+
+Usage::
+
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.run --shape deep --size 200 --compare results.json
+    python -m benchmarks.run --pip-compile-args="--metadata-cache -j 4"
+
+For each graph shape and index layout, a graph is generated and published in
+a temporary directory, and compiled twice in a subprocess with the same pip
+cache directory: first ``cold`` with an empty cache, then ``warm``. The wall
+clock time and peak resident memory of each compile are recorded.
+
+The ``startup`` cases time the fixed cost of each run, taking the fastest of
+``--startup-repeat`` runs: ``version`` runs the entry point alone, ``import``
+imports the command and pip, ``resolution`` repeats a compile from the
+resolution cache, and ``shortcut`` repeats it without importing pip.
+
+Results are written as JSON. With ``--compare``, each case is compared to an
+earlier result file, and the exit status is non-zero if any case got slower
+than ``--threshold`` times the earlier time.
+
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+
+import pip
+
+import pip_compile
+from benchmarks.graphs import SHAPES, generate, publish
+from pip_compile.version import __version__
+
+COMPILE_SCRIPT = 'import sys, pip_compile; sys.exit(pip_compile.main())'
+IMPORT_SCRIPT = 'import pip_compile.command'
+# Compiling sdists runs setup.py egg_info for each one
+DEFAULT_SIZES = {'wide': 100, 'deep': 100, 'diamond': 100, 'sdist': 20}
+
+
+def time_compile(args, cwd=None, script=COMPILE_SCRIPT):
+    """Run pip_compile in a subprocess
+
+    :param args: Command line arguments for pip_compile
+    :param cwd: Working directory of the subprocess
+    :param script: The Python code run in the subprocess
+    :return: The wall clock seconds, the peak resident memory in kilobytes
+             and the exit status
+    :rtype: tuple
+
+    """
+    # Compile with the same pip_compile the benchmarks were started with
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [os.path.dirname(os.path.dirname(os.path.abspath(
+            pip_compile.__file__)))] +
+        [path for path in [env.get('PYTHONPATH')] if path])
+    with open(os.devnull, 'w') as devnull:
+        start = time.time()
+        process = subprocess.Popen([sys.executable, '-c', script] +
+                                   list(args),
+                                   cwd=cwd, env=env, stdout=devnull,
+                                   stderr=devnull)
+        pid, status, rusage = os.wait4(process.pid, 0)
+        seconds = time.time() - start
+    # Popen didn't see the process exit, since os.wait4() reaped it
+    process.returncode = os.WEXITSTATUS(status)
+    max_rss = rusage.ru_maxrss
+    if sys.platform == 'darwin':
+        # Reported in bytes instead of kilobytes
+        max_rss //= 1024
+    return seconds, max_rss, process.returncode
+
+
+def run_case(shape, size, layout, versions=3, extra_args=()):
+    """Generate, publish and compile one graph cold and warm
+
+    :return: A result for each compile
+    :rtype: list of collections.OrderedDict
+
+    """
+    directory = tempfile.mkdtemp(prefix='pip-compile-bench-')
+    try:
+        graph = generate(shape, size)
+        args = publish(graph, os.path.join(directory, 'index'),
+                       versions=versions, layout=layout)
+        args += ['--cache-dir', os.path.join(directory, 'cache'),
+                 '--output', os.path.join(directory, 'requirements.out')]
+        args += list(extra_args)
+        results = []
+        for run in 'cold', 'warm':
+            seconds, max_rss, status = time_compile(args, cwd=directory)
+            results.append(OrderedDict([('shape', shape),
+                                        ('size', size),
+                                        ('layout', layout),
+                                        ('run', run),
+                                        ('seconds', round(seconds, 3)),
+                                        ('max_rss_kb', max_rss),
+                                        ('status', status)]))
+        return results
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def run_startup(repeat=5):
+    """Time the fixed cost of starting pip_compile
+
+    :param repeat: The number of times each case is run
+    :return: A result for each case, with the fastest of its runs
+    :rtype: list of collections.OrderedDict
+
+    """
+    directory = tempfile.mkdtemp(prefix='pip-compile-bench-')
+    cache_dir = os.path.join(directory, 'cache')
+    try:
+        args = publish(generate('wide', 3), os.path.join(directory, 'index'),
+                       versions=1, layout='find-links')
+        args += ['--cache-dir', cache_dir, '--resolution-cache',
+                 '--output', os.path.join(directory, 'requirements.out')]
+        time_compile(args, cwd=directory)
+        shortcuts = os.path.join(cache_dir, 'pip_compile', 'shortcuts')
+
+        def drop_shortcuts():
+            shutil.rmtree(shortcuts, ignore_errors=True)
+
+        cases = [('version', ['--version'], COMPILE_SCRIPT, None),
+                 ('import', [], IMPORT_SCRIPT, None),
+                 ('resolution', args, COMPILE_SCRIPT, drop_shortcuts),
+                 ('shortcut', args, COMPILE_SCRIPT, None)]
+        results = []
+        for run, run_args, script, before in cases:
+            timed = []
+            for _ in range(repeat):
+                if before:
+                    before()
+                timed.append(time_compile(run_args, cwd=directory,
+                                          script=script))
+            seconds, max_rss, status = min(timed)
+            results.append(OrderedDict([('shape', 'startup'),
+                                        ('size', 3),
+                                        ('layout', 'find-links'),
+                                        ('run', run),
+                                        ('seconds', round(seconds, 3)),
+                                        ('max_rss_kb', max_rss),
+                                        ('status', max(
+                                            status for _, _, status
+                                            in timed))]))
+        return results
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def case_key(result):
+    return (result['shape'], result['size'], result['layout'], result['run'])
+
+
+def compare(results, baseline, threshold):
+    """Compare results to earlier ones
+
+    :param results: Results of this run
+    :param baseline: Results of an earlier run, as written by :func:`main`
+    :param threshold: Ratio of the new to the old time above which a case
+                      counts as a regression
+    :return: Descriptions of regressed cases
+    :rtype: list of str
+
+    """
+    earlier = {case_key(result): result for result in baseline['results']}
+    regressions = []
+    for result in results:
+        old = earlier.get(case_key(result))
+        if not old or not old['seconds']:
+            continue
+        ratio = result['seconds'] / old['seconds']
+        line = '{} {} {} {}: {:.3f}s -> {:.3f}s ({:.2f}x)'.format(
+            result['shape'], result['size'], result['layout'],
+            result['run'], old['seconds'], result['seconds'], ratio)
+        print(line)
+        if ratio > threshold:
+            regressions.append(line)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Time pip_compile on synthetic dependency graphs')
+    parser.add_argument('--shape', action='append', choices=SHAPES,
+                        help='Graph shape to compile, may be repeated '
+                             '(default: all)')
+    parser.add_argument('--size', type=int,
+                        help='Number of packages in each graph (default: {})'
+                        .format(', '.join('{} for {}'.format(size, shape)
+                                          for shape, size
+                                          in sorted(DEFAULT_SIZES.items()))))
+    parser.add_argument('--versions', type=int, default=3,
+                        help='Versions published of each package')
+    parser.add_argument('--layout', action='append',
+                        choices=('find-links', 'simple'),
+                        help='Publish packages in a --find-links directory '
+                             'or a simple index, may be repeated (default: '
+                             'find-links)')
+    parser.add_argument('--startup-repeat', type=int, default=5,
+                        help='Runs of each startup case, of which the '
+                             'fastest counts, or 0 to skip them')
+    parser.add_argument('--pip-compile-args', default='',
+                        help='Additional pip_compile arguments, e.g. '
+                             '--pip-compile-args="--metadata-cache -j 4"')
+    parser.add_argument('--output', help='Write results as JSON to a file')
+    parser.add_argument('--compare', metavar='RESULTS',
+                        help='Compare to results written earlier')
+    parser.add_argument('--threshold', type=float, default=1.2,
+                        help='Slowdown ratio reported as a regression by '
+                             '--compare')
+    options = parser.parse_args(argv)
+
+    results = []
+    if options.startup_repeat:
+        for result in run_startup(options.startup_repeat):
+            print('{shape} {run}: {seconds:.3f}s, {max_rss_kb} kB, '
+                  'status {status}'.format(**result))
+            results.append(result)
+    for shape in options.shape or SHAPES:
+        for layout in options.layout or ['find-links']:
+            for result in run_case(shape,
+                                   options.size or DEFAULT_SIZES[shape],
+                                   layout, options.versions,
+                                   options.pip_compile_args.split()):
+                print('{shape} {size} {layout} {run}: {seconds:.3f}s, '
+                      '{max_rss_kb} kB, status {status}'.format(**result))
+                results.append(result)
+
+    report = OrderedDict([
+        ('pip_compile', __version__),
+        ('pip', pip.__version__),
+        ('python', platform.python_version()),
+        ('platform', platform.platform()),
+        ('pip_compile_args', options.pip_compile_args),
+        ('results', results)])
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump(report, f, indent=4)
+
+    status = 0
+    if any(result['status'] for result in results):
+        status = 1
+    if options.compare:
+        with open(options.compare) as f:
+            regressions = compare(results, json.load(f), options.threshold)
+        if regressions:
+            print('Regressions:\n' + '\n'.join(regressions))
+            status = 1
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
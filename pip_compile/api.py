@@ -0,0 +1,154 @@
+"""Compiling requirements from Python code
+
+:func:`compile` resolves requirements in the calling process and returns the
+pinned requirements and their dependency graph instead of writing files::
+
+    from pip_compile import api
+
+    with api.Context(cache_dir='/var/cache/pip',
+                     metadata_cache=True) as context:
+        for path in requirements_files:
+            result = api.compile(requirements=[path],
+                                 constraints=['constraints.txt'],
+                                 context=context)
+
+A :class:`Context` keeps the HTTP session, package finder, caches, parsed
+requirements and constraints files and the metadata of prepared packages
+between compiles, like the jobs of a ``--batch`` compile share them. Compiles
+may also run concurrently in several threads sharing one context. Without a
+context, each compile creates and closes one of its own.
+
+Errors are raised as exceptions instead of being logged, and nothing is
+written to files or standard output.
+
+"""
+from pip_compile.command import CompileCommand
+from pip_compile.batch import job_options
+from pip_compile.context import CompileContext
+from pip_compile.metadata import MetadataStore
+from pip_compile.targets import Target
+
+# Options which don't make sense for compiles started from Python code
+UNSUPPORTED_OPTIONS = ('output', 'json_output', 'incremental', 'batch',
+                       'check', 'targets', 'serve', 'connect', 'timings')
+
+
+class Context(CompileContext):
+    """A session, package finder and caches shared by compiles"""
+    def __init__(self, args=(), **options):
+        """Create a context from command line options
+
+        :param args: Command line options shared by all compiles, e.g.
+                     ``['--find-links', 'wheels/', '--pre']``
+        :param options: Options by their ``dest`` names, e.g.
+                        ``cache_dir='/var/cache/pip'``. These override
+                        ``args``.
+        :raise TypeError: if an option name is unknown
+
+        """
+        command = CompileCommand()
+        parsed, extra_args = command.parse_args(list(args))
+        for name, value in options.items():
+            if not hasattr(parsed, name):
+                raise TypeError('Unknown pip-compile option {}'.format(name))
+            setattr(parsed, name, value)
+        if extra_args:
+            raise Exception('Give requirements to compile() instead of the '
+                            'context: {}'.format(' '.join(extra_args)))
+        unsupported = [name for name in UNSUPPORTED_OPTIONS
+                       if getattr(parsed, name)]
+        if unsupported:
+            raise Exception('Options not supported by the API: {}'
+                            .format(', '.join(unsupported)))
+        command.check_options(parsed)
+        metadata_store = command.prepare_options(parsed)
+        super(Context, self).__init__(command, parsed,
+                                      metadata_store or MetadataStore())
+
+    @property
+    def options(self):
+        """The parsed options shared by all compiles"""
+        return self._options
+
+    @property
+    def command(self):
+        """The command whose methods compile the requirements
+
+        :rtype: pip_compile.command.CompileCommand
+
+        """
+        return self._command
+
+
+class CompileResult(object):
+    """Pinned requirements returned by :func:`compile`"""
+    def __init__(self, requirements, graph):
+        """Create a result
+
+        :param requirements: The pinned requirements in the format written to
+                             ``--output``
+        :param graph: The dependency graph, as written to ``--json-output``
+        :type graph: pip_compile.graph.DependencyGraph
+
+        """
+        self.requirements = requirements
+        self.graph = graph
+
+    @property
+    def lines(self):
+        """The pinned requirements as a list of lines"""
+        return self.requirements.splitlines()
+
+    def to_dict(self):
+        """Return the graph as a mapping of packages to their dependencies
+
+        :rtype: dict
+
+        """
+        return self.graph.to_dict()
+
+
+def compile(packages=(), requirements=(), constraints=(), editables=(),
+            incremental=None, target=None, context=None, **options):
+    """Resolve and pin requirements
+
+    :param packages: Requirement specifiers, e.g. ``'Jinja2>=2.8'``
+    :param requirements: Paths or URLs of requirements files
+    :param constraints: Paths or URLs of constraints files, in addition to
+                        the ones given to the context
+    :param editables: Paths or URLs of editable requirements
+    :param incremental: Path of a dependency graph written earlier with
+                        ``--json-output``, see ``--incremental``
+    :param target: A :class:`~pip_compile.targets.Target` or a ``--target``
+                   specification like ``py27:python_version=2.7`` to compile
+                   for instead of the running interpreter
+    :param context: A context shared with other compiles, or ``None`` to use
+                    one for this compile only
+    :type context: Context
+    :param options: Options for the context used for this compile only, as
+                    accepted by :class:`Context`
+    :rtype: CompileResult
+    :raise pip.exceptions.InstallationError: if the requirements can't be
+                                              resolved
+    :raise Exception: if a resolved package isn't pinned in constraints
+
+    """
+    if context is None:
+        with Context(**options) as context:
+            return compile(packages, requirements, constraints, editables,
+                           incremental, target, context)
+    if options:
+        raise TypeError('Options are given to the context when one is used')
+    if target is not None and not isinstance(target, Target):
+        target = Target.parse(target)
+    job_opts, args = job_options(context.options, {
+        'requirements': list(requirements),
+        'constraints': list(constraints),
+        'editables': list(editables),
+        'packages': list(packages),
+        'output': None,
+        'json_output': None,
+        'incremental': incremental})
+    requirements, graph = context.command.compile_and_write(
+        job_opts, args, context, target)
+    return CompileResult(requirements, graph)
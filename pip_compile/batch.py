@@ -0,0 +1,100 @@
+"""Compiling many requirement sets in one process"""
+import copy
+import json
+import os
+from collections import OrderedDict
+
+from pip.exceptions import InstallationError
+
+from pip_compile.cache import is_url
+
+# Manifest keys holding a list of file paths, and keys holding a single path
+LIST_PATH_KEYS = ('requirements', 'constraints')
+PATH_KEYS = ('output', 'json_output', 'incremental')
+# Keys holding a list of requirement specifiers used as on the command line
+LIST_KEYS = ('packages', 'editables')
+
+
+def load_manifest(path):
+    """Read the jobs of a batch compile
+
+    The manifest is a JSON list of jobs like::
+
+        [{"requirements": ["service1/requirements.txt"],
+          "output": "service1/requirements.lock",
+          "json_output": "service1/requirements.json"}]
+
+    A job may also list ``constraints`` in addition to the ones given on the
+    command line, ``packages`` and ``editables`` to compile, a previous JSON
+    graph in ``incremental`` and a ``name`` used in log messages. File paths
+    are relative to the directory of the manifest.
+
+    :param path: Path of the manifest file
+    :return: The jobs with all keys present and file paths made absolute
+    :rtype: list of collections.OrderedDict
+
+    """
+    try:
+        with open(path) as f:
+            manifest = json.load(f, object_pairs_hook=OrderedDict)
+    except (IOError, ValueError) as exc:
+        raise InstallationError(
+            'Could not read batch manifest {}: {}'.format(path, exc))
+    if not isinstance(manifest, list):
+        raise InstallationError(
+            'Batch manifest {} must contain a list of jobs'.format(path))
+    base_dir = os.path.dirname(os.path.abspath(path))
+
+    def absolute(filename):
+        if is_url(filename):
+            return filename
+        return os.path.join(base_dir, filename)
+
+    jobs = []
+    for number, entry in enumerate(manifest, 1):
+        if not isinstance(entry, dict):
+            raise InstallationError(
+                'Job {} in batch manifest {} is not a JSON object'
+                .format(number, path))
+        unknown = set(entry) - set(('name',) + LIST_PATH_KEYS + PATH_KEYS +
+                                   LIST_KEYS)
+        if unknown:
+            raise InstallationError(
+                'Unknown keys in job {} of batch manifest {}: {}'
+                .format(number, path, ', '.join(sorted(unknown))))
+        job = OrderedDict()
+        for key in LIST_PATH_KEYS:
+            job[key] = [absolute(filename) for filename in entry.get(key, [])]
+        for key in PATH_KEYS:
+            value = entry.get(key)
+            job[key] = absolute(value) if value and value != '-' else value
+        for key in LIST_KEYS:
+            job[key] = list(entry.get(key, []))
+        if not (job['requirements'] or job['packages'] or job['editables']):
+            raise InstallationError(
+                'Job {} in batch manifest {} has no requirements'
+                .format(number, path))
+        job['name'] = entry.get('name') or job['output'] or 'job {}'.format(
+            number)
+        jobs.append(job)
+    return jobs
+
+
+def job_options(options, job):
+    """Combine shared command line options with the options of a batch job
+
+    :param options: Parsed command line options
+    :param job: A job returned by :func:`load_manifest`
+    :return: The options and requirement specifiers for compiling the job
+    :rtype: tuple
+
+    """
+    options = copy.copy(options)
+    options.batch = None
+    options.requirements = job['requirements']
+    options.constraints = options.constraints + job['constraints']
+    options.editables = job['editables']
+    options.output = job['output']
+    options.json_output = job['json_output']
+    options.incremental = job['incremental']
+    return options, job['packages']
@@ -0,0 +1,254 @@
+"""On-disk caches for compiled requirements"""
+import hashlib
+import json
+import os
+import re
+import sys
+from collections import OrderedDict
+
+try:
+    from urllib.parse import unquote, urlsplit
+    from urllib.request import url2pathname
+except ImportError:
+    from urllib import unquote, url2pathname
+    from urlparse import urlsplit
+
+from pip_compile import usage
+from pip_compile.utils import atomic_write, file_digest
+from pip_compile.version import __version__
+
+# Matches comments, which pip strips from requirements file lines
+COMMENT_RE = re.compile(r'(^|\s)#.*$')
+# Matches nested requirement and constraint file references, e.g.
+# ``-r base.txt``, ``-cconstraints.txt`` or ``--requirement=base.txt``
+INCLUDE_RE = re.compile(r'^(?:-[rc]\s*|'
+                        r'--(?:requirement|constraint)(?:\s*=\s*|\s+))'
+                        r'(?P<path>\S+)')
+EDITABLE_RE = re.compile(r'^(?:-e|--editable)(?:\s*=\s*|\s+)(?P<path>\S+)')
+# Matches extras at the end of a local path, e.g. ``./pkg[extra]``
+EXTRAS_RE = re.compile(r'\[[^\]]*\]$')
+
+SETUP_FILES = ('setup.py', 'setup.cfg', 'pyproject.toml')
+
+
+def is_url(path):
+    return '://' in path or path.startswith('file:')
+
+
+def local_path(spec):
+    """Return the local file or directory a requirement specifier refers to
+
+    :param spec: A requirement specifier, e.g. a path, a ``file:`` URL or a
+                 package name, possibly followed by environment markers
+    :return: The path, or ``None`` if the specifier isn't an existing local
+             file or directory
+    :rtype: str
+
+    """
+    spec = spec.split(';', 1)[0].strip()
+    if spec.startswith('file:'):
+        path = url2pathname(unquote(urlsplit(spec).path))
+    elif is_url(spec):
+        return None
+    else:
+        path = spec
+        if not os.path.exists(path):
+            path = EXTRAS_RE.sub('', path)
+    if path and os.path.exists(path):
+        return path
+    return None
+
+
+def cache_subdir(cache_dir, *parts):
+    """Return the path of a pip_compile specific directory in pip's cache"""
+    return os.path.join(cache_dir, 'pip_compile', *parts)
+
+
+def source_tree_digest(path):
+    """Hash the files which define a local directory package
+
+    :param path: Path of a local directory requirement
+    :return: A hex digest covering ``setup.py``, ``setup.cfg`` and
+             ``pyproject.toml``
+    :rtype: str
+
+    """
+    digest = hashlib.sha256()
+    for filename in SETUP_FILES:
+        digest.update('{}:{}\n'.format(
+            filename,
+            file_digest(os.path.join(path, filename))).encode('ascii'))
+    return digest.hexdigest()
+
+
+def requirement_file_digests(filename, digests=None):
+    """Hash a requirements file and everything it refers to
+
+    Nested ``-r`` and ``-c`` files are followed. Local files and directories
+    listed in the files, also as ``file:`` URLs, are hashed using
+    :func:`path_digest`.
+
+    :param filename: Path to a requirements or constraints file
+    :param digests: Already collected digests, used when recursing
+    :return: A mapping from absolute paths to hex digests, or ``None`` if the
+             file or one of its includes is a remote URL and thus can't be
+             hashed without network access
+    :rtype: dict
+
+    """
+    if digests is None:
+        digests = OrderedDict()
+    if is_url(filename):
+        return None
+    path = os.path.abspath(filename)
+    if path in digests:
+        return digests
+    digests[path] = file_digest(path)
+    if digests[path] is None:
+        return digests
+    with open(path) as f:
+        for line in f:
+            line = COMMENT_RE.sub('', line).strip()
+            include = INCLUDE_RE.match(line)
+            if include:
+                nested = include.group('path')
+                if not is_url(nested):
+                    nested = os.path.join(os.path.dirname(filename), nested)
+                if requirement_file_digests(nested, digests) is None:
+                    return None
+                continue
+            editable = EDITABLE_RE.match(line)
+            if editable:
+                line = editable.group('path')
+            path = line and local_path(line)
+            if path:
+                digests[os.path.abspath(path)] = path_digest(path)
+    return digests
+
+
+def input_digests(options, args):
+    """Hash the requirements files and local paths a compile reads
+
+    :param options: Parsed command line options
+    :param args: Requirement specifiers given on the command line
+    :return: Digests of requirements and constraints files and everything
+             they refer to, and digests of local files and directories given
+             on the command line, e.g. archives, or ``None`` if a file is a
+             remote URL
+    :rtype: tuple
+
+    """
+    files = OrderedDict()
+    for filename in options.requirements + options.constraints:
+        if requirement_file_digests(filename, files) is None:
+            return None
+    paths = OrderedDict()
+    for spec in list(args) + list(options.editables):
+        path = local_path(spec)
+        if path:
+            paths[os.path.abspath(path)] = path_digest(path)
+    return files, paths
+
+
+def path_digest(path):
+    """Hash a file, or a local directory with :func:`source_tree_digest`
+
+    Used for checking whether digests collected by :func:`input_digests`
+    still match.
+
+    :return: The hex digest, or ``None`` if the path doesn't exist
+    :rtype: str
+
+    """
+    if os.path.isdir(path):
+        return source_tree_digest(path)
+    return file_digest(path)
+
+
+def resolution_key(options, args, pip_version, target=None):
+    """Compute the cache key for a set of compile options
+
+    The key covers the contents of all requirements and constraints files, the
+    options which affect the result of the resolution, and the versions of the
+    interpreter, pip and pip_compile.
+
+    :param options: Parsed command line options
+    :param args: Requirement specifiers given on the command line
+    :param pip_version: Version of the running pip
+    :param target: The ``--target`` compiled for, if any
+    :type target: pip_compile.targets.Target
+    :return: A hex digest, or ``None`` if the inputs can't be cached
+    :rtype: str
+
+    """
+    digests = input_digests(options, args)
+    if digests is None:
+        return None
+    files, paths = digests
+    inputs = {
+        'files': files,
+        'requirements': options.requirements,
+        'constraints': options.constraints,
+        'args': args,
+        'editables': options.editables,
+        'paths': paths,
+        'flat': options.flat,
+        'pre': options.pre,
+        'allow_double': options.allow_double,
+        'ignore_dependencies': options.ignore_dependencies,
+        'index_urls': [options.index_url] + options.extra_index_urls,
+        'no_index': options.no_index,
+        'find_links': options.find_links,
+        'process_dependency_links': options.process_dependency_links,
+        'no_binary': sorted(options.format_control.no_binary),
+        'only_binary': sorted(options.format_control.only_binary),
+        'python': sys.version,
+        'platform': sys.platform,
+        'pip': pip_version,
+        'pip_compile': __version__,
+        'target': target.key if target else None,
+    }
+    serialized = json.dumps(inputs, sort_keys=True).encode('utf-8')
+    return hashlib.sha256(serialized).hexdigest()
+
+
+class ResolutionCache(object):
+    """Compile results stored on disk by :func:`resolution_key`
+
+    Each entry holds the list of pinned requirements as text and the JSON
+    dependency graph, which is enough to write both ``--output`` and
+    ``--json-output`` without resolving anything.
+
+    """
+    def __init__(self, cache_dir):
+        self.directory = cache_subdir(cache_dir, 'resolutions')
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], '{}.json'.format(key))
+
+    def __contains__(self, key):
+        return os.path.exists(self._path(key))
+
+    def use(self, key):
+        """Record the use of an entry without reading it"""
+        usage.use('resolutions', self._path(key))
+
+    def get(self, key):
+        """Return the cached ``{'requirements': ..., 'graph': ...}`` or None"""
+        try:
+            with open(self._path(key)) as f:
+                entry = json.load(f, object_pairs_hook=OrderedDict)
+        except (IOError, ValueError):
+            usage.miss('resolutions')
+            return None
+        if set(entry) != {'requirements', 'graph'}:
+            usage.miss('resolutions')
+            return None
+        usage.hit('resolutions', self._path(key))
+        return entry
+
+    def put(self, key, requirements, graph):
+        entry = OrderedDict([('requirements', requirements), ('graph', graph)])
+        atomic_write(self._path(key),
+                     json.dumps(entry, indent=4).encode('utf-8'))
+        usage.use('resolutions', self._path(key))
@@ -0,0 +1,74 @@
+"""Client for a ``pip-compile --serve`` process
+
+Only uses the standard library, so sending a compile to the server doesn't
+require building the command line parser or importing any of pip's
+requirement handling.
+
+"""
+import json
+import os
+import socket
+import sys
+
+
+def split_connect_option(argv):
+    """Find ``--connect SOCKET`` in command line arguments
+
+    :param argv: Command line arguments
+    :return: The socket path, or ``None`` if ``--connect`` isn't given, and
+             the remaining arguments
+    :rtype: tuple
+
+    """
+    for index, arg in enumerate(argv):
+        if arg == '--connect' and index + 1 < len(argv):
+            return argv[index + 1], argv[:index] + argv[index + 2:]
+        if arg.startswith('--connect='):
+            return (arg.split('=', 1)[1],
+                    argv[:index] + argv[index + 1:])
+    return None, argv
+
+
+def run(path, argv, stdout=None, stderr=None):
+    """Compile in the server listening on a UNIX socket
+
+    :param path: Path of the socket
+    :param argv: Command line arguments for the server
+    :param stdout: Stream for standard output of the compile, defaults to
+                   :data:`sys.stdout`
+    :param stderr: Stream for standard error of the compile, defaults to
+                   :data:`sys.stderr`
+    :return: The exit status of the compile
+    :rtype: int
+
+    """
+    streams = {'stdout': stdout or sys.stdout,
+               'stderr': stderr or sys.stderr}
+    request = {'argv': argv,
+               'cwd': os.getcwd(),
+               'environ': dict((name, value)
+                               for name, value in os.environ.items()
+                               if name.startswith('PIP_'))}
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        try:
+            sock.connect(path)
+        except socket.error as exc:
+            streams['stderr'].write(
+                'Could not connect to pip-compile server at {}: {}\n'
+                .format(path, exc))
+            return 1
+        sock.sendall((json.dumps(request) + '\n').encode('utf-8'))
+        for line in sock.makefile('rb'):
+            message = json.loads(line.decode('utf-8'))
+            if 'status' in message:
+                return message['status']
+            for name, data in message.items():
+                streams[name].write(data)
+                streams[name].flush()
+    finally:
+        sock.close()
+    streams['stderr'].write('The pip-compile server at {} closed the '
+                            'connection\n'.format(path))
+    return 1
+
@@ -0,0 +1,2186 @@
+"""The ``pip-compile`` command and the requirement set it resolves with"""
+
+import copy
+import difflib
+import io
+import os
+import pip
+import sys
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import re
+from pip import cmdoptions, logger
+from pip._vendor import six
+from pip._vendor.packaging.requirements import Requirement
+from pip._vendor.packaging.utils import canonicalize_name
+from pip._vendor.packaging.version import Version, parse as parse_version
+from pip._vendor.six import StringIO
+from pip.basecommand import RequirementCommand
+from pip.exceptions import HashError, HashErrors, InstallationError
+from pip.locations import config_basename
+from pip.req import InstallRequirement, RequirementSet
+from pip.req.req_set import make_abstract_dist
+from pip.status_codes import ERROR, SUCCESS
+from pip.utils.build import BuildDirectory
+from pip.utils.filesystem import check_path_owner
+from pip.utils.logging import indent_log
+
+from pip_compile.batch import job_options, load_manifest
+from pip_compile.cache import (ResolutionCache, input_digests, path_digest,
+                               resolution_key)
+from pip_compile.context import CompileContext
+from pip_compile.footprint import Footprint, release_build
+from pip_compile.graph import JSON_FORMATS, DependencyGraph
+from pip_compile.index import (PAGE_TTL, IndexPageCache, OfflineAdapter,
+                                PinnedLinkCache, PipCompilePackageFinder)
+from pip_compile.local import local_directory, static_metadata
+from pip_compile.prefetch import Prefetcher
+from pip_compile.replay import record, replay
+from pip_compile.shortcuts import Shortcuts, shortcut_key
+from pip_compile.targets import (TARGET_PLACEHOLDER, Target,
+                                 merge_requirements, target_options)
+from pip_compile.unpack import DEFAULT_MAX_SIZE, artifact_digest
+from pip_compile.vcs import git_url_rev, is_git_requirement
+from pip_compile.utils import normalized_output
+from pip_compile import timings, usage, version_line
+from pip_compile.metadata import (MetadataStore, PreviousGraph,
+                                  extract_metadata, metadata_extras,
+                                  metadata_requires, pinned_version,
+                                  requires_python_matches)
+from pip_compile.wheels import PipCompileWheelBuilder
+from pip_compile.workers import worker_pool
+
+try:
+    import wheel
+except ImportError:
+    wheel = None
+
+try:
+    from pip.exceptions import UnsupportedPythonVersion
+except ImportError:
+    # pip < 9.0.0 doesn't check Requires-Python
+    UnsupportedPythonVersion = InstallationError
+
+PIP_MAJOR_VERSION = int(pip.__version__.split('.')[0])
+
+
+def is_pinned(install_requirement):
+    if install_requirement.link:
+        # Requirements with a link (tarball path, Git URL) are always considered
+        # as pinned to the specific version at that path.
+        return True
+    else:
+        # Other requirements are considered pinned if their version specifier is
+        # simple equality, e.g. Flask==1.0
+        specifier_operators = {spec.operator
+                               for spec in install_requirement.specifier}
+        return specifier_operators == {'=='}
+
+
+def local_overrides_git(install_req, existing_req):
+    """Check whether we have a local directory and a Git URL
+
+    :param install_req: The requirement to install
+    :type install_req: pip.req.req_install.InstallRequirement
+    :param existing_req: An existing requirement or constraint
+    :type existing_req: pip.req.req_install.InstallRequirement
+    :return: True if the requirement to install is a local directory and the
+             existing requirement is a Git URL
+    :rtype: bool
+
+    """
+    return (install_req.link and
+            existing_req.link and
+            install_req.link.url.startswith('file:///') and
+            existing_req.link.url.startswith('git+'))
+
+
+def name_requirement(install_req, metadata):
+    """Name an unnamed requirement like pip does after running egg_info
+
+    :type install_req: pip.req.req_install.InstallRequirement
+    :param metadata: Metadata with at least the name and version of the
+                     package
+
+    """
+    if install_req.req:
+        return
+    if isinstance(parse_version(metadata['version']), Version):
+        operator = '=='
+    else:
+        operator = '==='
+    install_req.req = Requirement('{}{}{}'.format(
+        metadata['name'], operator, metadata['version']))
+
+
+class PipCompileRequirementSet(RequirementSet):
+    """A RequirementSet with support for the compile subcommand
+
+    Adds support for allowing double requirements when a constraint file is
+    used, for preparing requirements concurrently, for reading dependencies
+    of pinned packages from a metadata store or a previously compiled
+    dependency graph, for cloning Git requirements from mirrors in the cache
+    directory, for unpacking prefetched artifacts, for reading metadata of
+    sdists unpacked by earlier compiles, for evaluating environment markers
+    for a ``--target`` instead of the running interpreter, and for removing
+    build trees right after preparing each requirement.
+
+    """
+    def __init__(self, *args, **kwargs):
+        self._allow_double = kwargs.pop('allow_double', False)
+        self._target = kwargs.pop('target', None)
+        self._environment = self._target and self._target.environment
+        self._ignore_requires_python = kwargs.get('ignore_requires_python',
+                                                  False)
+        if self._target and PIP_MAJOR_VERSION >= 9:
+            # Requires-Python is checked for the target instead
+            kwargs['ignore_requires_python'] = True
+        self._jobs = kwargs.pop('jobs', 1)
+        self._metadata_store = kwargs.pop('metadata_store', None)
+        self._git_mirrors = kwargs.pop('git_mirrors', None)
+        self._unpack_cache = kwargs.pop('unpack_cache', None)
+        self._release_builds = kwargs.pop('release_builds', False)
+        self._footprint = kwargs.pop('footprint', None)
+        self.wheel_builder = None
+        self._prefetcher = None
+        self._metadata_sources = [
+            source
+            for source in (kwargs.pop('previous_graph', None),
+                           self._metadata_store)
+            if source is not None]
+        self._deferred = threading.local()
+        self._cancel_preparation = False
+        super(PipCompileRequirementSet, self).__init__(*args, **kwargs)
+
+    def _deferred_calls(self):
+        """Return the list of deferred calls if run inside a worker thread"""
+        return getattr(self._deferred, 'calls', None)
+
+    def _add_aliases(self, name):
+        """Make a requirement findable by its lowercase and canonical names"""
+        for alias in (name.lower(), canonicalize_name(name)):
+            if alias != name:
+                self.requirement_aliases[alias] = name
+
+    def _remove_aliases(self, name):
+        for alias, target in list(self.requirement_aliases.items()):
+            if target == name:
+                del self.requirement_aliases[alias]
+
+    def get_requirement(self, project_name):
+        """Find a requirement by name
+
+        *pip_compile modifications:*
+
+        Unlike pip, also matches names which only differ in ``-``, ``_`` and
+        ``.`` characters, e.g. ``Foo_Bar`` and ``foo-bar``.
+
+        """
+        for name in (project_name, project_name.lower(),
+                     canonicalize_name(project_name)):
+            if name in self.requirements:
+                return self.requirements[name]
+            if name in self.requirement_aliases:
+                return self.requirements[self.requirement_aliases[name]]
+        raise KeyError("No project with the name %r" % project_name)
+
+    def has_requirement(self, project_name):
+        if self._deferred_calls() is not None:
+            # Let the main thread decide when replaying add_requirement() calls
+            return False
+        try:
+            return not self.get_requirement(project_name).constraint
+        except KeyError:
+            return False
+
+    def add_requirement(self, install_req, parent_req_name=None,
+                        **kwargs):
+        """Add install_req as a requirement to install.
+
+        :param parent_req_name: The name of the requirement that needed this
+            added. The name is used because when multiple unnamed requirements
+            resolve to the same name, we could otherwise end up with dependency
+            links that point outside the Requirements set. parent_req must
+            already be added. Note that None implies that this is a user
+            supplied requirement, vs an inferred one.
+        :param extras_requested: an iterable of extras used to evaluate the
+            environement markers (only pip>=9.0.0).
+        :return: Additional requirements to scan. That is either [] if
+            the requirement is not applicable, or [install_req] if the
+            requirement is applicable and has just been added.
+
+        *pip_compile modifications:*
+
+        This implementation has been copied verbatim from pip 7.1.2, and the
+        only modifications are the new else clause which handles duplicate
+        constraints, deferring calls made from worker threads by
+        :meth:`prepare_files`, registering canonical name aliases so that
+        e.g. a ``foo_bar`` requirement matches a ``Foo-Bar`` constraint,
+        evaluating markers for the ``--target`` being compiled, and starting
+        to prefetch requirements which have just become reachable.
+
+        The signature contains ``**kwargs`` instead of ``extras_requested=``
+        since that keyword argument only appeared in 9.0.0 and we still want to
+        support pip 8.1.2.
+
+        Requirements are checked against constraints, and mismatches in versions
+        and/or editability raise an error. As an exception to this rule,
+        requirements from local directories override constraints pointing to Git
+        repositories.
+
+        """
+        deferred_calls = self._deferred_calls()
+        if deferred_calls is not None:
+            # Called by _prepare_file() in a worker thread. prepare_files()
+            # replays the call in the main thread in the same order as pip
+            # would have made it.
+            deferred_calls.append((install_req, parent_req_name, kwargs))
+            return []
+
+        name = install_req.name
+        if not self._match_markers(install_req, **kwargs):
+            logger.warning("Ignoring %s: markers %r don't match your "
+                           "environment", install_req.name,
+                           install_req.markers)
+            return []
+
+        install_req.as_egg = self.as_egg
+        install_req.use_user_site = self.use_user_site
+        install_req.target_dir = self.target_dir
+        install_req.pycompile = self.pycompile
+        if not name:
+            # url or path requirement w/o an egg fragment
+            self.unnamed_requirements.append(install_req)
+            return [install_req]
+        else:
+            try:
+                existing_req = self.get_requirement(name)
+            except KeyError:
+                existing_req = None
+            if (parent_req_name is None and existing_req and not
+                    existing_req.constraint):
+                if self._allow_double:
+                    logger.warn('Allowing double requirement: {} (already in '
+                                '{}, name={!r}).'
+                                .format(install_req, existing_req, name))
+                else:
+                    raise InstallationError(
+                        'Double requirement given: %s (already in %s, name=%r)'
+                        % (install_req, existing_req, name))
+            if not existing_req:
+                # Add requirement
+                self.requirements[name] = install_req
+                self._add_aliases(name)
+                result = [install_req]
+                # FIXME: Should result be empty if install_req is a constraint?
+            else:
+                if not existing_req.constraint:
+                    # No need to scan, we've already encountered this for
+                    # scanning.
+                    result = []
+                elif not install_req.constraint:
+                    # If we're now installing a constraint, mark the existing
+                    # object for real installation.
+                    existing_req.constraint = False
+                    # Bugfix for pip 7.1.2: Report the origin of the actual
+                    # package for installation (i.e. the -r file) instead of a
+                    # constraint file.
+                    existing_req.comes_from = install_req.comes_from
+                    if install_req.editable and not existing_req.editable:
+                        if local_overrides_git(install_req, existing_req):
+                            logger.warn('Overriding non-editable constraint {} '
+                                        'with editable requirement {}'
+                                        .format(existing_req, install_req))
+                        else:
+                            raise InstallationError(
+                                '--editable / -e {} was a requirement but the '
+                                'constraint "{}" is non-editable. Cannot '
+                                'resolve this conflict.'
+                                .format(install_req.name, existing_req))
+                    if install_req.link:
+                        install_link = re.sub('#.*', '', install_req.link.url)
+                        existing_link = re.sub('#.*', '', existing_req.link.url)
+                        if install_link != existing_link:
+                            if local_overrides_git(install_req, existing_req):
+                                logger.warn(
+                                    'Overriding constraint from Git repository '
+                                    '{} with local directory {} '
+                                    .format(existing_link, install_link))
+                            else:
+                                raise InstallationError(
+                                    'Requirement: {}\n'
+                                    'Constraint: {}\n'
+                                    'Cannot resolve this conflict.'
+                                    .format(install_req, existing_req))
+                    # And now we need to scan this.
+                    result = [existing_req]
+                else:  # both existing_req and install_req are constraints
+                    # This else clause is an extension to pip 7.1.12:
+                    # VCS links override plain package specifiers
+                    # if there are duplicates in constraints.
+                    if install_req.link and not existing_req.link:
+                        # Our assumption is that dependencies are populated only
+                        # later. Is this correct?
+                        assert not self._dependencies
+                        if name != existing_req.name:
+                            # The Requirement class has no __delitem__()
+                            del self.requirements._dict[existing_req.name]
+                            self.requirements._keys.remove(existing_req.name)
+                            self._remove_aliases(existing_req.name)
+                        self.requirements[name] = install_req
+                        self._add_aliases(name)
+                    elif not install_req.link and existing_req.link:
+                        # Only the existing constraint was a link, so abandon
+                        # the new looser constraint
+                        pass
+                    else:
+                        # All other constraint conflicts are unresolved for the
+                        # time being.
+                        raise InstallationError(
+                                'Duplicate constraint {}, existing {}'
+                                .format(install_req, existing_req))
+                    result = []
+                # Canonicalise to the already-added object for the backref
+                # check below.
+                install_req = existing_req
+            if parent_req_name:
+                parent_req = self.get_requirement(parent_req_name)
+                self._dependencies[parent_req].append(install_req)
+            for req in result:
+                self._submit_prefetch(req)
+            return result
+
+    def _match_markers(self, install_req, **kwargs):
+        """Evaluate the markers of a requirement for the compiled target"""
+        if self._environment is None or install_req.markers is None:
+            return install_req.match_markers(**kwargs)
+        extras_requested = kwargs.get('extras_requested') or ('',)
+        return any(install_req.markers.evaluate(dict(self._environment,
+                                                     extra=extra))
+                   for extra in extras_requested)
+
+    def prepare_files(self, finder):
+        """Prepare process. Create temp directories, download and/or unpack
+        files.
+
+        *pip_compile modifications:*
+
+        When more than one job is allowed, requirements are prepared in a pool
+        of worker threads. Downloads, unpacking and ``setup.py egg_info``
+        subprocesses then run concurrently, while all changes to the
+        requirement set are replayed in the main thread in exactly the order
+        of pip's serial implementation. This keeps the constraint and conflict
+        handling of :meth:`add_requirement` and the order of the resulting
+        requirements intact.
+
+        A requirement is handed to a worker as soon as it's known to need
+        preparation, i.e. it's not a constraint and hasn't been prepared yet.
+
+        """
+        if self._jobs <= 1:
+            return super(PipCompileRequirementSet, self).prepare_files(finder)
+
+        # If any top-level requirement has a hash specified, enter
+        # hash-checking mode, which requires hashes from all.
+        root_reqs = self.unnamed_requirements + self.requirements.values()
+        require_hashes = (self.require_hashes or
+                          any(req.has_hash_options for req in root_reqs))
+        if require_hashes and self.as_egg:
+            raise InstallationError(
+                '--egg is not allowed with --require-hashes mode, since it '
+                'delegates dependency resolution to setuptools and could thus '
+                'result in installation of unhashed packages.')
+
+        queue = list(root_reqs)
+        pending = {}
+        hash_errors = HashErrors()
+        pool = worker_pool(self._jobs)
+        try:
+            position = 0
+            while position < len(queue):
+                for req in queue[position:]:
+                    if (id(req) not in pending and
+                            not req.constraint and not req.prepared):
+                        pending[id(req)] = pool.apply_async(
+                            self._prepare_file_deferred,
+                            (finder, req, require_hashes))
+                req = queue[position]
+                position += 1
+                result = pending.pop(id(req), None)
+                if result is None:
+                    # Skipped like in pip's serial implementation: either a
+                    # constraint or an already prepared requirement
+                    continue
+                calls, exc_info = result.get()
+                queue.extend(self._replay_calls(calls))
+                if exc_info:
+                    if not isinstance(exc_info[1], HashError):
+                        six.reraise(*exc_info)
+                    exc_info[1].req = req
+                    hash_errors.append(exc_info[1])
+        finally:
+            self._cancel_preparation = True
+            pool.close()
+            pool.join()
+            self._cancel_preparation = False
+
+        if hash_errors:
+            raise hash_errors
+
+    def prepare_unnamed_requirements(self, finder, require_hashes=False):
+        """Prepare requirements given without a name to find out their names
+
+        With more than one job, the requirements, usually local directories,
+        are prepared concurrently. Their dependencies are added to the
+        requirement set in the same order as when preparing them serially.
+        Requirements already named by :meth:`name_local_directories` are
+        skipped.
+
+        """
+        unprepared = [req for req in self.unnamed_requirements
+                      if not req.prepared]
+        if self._jobs <= 1 or len(unprepared) <= 1:
+            for req in unprepared:
+                self._prepare_file(finder, req,
+                                   require_hashes=require_hashes,
+                                   ignore_dependencies=self.ignore_dependencies)
+            return
+
+        pool = worker_pool(self._jobs)
+        try:
+            results = [pool.apply_async(self._prepare_file_deferred,
+                                        (finder, req, require_hashes))
+                       for req in unprepared]
+            for result in results:
+                calls, exc_info = result.get()
+                self._replay_calls(calls)
+                if exc_info:
+                    six.reraise(*exc_info)
+        finally:
+            self._cancel_preparation = True
+            pool.close()
+            pool.join()
+            self._cancel_preparation = False
+
+    def _replay_calls(self, calls):
+        """Make the add_requirement() calls deferred in a worker thread
+
+        :param calls: Calls as returned by :meth:`_prepare_file_deferred`
+        :return: The requirements to scan next
+        :rtype: list of pip.req.req_install.InstallRequirement
+
+        """
+        more_reqs = []
+        for install_req, parent_req_name, kwargs in calls:
+            if parent_req_name is None:
+                # 'unnamed' requirements get added here
+                if not self.has_requirement(install_req.name):
+                    self.add_requirement(install_req, None, **kwargs)
+            else:
+                more_reqs.extend(self.add_requirement(
+                    install_req, parent_req_name, **kwargs))
+        return more_reqs
+
+    def _prepare_file_deferred(self, finder, req, require_hashes):
+        """Prepare a requirement in a worker thread
+
+        :return: The ``(install_req, parent_req_name, kwargs)`` arguments of
+                 all :meth:`add_requirement` calls made during preparation,
+                 and the exception info if preparation failed
+        :rtype: tuple
+
+        """
+        calls = []
+        if self._cancel_preparation:
+            return calls, None
+        self._deferred.calls = calls
+        try:
+            self._prepare_file(finder, req,
+                               require_hashes=require_hashes,
+                               ignore_dependencies=self.ignore_dependencies)
+        except Exception:
+            return calls, sys.exc_info()
+        finally:
+            self._deferred.calls = None
+        return calls, None
+
+    def _prepare_file(self,
+                      finder,
+                      req_to_install,
+                      require_hashes=False,
+                      ignore_dependencies=False):
+        """Prepare a single requirements file.
+
+        :return: A list of additional InstallRequirements to also install.
+
+        *pip_compile modifications:*
+
+        When a previous dependency graph or a metadata store is used,
+        requirements pinned to a version with ``==`` are prepared using their
+        metadata, which skips downloading, unpacking and running ``setup.py
+        egg_info``. Metadata of other pinned requirements is added to the
+        metadata store after preparing them. With a metadata store, local
+        directories are handled the same way using metadata stored for the
+        current contents of their setup files. Git requirements are cloned
+        from mirrors in the cache directory, and with a metadata store, they
+        are prepared using metadata stored for the commit they resolve to.
+        With an unpack cache, sdists are prepared using the ``egg_info``
+        output stored for their SHA-256 digest. Hash-checking mode always
+        prepares the actual artifacts. Dependencies of requirements prepared
+        by pip are added from their metadata when compiling for a
+        ``--target``. With ``--release-builds``, the wheel of the requirement
+        is built and its build tree removed right after preparing it, and the
+        memory use and build directory size are checked against their limits.
+
+        The time spent and whether the package was prepared or taken from
+        metadata are recorded for ``--timings``.
+
+        """
+        if req_to_install.constraint or req_to_install.prepared:
+            return []
+        with timings.span('prepare', package=req_to_install):
+            more_reqs = self._prepare_requirement(
+                finder, req_to_install,
+                require_hashes=require_hashes,
+                ignore_dependencies=ignore_dependencies)
+            self._release(req_to_install)
+        return more_reqs
+
+    def _prepare_requirement(self, finder, req_to_install,
+                             require_hashes=False, ignore_dependencies=False):
+        """Prepare a requirement from metadata, a mirror or its artifact
+
+        :return: A list of additional InstallRequirements to also install.
+
+        """
+        if (self._git_mirrors is not None and not require_hashes and
+                is_git_requirement(req_to_install)):
+            return self._prepare_git_requirement(
+                finder, req_to_install, ignore_dependencies)
+        directory = local_directory(req_to_install)
+        if (directory and self._metadata_store is not None and
+                not require_hashes):
+            return self._prepare_local_directory(
+                finder, req_to_install, directory, ignore_dependencies)
+        version = pinned_version(req_to_install)
+        if not self._metadata_sources or not version or require_hashes:
+            return self._prepare_artifact(
+                finder, req_to_install,
+                require_hashes=require_hashes,
+                ignore_dependencies=ignore_dependencies)
+
+        for source in self._metadata_sources:
+            if (source.needs_link and req_to_install.link is None and
+                    finder is not None):
+                # The stored metadata is keyed by the artifact, so the
+                # finder has to pick it first. Unlike populate_link(), this
+                # doesn't replace the link with one to a cached wheel.
+                req_to_install.link = finder.find_requirement(req_to_install,
+                                                              False)
+            metadata = source.get(req_to_install.name, version,
+                                  req_to_install.extras, req_to_install.link)
+            if metadata is not None:
+                timings.count('metadata.hits')
+                timings.annotate('source', source.description)
+                return self._prepare_from_metadata(
+                    req_to_install, metadata, ignore_dependencies,
+                    source.description)
+
+        timings.count('metadata.misses')
+        return self._prepare_artifact(
+            finder, req_to_install,
+            require_hashes=require_hashes,
+            ignore_dependencies=ignore_dependencies,
+            store_metadata=self._metadata_store is not None,
+            artifact_link=req_to_install.link)
+
+    def _release(self, req_to_install):
+        """Release the build tree of a prepared requirement
+
+        The memory use and build directory size are checked first, while the
+        build tree still exists. With ``--release-builds``, the wheel is then
+        built into the wheel cache if wheels are being built, and the build
+        tree is removed.
+
+        :raise pip.exceptions.InstallationError: if a limit is exceeded
+
+        """
+        if self._footprint is not None:
+            self._footprint.check(req_to_install)
+        if self._release_builds and req_to_install.prepared:
+            if (self.wheel_builder is not None and
+                    self.wheel_builder.should_build(req_to_install)):
+                self.wheel_builder.build_into_cache(req_to_install)
+            release = (self._footprint.release if self._footprint is not None
+                       else release_build)
+            if release(req_to_install):
+                timings.count('released_builds')
+
+    def _prepare_artifact(self, finder, req_to_install, require_hashes=False,
+                          ignore_dependencies=False, store_metadata=False,
+                          artifact_link=None):
+        """Prepare a requirement from its artifact
+
+        With an unpack cache, the requirement is looked up first. If an sdist
+        with the same SHA-256 digest was unpacked by an earlier compile on the
+        same interpreter, the metadata is read from its stored ``egg_info``
+        output. Otherwise pip
+        prepares the requirement, and the unpacked sdist is stored.
+
+        :param store_metadata: Also add the metadata to the metadata store
+        :param artifact_link: The link found for the requirement, which pip
+                              may replace with a link to a cached wheel.
+                              Metadata is stored by this link if given.
+        :return: A list of additional InstallRequirements to also install.
+
+        """
+        digest = None
+        if self._unpack_cache is not None and not require_hashes:
+            req_to_install.populate_link(finder, False, require_hashes)
+            digest = artifact_digest(req_to_install.link)
+        metadata = digest and self._unpack_cache.get(digest)
+        if metadata:
+            timings.count('unpack_cache.hits')
+            timings.annotate('source', self._unpack_cache.description)
+            name_requirement(req_to_install, metadata)
+            more_reqs = self._prepare_from_metadata(
+                req_to_install, metadata, ignore_dependencies,
+                self._unpack_cache.description)
+        else:
+            if digest:
+                timings.count('unpack_cache.misses')
+            timings.annotate('source', 'prepared')
+            more_reqs = self._prepare_with_pip(
+                finder, req_to_install,
+                require_hashes=require_hashes,
+                ignore_dependencies=ignore_dependencies)
+            if digest and not req_to_install.is_wheel:
+                self._unpack_cache.put(
+                    digest, req_to_install.source_dir,
+                    os.path.normpath(req_to_install.egg_info_path('')))
+            if store_metadata:
+                metadata = extract_metadata(
+                    make_abstract_dist(req_to_install).dist(finder))
+        if store_metadata:
+            self._metadata_store.put(metadata,
+                                     artifact_link or req_to_install.link)
+        return more_reqs
+
+    def prefetch(self, prefetcher):
+        """Start fetching the requirements pinned with ``==``
+
+        Constraints are fetched only once :meth:`add_requirement` finds that
+        a requirement or a dependency refers to them, since most entries of
+        large constraints files are never needed.
+
+        :type prefetcher: pip_compile.prefetch.Prefetcher
+
+        """
+        self._prefetcher = prefetcher
+        for req in list(self.requirements.values()):
+            self._submit_prefetch(req)
+
+    def _submit_prefetch(self, req):
+        """Start fetching a requirement if it's pinned with ``==``
+
+        Constraints aren't fetched, and neither are requirements whose
+        metadata is in the metadata store, since they won't be downloaded.
+
+        """
+        if self._prefetcher is None or req.constraint:
+            return
+        version = pinned_version(req)
+        if not version or (self._metadata_store is not None and
+                           self._metadata_store.has_version(req.name,
+                                                            version)):
+            return
+        self._prefetcher.submit(req)
+
+    @contextmanager
+    def _prefetched_artifact(self, req_to_install):
+        """Let pip unpack the prefetched artifact of a requirement, if any
+
+        The requirement gets the remote link afterwards, as if pip had
+        downloaded the artifact itself.
+
+        """
+        prefetched = (self._prefetcher.get(req_to_install)
+                      if self._prefetcher is not None else None)
+        if prefetched is None:
+            yield
+            return
+        link, req_to_install.link = prefetched
+        try:
+            yield
+        finally:
+            req_to_install.link = link
+
+    def _prepare_with_pip(self, finder, req_to_install, require_hashes=False,
+                          ignore_dependencies=False):
+        """Prepare a requirement with pip's ``RequirementSet._prepare_file()``
+
+        When compiling for a ``--target``, pip only fetches and unpacks the
+        requirement, since it would evaluate the markers of the dependencies
+        for the running interpreter. The dependencies are then added from the
+        metadata of the prepared requirement.
+
+        :return: A list of additional InstallRequirements to also install.
+
+        """
+        if self._target is None:
+            with self._prefetched_artifact(req_to_install):
+                return super(PipCompileRequirementSet, self)._prepare_file(
+                    finder, req_to_install,
+                    require_hashes=require_hashes,
+                    ignore_dependencies=ignore_dependencies)
+        with self._prefetched_artifact(req_to_install):
+            super(PipCompileRequirementSet, self)._prepare_file(
+                finder, req_to_install,
+                require_hashes=require_hashes,
+                ignore_dependencies=True)
+        dist = make_abstract_dist(req_to_install).dist(finder)
+        metadata = extract_metadata(dist)
+        self._check_requires_python(metadata)
+        if ignore_dependencies:
+            return []
+        with indent_log():
+            return self._add_dependencies(req_to_install, metadata)
+
+    def _prepare_local_directory(self, finder, req_to_install, directory,
+                                 ignore_dependencies=False):
+        """Prepare a local directory requirement using stored metadata
+
+        The directory is prepared by pip if there's no metadata for its
+        current setup files, and the metadata is stored for later compiles.
+
+        :param directory: The absolute path of the directory
+        :return: A list of additional InstallRequirements to also install.
+
+        """
+        store = self._metadata_store.local
+        metadata = store.get(directory)
+        if metadata is None:
+            timings.count('local_metadata.misses')
+            more_reqs = self._prepare_with_pip(
+                finder, req_to_install,
+                ignore_dependencies=ignore_dependencies)
+            dist = make_abstract_dist(req_to_install).dist(finder)
+            store.put(directory, extract_metadata(dist))
+            timings.annotate('source', 'prepared')
+            return more_reqs
+        timings.count('local_metadata.hits')
+        name_requirement(req_to_install, metadata)
+        timings.annotate('source', store.description)
+        return self._prepare_from_metadata(req_to_install, metadata,
+                                           ignore_dependencies,
+                                           store.description)
+
+    def _prepare_git_requirement(self, finder, req_to_install,
+                                 ignore_dependencies=False):
+        """Prepare a Git requirement from its mirror in the cache directory
+
+        The revision of the requirement is resolved in the mirror, which is
+        fetched only if needed. Metadata stored for the resulting commit is
+        used if available. Otherwise pip clones the requirement from the
+        mirror instead of the remote repository, and the metadata is stored
+        for later compiles.
+
+        :return: A list of additional InstallRequirements to also install.
+
+        """
+        link = req_to_install.link
+        url, rev = git_url_rev(link)
+        commit = self._git_mirrors.resolve(url, rev)
+        timings.annotate('commit', commit)
+        store = None
+        if self._metadata_store is not None:
+            store = self._metadata_store.vcs
+            metadata = store.get(link, commit)
+            if metadata is not None:
+                timings.count('vcs_metadata.hits')
+                timings.annotate('source', store.description)
+                name_requirement(req_to_install, metadata)
+                return self._prepare_from_metadata(req_to_install, metadata,
+                                                   ignore_dependencies,
+                                                   store.description)
+            timings.count('vcs_metadata.misses')
+        timings.annotate('source', 'prepared')
+        # pip clones whatever the link points to, and the original link is
+        # restored for the output
+        req_to_install.link = self._git_mirrors.mirror_link(link)
+        try:
+            more_reqs = self._prepare_with_pip(
+                finder, req_to_install,
+                ignore_dependencies=ignore_dependencies)
+        finally:
+            req_to_install.link = link
+        if store is not None:
+            dist = make_abstract_dist(req_to_install).dist(finder)
+            store.put(link, commit, extract_metadata(dist))
+        return more_reqs
+
+    def name_local_directories(self):
+        """Name local directory requirements without preparing them
+
+        Only usable when dependencies are ignored, since only the name and
+        version of each directory are found out. They are taken from the
+        metadata store or from static metadata in the directory. Other
+        unnamed requirements are left for
+        :meth:`prepare_unnamed_requirements`.
+
+        """
+        assert self.ignore_dependencies
+        for req in self.unnamed_requirements:
+            directory = local_directory(req)
+            if not directory or req.prepared:
+                continue
+            metadata = None
+            if self._metadata_store is not None:
+                metadata = self._metadata_store.local.get(directory)
+                description = self._metadata_store.local.description
+            if metadata is None:
+                metadata = static_metadata(directory)
+                description = 'static metadata'
+                if metadata is None:
+                    timings.count('static_metadata.misses')
+                    continue
+                timings.count('static_metadata.hits')
+            name_requirement(req, metadata)
+            self._prepare_from_metadata(req, metadata,
+                                        ignore_dependencies=True,
+                                        description=description)
+
+    def _prepare_from_metadata(self, req_to_install, metadata,
+                               ignore_dependencies=False,
+                               description='stored metadata'):
+        """Prepare a requirement using metadata instead of its artifact
+
+        This mirrors the dependency handling in pip's
+        :meth:`RequirementSet._prepare_file`.
+
+        :param req_to_install: The requirement to prepare
+        :param metadata: Metadata as returned by
+                         :func:`pip_compile.metadata.extract_metadata`
+        :param description: Where the metadata came from, for logging
+        :return: A list of additional InstallRequirements to also install.
+
+        """
+        req_to_install.prepared = True
+        logger.info('Collecting %s', req_to_install)
+        with indent_log():
+            logger.info('Using %s for %s %s',
+                        description, metadata['name'], metadata['version'])
+            self._check_requires_python(metadata)
+            more_reqs = []
+
+            # We add req_to_install before its dependencies, so that we
+            # can refer to it when adding dependencies.
+            if not self.has_requirement(req_to_install.name):
+                self.add_requirement(req_to_install, None)
+
+            if not ignore_dependencies:
+                more_reqs = self._add_dependencies(req_to_install, metadata)
+        return more_reqs
+
+    def _check_requires_python(self, metadata):
+        """Check Requires-Python of a package for the compiled Python version
+
+        :raise UnsupportedPythonVersion: if the package doesn't support the
+                                         running or ``--target`` Python
+                                         version
+
+        """
+        if self._target is None:
+            kind = 'running'
+            python_version = '.'.join(map(str, sys.version_info[:3]))
+        else:
+            kind = 'target'
+            python_version = self._target.python_version
+        if requires_python_matches(metadata, python_version):
+            return
+        message = ("%s requires Python '%s' but the %s Python is %s"
+                   % (metadata['name'], metadata['requires_python'], kind,
+                      python_version))
+        if self._ignore_requires_python:
+            logger.warning(message)
+        else:
+            raise UnsupportedPythonVersion(message)
+
+    def _add_dependencies(self, req_to_install, metadata):
+        """Add the dependencies of a requirement from its metadata
+
+        Markers are evaluated for the ``--target`` being compiled.
+
+        :return: A list of additional InstallRequirements to also install.
+
+        """
+        more_reqs = []
+        extras = metadata_extras(metadata)
+        for missing in sorted(set(req_to_install.extras) - set(extras)):
+            logger.warning("%s %s does not provide the extra '%s'",
+                           metadata['name'], metadata['version'], missing)
+        available_requested = sorted(set(extras) &
+                                     set(req_to_install.extras))
+        for subreq in metadata_requires(metadata, available_requested,
+                                        self._environment):
+            sub_install_req = InstallRequirement(
+                str(subreq),
+                req_to_install,
+                isolated=self.isolated,
+                wheel_cache=self._wheel_cache,
+            )
+            more_reqs.extend(self.add_requirement(
+                sub_install_req, req_to_install.name,
+                extras_requested=available_requested))
+        return more_reqs
+
+    def to_graph(self):
+        """Return the graph of the requirements to install
+
+        :rtype: pip_compile.graph.DependencyGraph
+
+        """
+        return DependencyGraph.from_requirement_set(self)
+
+    def to_dict(self):
+        return self.to_graph().to_dict()
+
+
+class CompileCommand(RequirementCommand):
+    """
+    Compile a list of required packages and versions which are pinned to
+    a list of constraints. Packages are retrieved from:
+
+    - PyPI (and other indexes) using requirement specifiers.
+    - VCS project urls.
+    - Local project directories.
+    - Local or remote source archives.
+
+    pip_compile also supports compiling the list from "requirements files",
+    which provide an easy way to specify a whole environment to be installed.
+
+    This command was modelled after the built-in "install" command in Pip 7.1.2,
+    with several options and steps removed which are only relevant for actually
+    installing the packages, and are not needed when only compiling a list of
+    requirements.
+
+    """
+    name = 'compile'
+
+    usage = """
+      pip_compile.py [options] -c <constraints file> <requirement specifier> [package-index-options] ...
+      pip_compile.py [options] -c <constraints file> -r <requirements file> [package-index-options] ...
+      pip_compile.py [options] -c <constraints file> [-e] <vcs project url> ...
+      pip_compile.py [options] -c <constraints file> <archive url/path> ..."""
+
+    summary = 'Compile pinned packages.'
+
+    #: The :class:`pip_compile.server.CompileServer` running this command
+    server = None
+    #: The command line arguments last parsed
+    argv = None
+
+    def __init__(self, *args, **kw):
+        super(RequirementCommand, self).__init__(*args, **kw)
+
+        cmd_opts = self.cmd_opts
+
+        cmd_opts.add_option(cmdoptions.constraints())
+        cmd_opts.add_option(cmdoptions.editable())
+        cmd_opts.add_option(cmdoptions.requirements())
+        cmd_opts.add_option(cmdoptions.build_dir())
+
+        # pip_compile omits the following 'pip install' command line options:
+        #     '-t', '--target'
+        #     dest='target_dir'
+        #     '-d', '--download', '--download-dir', '--download-directory'
+        #     dest='download_dir'
+        # cmd_opts.add_option(cmdoptions.download_cache())
+
+        cmd_opts.add_option(cmdoptions.src())
+
+        # pip_compile omits the following 'pip install' command line options:
+        #     '-U', '--upgrade'
+        #     '--force-reinstall'
+        #     '-I', '--ignore-installed'
+
+        cmd_opts.add_option(cmdoptions.no_deps())
+
+        cmd_opts.add_option(cmdoptions.install_options())
+        cmd_opts.add_option(cmdoptions.global_options())
+
+        # pip_compile omits the following 'pip install' command line options:
+        #     '--user'
+        #     dest='use_user_site'
+        #     '--egg'
+        #     dest='as_egg'
+        #     '--root'
+        #     dest='root_path'
+        #     '--prefix'
+        #     dest='prefix_path'
+        #     "--compile"
+        #     "--no-compile"
+        #     dest="compile"
+
+        cmd_opts.add_option(cmdoptions.use_wheel())
+        cmd_opts.add_option(cmdoptions.no_use_wheel())
+        cmd_opts.add_option(cmdoptions.no_binary())
+        cmd_opts.add_option(cmdoptions.only_binary())
+        cmd_opts.add_option(cmdoptions.pre())
+        cmd_opts.add_option(cmdoptions.no_clean())
+        cmd_opts.add_option(cmdoptions.require_hashes())
+
+        # pip_compile adds the --flat, --output, --json-output,
+        # --json-format, --allow-double, --jobs, --build-jobs, --metadata-cache,
+        # --incremental, --resolution-cache, --batch, --batch-jobs, --serve,
+        # --connect, --index-cache-ttl, --offline, --timings, --record,
+        # --replay, --target, --prefetch, --check, --unpack-cache,
+        # --unpack-cache-size, --release-builds, --max-rss, --max-build-size
+        # and --cache-max-size command line options:
+        cmd_opts.add_option(
+            '--flat',
+            action='store_true',
+            default=False,
+            help='Do not recurse into dependencies.')
+        cmd_opts.add_option(
+            '-o',
+            '--output',
+            action='store',
+            default=None,
+            help='Output the list of pinned packages to the given path.')
+        cmd_opts.add_option(
+            '-j',
+            '--json-output',
+            action='store',
+            default=None,
+            help='Output a dependency graph of pinned packages as JSON to the '
+                 'given path.')
+        cmd_opts.add_option(
+            '--json-format',
+            dest='json_format',
+            type='choice',
+            choices=JSON_FORMATS,
+            default='json',
+            help='Write the --json-output graph as one JSON object ("json"), '
+                 'or as one JSON object per line and package ("ndjson").')
+        cmd_opts.add_option(
+            '--allow-double',
+            action='store_true',
+            default=False,
+            help="Allow double requirements.")
+        cmd_opts.add_option(
+            '--jobs',
+            dest='jobs',
+            type='int',
+            metavar='N',
+            default=1,
+            help='Prepare up to N requirements concurrently.')
+        cmd_opts.add_option(
+            '--build-jobs',
+            dest='build_jobs',
+            type='int',
+            metavar='N',
+            default=None,
+            help='Build up to N wheels concurrently when populating the wheel '
+                 'cache. Defaults to the value of --jobs.')
+        cmd_opts.add_option(
+            '--metadata-cache',
+            action='store_true',
+            default=False,
+            help='Store dependency metadata of pinned packages and local '
+                 'directories in the cache directory, and use it instead of '
+                 'downloading and building the packages again.')
+        cmd_opts.add_option(
+            '--incremental',
+            dest='incremental',
+            metavar='PREVIOUS_JSON',
+            default=None,
+            help='Reuse dependencies of unchanged pins from a JSON dependency '
+                 'graph written earlier with --json-output.')
+        cmd_opts.add_option(
+            '--resolution-cache',
+            action='store_true',
+            default=False,
+            help='Store compiled results in the cache directory and reuse '
+                 'them when requirements, constraints and options are '
+                 'unchanged.')
+        cmd_opts.add_option(
+            '--batch',
+            dest='batch',
+            metavar='MANIFEST',
+            default=None,
+            help='Compile all jobs listed in a JSON manifest in one process, '
+                 'sharing the session and caches between them.')
+        cmd_opts.add_option(
+            '--batch-jobs',
+            dest='batch_jobs',
+            type='int',
+            metavar='N',
+            default=1,
+            help='Compile up to N jobs of a --batch manifest concurrently.')
+        cmd_opts.add_option(
+            '--serve',
+            dest='serve',
+            metavar='SOCKET',
+            default=None,
+            help='Listen on a UNIX socket and compile requests sent with '
+                 '--connect, keeping sessions and caches in memory.')
+        cmd_opts.add_option(
+            '--connect',
+            dest='connect',
+            metavar='SOCKET',
+            default=None,
+            help='Send the compile to a server started with --serve.')
+        cmd_opts.add_option(
+            '--index-cache-ttl',
+            dest='index_cache_ttl',
+            type='int',
+            metavar='SECONDS',
+            default=None,
+            help='Store links found on index pages in the cache directory, '
+                 'and revalidate them after SECONDS.')
+        cmd_opts.add_option(
+            '--offline',
+            action='store_true',
+            default=False,
+            help='Use index pages and HTTP responses from the cache '
+                 'directory only, without accessing the network.')
+        cmd_opts.add_option(
+            '--timings',
+            dest='timings',
+            metavar='FILE',
+            default=None,
+            help='Write the time spent in each phase and for each package, '
+                 'and counts of HTTP requests and cache hits, to FILE in '
+                 'Chrome trace event format.')
+        cmd_opts.add_option(
+            '--record',
+            dest='record',
+            metavar='DIR',
+            default=None,
+            help='Store all index pages and artifacts fetched over HTTP and '
+                 'HTTPS in DIR.')
+        cmd_opts.add_option(
+            '--replay',
+            dest='replay',
+            metavar='DIR',
+            default=None,
+            help='Answer HTTP and HTTPS requests from index pages and '
+                 'artifacts stored with --record in DIR, without accessing '
+                 'the network.')
+        cmd_opts.add_option(
+            '--target',
+            dest='targets',
+            action='append',
+            metavar='NAME:KEY=VALUE,...',
+            default=[],
+            help='Compile for another Python version or platform, e.g. '
+                 'py38:python_version=3.8,platform=linux_x86_64. Keys are '
+                 'environment marker variables and the platform, abi and '
+                 'implementation wheel tags. Repeat to compile for several '
+                 'targets in one run. A {target} placeholder in --output and '
+                 '--json-output writes a file per target; otherwise --output '
+                 'gets the requirements of all targets merged with '
+                 'environment markers. Sdists are prepared with the running '
+                 'interpreter, so dependencies their setup.py computes '
+                 'without environment markers are those of the running '
+                 'interpreter.')
+        cmd_opts.add_option(
+            '--prefetch',
+            dest='prefetch',
+            type='int',
+            metavar='N',
+            default=0,
+            help='Look up requirements and constraints pinned with == and '
+                 'download the artifacts of the requirements in N background '
+                 'threads while resolving.')
+        cmd_opts.add_option(
+            '--check',
+            dest='check',
+            metavar='EXISTING_OUTPUT',
+            default=None,
+            help='Instead of writing outputs, check that EXISTING_OUTPUT and '
+                 'the --json-output graph match the current requirements '
+                 'and constraints. Exits with an error and shows a diff if '
+                 'they don\'t. Dependencies are taken from the existing graph '
+                 'and from metadata in the cache directory when possible.')
+        cmd_opts.add_option(
+            '--unpack-cache',
+            action='store_true',
+            default=False,
+            help='Keep unpacked sdists and their egg_info output in the cache '
+                 'directory by the SHA-256 of the artifact, and read their '
+                 'metadata from there instead of downloading and building '
+                 'them again.')
+        cmd_opts.add_option(
+            '--unpack-cache-size',
+            dest='unpack_cache_size',
+            type='int',
+            metavar='MB',
+            default=DEFAULT_MAX_SIZE,
+            help='Remove the least recently used unpacked sdists when the '
+                 'unpack cache grows beyond MB megabytes (default: '
+                 '%default).')
+        cmd_opts.add_option(
+            '--git-mirrors',
+            action='store_true',
+            default=False,
+            help='Clone non-editable Git requirements from bare mirrors of '
+                 'their repositories kept in the cache directory, and only '
+                 'fetch a mirror when it lacks the pinned tag or commit.')
+        cmd_opts.add_option(
+            '--constraint-cache',
+            action='store_true',
+            default=False,
+            help='Store parsed constraints files in the cache directory, and '
+                 'read them from there until the files change.')
+        cmd_opts.add_option(
+            '--release-builds',
+            action='store_true',
+            default=False,
+            help='Remove the build directory of each package as soon as its '
+                 'metadata has been read and its wheel built, instead of '
+                 'keeping all of them until the compile finishes.')
+        cmd_opts.add_option(
+            '--max-rss',
+            dest='max_rss',
+            type='int',
+            metavar='MB',
+            default=None,
+            help='Fail if the memory use of pip-compile grows beyond MB '
+                 'megabytes.')
+        cmd_opts.add_option(
+            '--max-build-size',
+            dest='max_build_size',
+            type='int',
+            metavar='MB',
+            default=None,
+            help='Fail if the build directory grows beyond MB megabytes.')
+        cmd_opts.add_option(
+            '--cache-max-size',
+            dest='cache_max_size',
+            type='int',
+            metavar='MB',
+            default=None,
+            help='After compiling, remove the least recently used wheels, '
+                 'metadata and other cached entries until the cache '
+                 'directory fits in MB megabytes. See also "pip-compile '
+                 'cache stats".')
+
+        index_opts = cmdoptions.make_option_group(
+            cmdoptions.index_group,
+            self.parser,
+        )
+
+        self.parser.insert_option_group(0, index_opts)
+        self.parser.insert_option_group(0, cmd_opts)
+
+        # pip_compile keeps the original list defaults for parse_args():
+        self._list_defaults = {
+            dest: list(default)
+            for dest, default in self.parser.defaults.items()
+            if isinstance(default, list)}
+
+    def parse_args(self, args):
+        """Parse command line arguments
+
+        *pip_compile modifications:*
+
+        The options of pip's ``cmdoptions`` share one default list object
+        between all parsers, and options like ``--find-links`` append to that
+        list. Each parse gets fresh copies of the list defaults, so values
+        don't accumulate when a ``--serve`` process parses many command lines.
+
+        """
+        for dest, default in self._list_defaults.items():
+            self.parser.defaults[dest] = list(default)
+        self.argv = list(args)
+        return super(CompileCommand, self).parse_args(args)
+
+    def run(self, options, args):
+        if options.version:
+            sys.stdout.write(version_line())
+            return SUCCESS
+        targets = self.check_options(options, args)
+        if options.connect:
+            # pip_compile.main() sends the compile to the server before the
+            # command line is parsed
+            raise Exception('--connect is only supported by the pip-compile '
+                            'command')
+        if options.serve:
+            if self.server is not None or args or options.requirements or \
+                    options.editables or options.batch:
+                raise Exception('--serve takes no requirements; send them '
+                                'with --connect instead')
+            # UNIX sockets aren't available on Windows, so only import the
+            # server when needed
+            from pip_compile.server import serve
+            serve(options.serve, self.__class__)
+            return SUCCESS
+        metadata_store = self.prepare_options(options)
+
+        with timings.recording(options.timings), \
+                usage.recording(options.cache_dir, options.cache_max_size):
+            if options.batch:
+                # Jobs share prepared metadata in memory even without a cache
+                return self.run_batch(
+                    options, metadata_store or MetadataStore())
+
+            if targets:
+                return self.run_targets(
+                    options, args, targets, metadata_store or MetadataStore())
+
+            with self.create_context(options, metadata_store) as context:
+                if options.check:
+                    status = self.check_outputs(options, args, context)
+                else:
+                    self.compile_and_write(options, args, context)
+                    status = SUCCESS
+            self.store_shortcut(options, args)
+            return status
+
+    def check_options(self, options, args=()):
+        """Validate combinations of command line options
+
+        :param options: Parsed command line options
+        :param args: Positional command line arguments
+        :return: The parsed ``--target`` options
+        :rtype: list of pip_compile.targets.Target
+
+        """
+        if options.allow_double and not options.constraints:
+            raise Exception('--allow-double can only be used together with -c /'
+                            '--constraint')
+        if options.jobs < 1 or options.batch_jobs < 1 or (
+                options.build_jobs is not None and options.build_jobs < 1):
+            raise Exception('--jobs, --build-jobs and --batch-jobs must be at '
+                            'least 1')
+        if options.index_cache_ttl is not None and options.index_cache_ttl < 0:
+            raise Exception('--index-cache-ttl must not be negative')
+        if options.prefetch < 0:
+            raise Exception('--prefetch must not be negative')
+        if options.unpack_cache_size < 1:
+            raise Exception('--unpack-cache-size must be at least 1')
+        if options.max_rss is not None and options.max_rss < 1:
+            raise Exception('--max-rss must be at least 1')
+        if options.max_build_size is not None and options.max_build_size < 1:
+            raise Exception('--max-build-size must be at least 1')
+        if options.cache_max_size is not None and options.cache_max_size < 0:
+            raise Exception('--cache-max-size must not be negative')
+        if options.release_builds and options.no_clean:
+            raise Exception('--release-builds can\'t be combined with '
+                            '--no-clean')
+        if options.record and options.replay:
+            raise Exception('--record and --replay can\'t be used together')
+        if options.batch and (args or options.requirements or
+                              options.editables or options.output or
+                              options.json_output or options.incremental):
+            raise Exception('--batch can only be combined with options shared '
+                            'by all jobs, e.g. -c / --constraint')
+        if options.check and (options.output or options.incremental or
+                              options.batch or options.targets):
+            raise Exception('--check can\'t be combined with --output, '
+                            '--incremental, --batch or --target')
+        targets = [Target.parse(spec) for spec in options.targets]
+        if targets:
+            if options.batch or options.incremental:
+                raise Exception('--target can\'t be combined with --batch or '
+                                '--incremental')
+            if len(set(target.name for target in targets)) < len(targets):
+                raise Exception('--target names must be unique')
+            if (options.json_output and
+                    TARGET_PLACEHOLDER not in options.json_output):
+                raise Exception('--json-output needs a {} placeholder when '
+                                'compiling for several targets'
+                                .format(TARGET_PLACEHOLDER))
+        return targets
+
+    def prepare_options(self, options):
+        """Normalize options and disable caches which can't be used
+
+        :param options: Parsed command line options, which are modified in
+                        place
+        :return: The metadata store to use, or ``None``
+        :rtype: pip_compile.metadata.MetadataStore
+
+        """
+        cmdoptions.resolve_wheel_no_use_binary(options)
+        cmdoptions.check_install_build_global(options)
+
+        # Removed handling for the following options which are not included in
+        # pip_compile:
+        # options.allow_external
+        # options.allow_all_external
+        # options.allow_unverified
+        # options.download_dir
+        # options.ignore_installed
+
+        if options.build_dir:
+            options.build_dir = os.path.abspath(options.build_dir)
+
+        options.src_dir = os.path.abspath(options.src_dir)
+
+        # pip_compile skips building of install_options since it doesn't install
+        # anything:
+        # options.use_user_site:
+        #   --user
+        #   --prefix=
+        # options.target_dir:
+        #   options.ignore_installed
+        #   --home=
+        # options.global_options
+
+        if options.cache_dir and not check_path_owner(options.cache_dir):
+            logger.warning(
+                "The directory '%s' or its parent directory is not owned "
+                "by the current user and caching wheels has been "
+                "disabled. check the permissions and owner of that "
+                "directory. If executing pip with sudo, you may want "
+                "sudo's -H flag.",
+                options.cache_dir,
+            )
+            options.cache_dir = None
+
+        if ((options.index_cache_ttl is not None or options.offline) and
+                not options.cache_dir):
+            logger.warning('The index page cache is not used without a cache '
+                           'directory.')
+
+        if options.resolution_cache and not options.cache_dir:
+            logger.warning('--resolution-cache has no effect without a '
+                           'cache directory.')
+            options.resolution_cache = False
+        if options.unpack_cache and not options.cache_dir:
+            logger.warning('--unpack-cache has no effect without a cache '
+                           'directory.')
+            options.unpack_cache = False
+        if options.git_mirrors and not options.cache_dir:
+            logger.warning('--git-mirrors has no effect without a cache '
+                           'directory.')
+            options.git_mirrors = False
+        if options.constraint_cache and not options.cache_dir:
+            logger.warning('--constraint-cache has no effect without a cache '
+                           'directory.')
+            options.constraint_cache = False
+        if options.cache_max_size is not None and not options.cache_dir:
+            logger.warning('--cache-max-size has no effect without a cache '
+                           'directory.')
+
+        metadata_store = None
+        if options.metadata_cache or options.check:
+            if options.cache_dir:
+                metadata_store = MetadataStore(options.cache_dir)
+            elif options.metadata_cache:
+                logger.warning('--metadata-cache has no effect without a '
+                               'cache directory.')
+        return metadata_store
+
+    def store_shortcut(self, options, args):
+        """Store a shortcut for repeating the compile without importing pip
+
+        Only compiles whose result is in the resolution cache get one. The
+        inputs of the shortcut include the configuration files pip read the
+        options from, and pip itself. See :mod:`pip_compile.shortcuts`.
+
+        :param options: Parsed command line options
+        :param args: Requirement specifiers given on the command line
+
+        """
+        if (self.argv is None or self.server is not None or
+                not options.resolution_cache or options.timings or
+                options.record):
+            return
+        key = resolution_key(options, args, pip.__version__)
+        cached = key and ResolutionCache(options.cache_dir).get(key)
+        if not cached:
+            return
+        graph = StringIO()
+        DependencyGraph.from_dict(cached['graph']).write(graph,
+                                                          options.json_format)
+        outputs = [(options.output, cached['requirements']),
+                   (options.json_output, graph.getvalue())]
+        if options.check:
+            if unpinned_lines(cached['requirements']):
+                return
+            outputs[0] = (options.check, cached['requirements'])
+            if not options.json_output:
+                del outputs[1]
+        outputs = [(path, text) for path, text in outputs if path]
+
+        files, paths = input_digests(options, args)
+        config_files = list(self.parser.files)
+        config_files.append(os.path.join(sys.prefix, config_basename))
+        if os.environ.get('PIP_CONFIG_FILE'):
+            config_files.append(os.environ['PIP_CONFIG_FILE'])
+        inputs = OrderedDict(files)
+        inputs.update(paths)
+        for path in config_files + [os.path.abspath(pip.__file__)]:
+            inputs[path] = path_digest(path)
+        Shortcuts(options.cache_dir).put(
+            shortcut_key(self.argv), key, inputs, outputs, options.check,
+            options.verbose - options.quiet)
+
+    def create_context(self, options, metadata_store):
+        """Create the context for compiling with the given options
+
+        Commands run by a ``--serve`` process use the server's shared
+        contexts.
+
+        :param options: Parsed command line options
+        :param metadata_store: Store for metadata of prepared packages
+        :rtype: pip_compile.context.CompileContext
+
+        """
+        if self.server is not None:
+            return self.server.context(self, options, metadata_store)
+        return CompileContext(self, options, metadata_store)
+
+    def _build_package_finder(self, options, session,
+                              platform=None, python_versions=None,
+                              abi=None, implementation=None):
+        """
+        Create a package finder appropriate to this requirement command.
+
+        *pip_compile modifications:*
+
+        Copied from pip 9.0.1. Creates a :class:`PipCompilePackageFinder`,
+        which caches parsed index pages in memory, and also in the cache
+        directory along with the links chosen for ``==`` pinned requirements
+        when ``--index-cache-ttl`` or ``--offline`` is given. The platform
+        options are only passed on when given, since pip < 9.0.0 doesn't
+        support all of them.
+
+        """
+        index_urls = [options.index_url] + options.extra_index_urls
+        if options.no_index:
+            logger.debug('Ignoring indexes: %s', ','.join(index_urls))
+            index_urls = []
+
+        page_cache = pin_cache = None
+        if options.cache_dir and (options.index_cache_ttl is not None or
+                                  options.offline):
+            page_cache = IndexPageCache(options.cache_dir)
+            pin_cache = PinnedLinkCache(options.cache_dir)
+        platform_options = {'platform': platform,
+                            'versions': python_versions,
+                            'abi': abi,
+                            'implementation': implementation}
+        return PipCompilePackageFinder(
+            find_links=options.find_links,
+            format_control=options.format_control,
+            index_urls=index_urls,
+            trusted_hosts=options.trusted_hosts,
+            allow_all_prereleases=options.pre,
+            process_dependency_links=options.process_dependency_links,
+            session=session,
+            page_ttl=(PAGE_TTL if options.index_cache_ttl is None
+                      else options.index_cache_ttl),
+            page_cache=page_cache,
+            pin_cache=pin_cache,
+            offline=options.offline,
+            **{name: value for name, value in platform_options.items()
+               if value is not None}
+        )
+
+    def _build_session(self, options, retries=None, timeout=None):
+        """Create a session for HTTP requests
+
+        *pip_compile modifications:*
+
+        In ``--offline`` mode, HTTP and HTTPS requests are only answered from
+        pip's HTTP cache. Responses are stored with ``--record`` and taken
+        from the stored ones with ``--replay``. Responses are counted for
+        ``--timings``.
+
+        """
+        session = super(CompileCommand, self)._build_session(
+            options, retries=retries, timeout=timeout)
+        session.hooks['response'].append(timings.count_response)
+        if options.offline:
+            for prefix, adapter in list(session.adapters.items()):
+                if prefix.startswith('http'):
+                    session.mount(prefix, OfflineAdapter(
+                        cache=getattr(adapter, 'cache', None)))
+        if options.record:
+            record(session, options.record)
+        elif options.replay:
+            replay(session, options.replay)
+        return session
+
+    def check_outputs(self, options, args, context):
+        """Check that existing outputs match the current inputs for ``--check``
+
+        Unpinned lines in the existing output fail the check right away.
+        Otherwise the requirements are compiled without writing any outputs.
+        Dependencies of unchanged pins are taken from the existing
+        ``--json-output`` graph like with ``--incremental``, and from the
+        metadata store, so only packages whose pins changed are prepared.
+
+        :param options: Parsed command line options
+        :param args: Requirement specifiers given on the command line
+        :param context: The session, finder and caches to use
+        :type context: pip_compile.context.CompileContext
+        :return: ``SUCCESS``, or ``ERROR`` if the outputs are out of date
+        :rtype: int
+
+        """
+        existing = read_output(options.check)
+        unpinned = unpinned_lines(existing)
+        if unpinned:
+            for line in unpinned:
+                logger.error('%s is not pinned in %s', line, options.check)
+            return ERROR
+
+        check_options = copy.copy(options)
+        check_options.output = check_options.json_output = None
+        if options.json_output and os.path.exists(options.json_output):
+            check_options.incremental = options.json_output
+        requirements, graph = self.compile_and_write(check_options, args,
+                                                     context)
+
+        with timings.span('check'):
+            diffs = [output_diff(options.check, existing, requirements)]
+            if options.json_output:
+                compiled_graph = StringIO()
+                graph.write(compiled_graph, options.json_format)
+                diffs.append(output_diff(options.json_output,
+                                         read_output(options.json_output),
+                                         compiled_graph.getvalue()))
+        diff = ''.join(diffs)
+        if diff:
+            sys.stdout.write(diff)
+            logger.error('The existing outputs don\'t match the current '
+                         'requirements and constraints')
+            return ERROR
+        logger.info('%s is up to date', options.check)
+        return SUCCESS
+
+    def run_targets(self, options, args, targets, metadata_store):
+        """Compile requirements for each ``--target``
+
+        The targets are compiled one after another with a shared context, so
+        index pages, downloads and wheels are only fetched and built once.
+        Unless ``--output`` has a ``{target}`` placeholder, the requirements
+        of all targets are merged into it.
+
+        :param options: Parsed command line options
+        :param args: Requirement specifiers given on the command line
+        :param targets: The targets to compile for
+        :type targets: list of pip_compile.targets.Target
+        :param metadata_store: Store for metadata shared by all targets
+        :rtype: int
+
+        """
+        results = []
+        with self.create_context(options, metadata_store) as context:
+            for target in targets:
+                logger.info('Compiling for %s', target.key)
+                with indent_log(), timings.span('target', target=target.name):
+                    requirements, _ = self.compile_and_write(
+                        target_options(options, target), args, context,
+                        target)
+                results.append((target, requirements))
+
+        if options.output and TARGET_PLACEHOLDER not in options.output:
+            merged = merge_requirements(results)
+            if options.output == '-':
+                sys.stdout.write(merged)
+            else:
+                with open(options.output, 'w') as output:
+                    output.write(merged)
+        return SUCCESS
+
+    def run_batch(self, options, metadata_store):
+        """Compile all jobs listed in the ``--batch`` manifest
+
+        :param options: Parsed command line options shared by all jobs
+        :param metadata_store: Store for metadata shared by all jobs
+        :return: An exit status which is non-zero if any of the jobs failed
+        :rtype: int
+
+        """
+        jobs = load_manifest(options.batch)
+
+        def compile_job(job):
+            logger.info('Compiling %s', job['name'])
+            job_opts, job_args = job_options(options, job)
+            try:
+                with indent_log(), timings.span('batch_job',
+                                                job=job['name']):
+                    self.compile_and_write(job_opts, job_args, context)
+            except Exception as exc:
+                logger.error('Compiling %s failed: %s', job['name'], exc)
+                return False
+            return True
+
+        with self.create_context(options, metadata_store) as context:
+            if options.batch_jobs > 1 and len(jobs) > 1:
+                pool = worker_pool(min(options.batch_jobs, len(jobs)))
+                try:
+                    results = pool.map(compile_job, jobs)
+                finally:
+                    pool.close()
+                    pool.join()
+            else:
+                results = [compile_job(job) for job in jobs]
+
+        failed = [job['name'] for job, success in zip(jobs, results)
+                  if not success]
+        if failed:
+            logger.error('Failed to compile %s', ', '.join(failed))
+            return ERROR
+        return SUCCESS
+
+    def compile_and_write(self, options, args, context, target=None):
+        """Compile requirements and write ``--output`` and ``--json-output``
+
+        Compiled results are taken from and stored into the resolution cache
+        if ``--resolution-cache`` is used.
+
+        :param options: Parsed command line options
+        :param args: Requirement specifiers given on the command line
+        :param context: The session, finder and caches to use
+        :type context: pip_compile.context.CompileContext
+        :param target: The ``--target`` to compile for, or ``None`` for the
+                       running interpreter
+        :type target: pip_compile.targets.Target
+        :return: The pinned requirements as produced by
+                 :func:`print_requirements`, and the dependency graph
+        :rtype: tuple
+
+        """
+        # pip_compile skips resolution altogether if the same inputs have
+        # already been compiled:
+        cache_key = None
+        if options.resolution_cache:
+            resolution_cache = ResolutionCache(options.cache_dir)
+            cache_key = resolution_key(options, args, pip.__version__, target)
+        if cache_key:
+            cached = resolution_cache.get(cache_key)
+            if cached:
+                timings.count('resolution_cache.hits')
+                logger.info('Using cached resolution %s', cache_key)
+                graph = DependencyGraph.from_dict(cached['graph'])
+                write_outputs(options, cached['requirements'], graph)
+                return cached['requirements'], graph
+            timings.count('resolution_cache.misses')
+
+        requirement_set = self.compile(options, args, context, target)
+
+        # pip_compile adds printing out the compiled requirements:
+        graph = requirement_set.to_graph()
+        requirements = StringIO()
+        print_requirements(graph, requirements)
+        requirements = requirements.getvalue()
+        with timings.span('write_outputs'):
+            write_outputs(options, requirements, graph)
+        if cache_key:
+            resolution_cache.put(cache_key, requirements, graph.to_dict())
+
+        # pip_compile skips package installation
+
+        return requirements, graph
+
+    def compile(self, options, args, context, target=None):
+        """Resolve and pin requirements
+
+        :param options: Parsed command line options
+        :param args: Requirement specifiers given on the command line
+        :param context: The session, finder and caches to use
+        :type context: pip_compile.context.CompileContext
+        :param target: The ``--target`` to compile for, or ``None`` for the
+                       running interpreter
+        :type target: pip_compile.targets.Target
+        :rtype: PipCompileRequirementSet
+
+        """
+        if options.flat:
+            return self.compile_flat(options, args, context, target)
+
+        previous_graph = None
+        if options.incremental:
+            previous_graph = PreviousGraph.load(options.incremental)
+
+        build_delete = (not (options.no_clean or options.build_dir))
+
+        with BuildDirectory(options.build_dir,
+                            delete=build_delete) as build_dir:
+            # Additional pip_compile functionality: memory use and build
+            # directory size are measured for --release-builds and checked
+            # against --max-rss and --max-build-size
+            footprint = None
+            if (options.release_builds or options.max_rss or
+                    options.max_build_size):
+                footprint = Footprint(build_dir, options.max_rss,
+                                      options.max_build_size)
+            requirement_set = PipCompileRequirementSet(
+                build_dir=build_dir,
+                src_dir=options.src_dir,
+                download_dir=None,  # not needed
+                # upgrade - option not needed
+                # as_egg - option not needed
+                ignore_installed=True,  # always ignore installed
+                ignore_dependencies=options.ignore_dependencies,
+                # force_reinstall - option not needed
+                # use_user_site - option not needed
+                # target_dir - option not needed
+                session=context.session,
+                # pycompile - option not needed
+                isolated=options.isolated_mode,
+                wheel_cache=context.wheel_cache,
+                # require_hashes - option not needed?
+                allow_double=options.allow_double,
+                jobs=options.jobs,
+                metadata_store=context.metadata_store,
+                git_mirrors=context.git_mirrors,
+                unpack_cache=context.unpack_cache,
+                previous_graph=previous_graph,
+                target=target,
+                release_builds=options.release_builds,
+                footprint=footprint
+            )
+
+            # Additional pip_compile functionality: constraints are parsed
+            # once and used both for populating the requirement set and for
+            # checking that all packages are pinned. Options in the files
+            # are applied to a finder of this compile only.
+            finder = context.new_finder(target)
+            with timings.span('parse_requirements'):
+                constraints = context.constraint_index(options, finder)
+                self.populate_requirement_set(
+                    requirement_set, args, options, context, self.name,
+                    constraints, finder)
+
+            if previous_graph:
+                previous_graph.constrained_names = constraints.names
+
+            # Additional pip_compile functionality: pinned requirements are
+            # looked up and downloaded in the background while resolving
+            with Prefetcher(finder, context.session, context.wheel_cache,
+                            options.prefetch,
+                            context.unpack_cache) as prefetcher:
+                requirement_set.prefetch(prefetcher)
+
+                # Additional pip_compile functionality: fail with an error
+                # message if any resolved package is not pinned to an exact
+                # version in constraints, unless it comes from a local
+                # directory
+                with timings.span('check_pins'):
+                    self.fail_if_any_unpinned_packages(
+                        options, finder, requirement_set, constraints)
+
+                # Conditions for whether to build wheels differ in pip_compile
+                # from original pip:
+                if requirement_set.has_requirements:
+                    if not wheel or not options.cache_dir:
+
+                        # on -d don't do complex things like building
+                        # wheels, and don't try to build wheels when wheel is
+                        # not installed.
+                        with timings.span('prepare_files'):
+                            requirement_set.prepare_files(finder)
+                    else:
+                        # build wheels before install.
+                        wb = PipCompileWheelBuilder(
+                            requirement_set,
+                            finder,
+                            build_options=[],
+                            global_options=[],
+                            jobs=options.build_jobs or options.jobs,
+                        )
+                        if options.release_builds:
+                            # Wheels are built before the build trees are
+                            # released
+                            requirement_set.wheel_builder = wb
+                        # Ignore the result: a failed wheel will be
+                        # installed from the sdist/vcs whatever.
+                        with timings.span('build_wheels'):
+                            wb.build(autobuilding=True)
+
+        if footprint is not None:
+            footprint.report()
+        if previous_graph:
+            logger.info('Reused dependencies of %d packages from %s',
+                        len(previous_graph.reused), options.incremental)
+
+        return requirement_set
+
+    def compile_flat(self, options, args, context, target=None):
+        """Pin requirements to constraints without resolving dependencies
+
+        Used for ``--flat``. Only requirements and constraints are parsed, and
+        local directories are named using stored or static metadata, so no
+        session, package finder or build directory is needed. Local
+        directories without such metadata are still prepared by pip to find
+        out their names, but their dependencies are ignored.
+
+        :param options: Parsed command line options
+        :param args: Requirement specifiers given on the command line
+        :param context: The session, finder and caches to use
+        :type context: pip_compile.context.CompileContext
+        :param target: The ``--target`` to compile for
+        :type target: pip_compile.targets.Target
+        :rtype: PipCompileRequirementSet
+
+        """
+        requirement_set = PipCompileRequirementSet(
+            build_dir=None,  # only needed for preparing local directories
+            src_dir=options.src_dir,
+            download_dir=None,
+            ignore_installed=True,
+            ignore_dependencies=True,
+            session=context.lazy_session,
+            isolated=options.isolated_mode,
+            allow_double=options.allow_double,
+            jobs=options.jobs,
+            metadata_store=context.metadata_store,
+            git_mirrors=context.git_mirrors,
+            unpack_cache=context.unpack_cache,
+            target=target
+        )
+        with timings.span('parse_requirements'):
+            constraints = context.constraint_index(options)
+            self.populate_requirement_set(
+                requirement_set, args, options, context, self.name,
+                constraints)
+        requirement_set.name_local_directories()
+        if all(req.prepared for req in requirement_set.unnamed_requirements):
+            with timings.span('check_pins'):
+                self.fail_if_any_unpinned_packages(
+                    options, None, requirement_set, constraints)
+            return requirement_set
+
+        build_delete = (not (options.no_clean or options.build_dir))
+        with BuildDirectory(options.build_dir,
+                            delete=build_delete) as build_dir:
+            requirement_set.build_dir = build_dir
+            with timings.span('check_pins'):
+                self.fail_if_any_unpinned_packages(
+                    options, context.new_finder(target), requirement_set,
+                    constraints)
+        return requirement_set
+
+    def populate_requirement_set(self, requirement_set, args, options,
+                                 context, name, constraints, finder=None):
+        """
+        Marshal cmd line args into a requirement set.
+
+        *pip_compile modifications:*
+
+        Copied from pip 9.0.1. Requirements files are parsed through the
+        compile context, so files shared by batch jobs are only parsed once,
+        and options in them are applied to ``finder``, the package finder of
+        this compile. Constraints are taken from an already parsed
+        :class:`pip_compile.constraints.ConstraintIndex`. ``--flat`` compiles
+        don't use a wheel cache.
+
+        """
+        for req in constraints.requirements():
+            requirement_set.add_requirement(req)
+
+        wheel_cache = None if options.flat else context.wheel_cache
+        for req in args:
+            requirement_set.add_requirement(
+                InstallRequirement.from_line(
+                    req, None, isolated=options.isolated_mode,
+                    wheel_cache=wheel_cache
+                )
+            )
+
+        for req in options.editables:
+            requirement_set.add_requirement(
+                InstallRequirement.from_editable(
+                    req,
+                    default_vcs=options.default_vcs,
+                    isolated=options.isolated_mode,
+                    wheel_cache=wheel_cache
+                )
+            )
+
+        found_req_in_file = False
+        for filename in options.requirements:
+            for req in context.parse_requirements(filename, options,
+                                                  finder=finder):
+                found_req_in_file = True
+                requirement_set.add_requirement(req)
+        # If --require-hashes was a line in a requirements file, tell
+        # RequirementSet about it:
+        requirement_set.require_hashes = options.require_hashes
+
+        if not (args or options.editables or found_req_in_file):
+            opts = {'name': name}
+            if options.find_links:
+                msg = ('You must give at least one requirement to '
+                       '%(name)s (maybe you meant "pip %(name)s '
+                       '%(links)s"?)' %
+                       dict(opts, links=' '.join(options.find_links)))
+            else:
+                msg = ('You must give at least one requirement '
+                       'to %(name)s (see "pip help %(name)s")' % opts)
+            logger.warning(msg)
+
+    def fail_if_any_unpinned_packages(self,
+                                      options, finder,
+                                      requirement_set, constraints):
+        """Terminate with an error if any packages are not pinned to a version
+
+        Make sure all resolved dependencies are either
+
+        - pinned to a strict version in constraints, or
+        - coming from a local directory ("unnamed requirements")
+
+        :param constraints: The parsed constraints of the compile
+        :type constraints: pip_compile.constraints.ConstraintIndex
+
+        """
+        # Hash requirement check copied from
+        # pip.req_set.RequirementSet.prepare_files()
+        require_hashes = (
+            requirement_set.require_hashes or
+            any(req.has_hash_options
+                for req in requirement_set.unnamed_requirements))
+        if require_hashes and self.as_egg:
+            raise InstallationError(
+                '--egg is not allowed with --require-hashes mode, '
+                'since it delegates dependency resolution to '
+                'setuptools and could thus result in installation of '
+                'unhashed packages.')
+
+        # Find out package names for all unnamed requirements, i.e.
+        # those expressed as a directory path
+        requirement_set.prepare_unnamed_requirements(finder, require_hashes)
+
+        # Now the package names have been injected into previously
+        # unnamed requirement objects
+        unnamed_requirement_names = {
+            req.name for req in requirement_set.unnamed_requirements}
+
+        # Find out if any of the resolved packages are not pinned and
+        # are not coming from a local directory ("unnamed requirements")
+        to_install = requirement_set._to_install()
+        non_pinned = [req for req in to_install
+                      if not is_pinned(req)
+                      and req.name not in constraints
+                      and req.name not in unnamed_requirement_names]
+
+        # If any such packages are found, terminate with an error
+        # message. We never want to resolve packages to a version which
+        # wasn't defined in constraints, unless the package comes from a
+        # local directory
+        if non_pinned:
+            message = (
+                "These packages in requirements:\n"
+                "{}\n"
+                "aren't pinned to a specific version"
+                    .format('\n'.join('- {}'.format(mc)
+                                      for mc in non_pinned)))
+            if options.constraints:
+                message += (
+                    "\nnor in constraints:\n{}"
+                        .format('\n'.join('- {}'.format(c)
+                                          for c in
+                                          options.constraints)))
+            raise Exception(message)
+
+
+def print_requirements(requirement_set, output=sys.stdout):
+    """Write pinned requirements with dependencies before their dependents
+
+    :param requirement_set: The compiled requirement set, or a graph built
+                            from it
+    :param output: The stream to write to
+
+    """
+    graph = requirement_set
+    if not isinstance(graph, DependencyGraph):
+        graph = DependencyGraph.from_requirement_set(requirement_set)
+    for node in graph.topological_order():
+        req = graph.requirements[node]
+        if req.link and req.link.url.startswith('git+'):
+            output.write('{editable}{link}\n'
+                         .format(editable='-e ' if req.editable else '',
+                                 link=req.link))
+        else:
+            output.write('{editable}{name}{specifier}\n'
+                         .format(editable='-e ' if req.editable else '',
+                                 name=req.name,
+                                 specifier=req.specifier))
+
+
+def read_output(path):
+    """Read an existing output for ``--check``
+
+    :return: The contents, or an empty string if the file doesn't exist
+    :rtype: str
+
+    """
+    try:
+        with io.open(path, encoding='utf-8') as f:
+            return f.read()
+    except IOError:
+        return u''
+
+
+def unpinned_lines(requirements):
+    """Find lines of a compiled requirements list which aren't pinned
+
+    :param requirements: Output of :func:`print_requirements`
+    :rtype: list of str
+
+    """
+    unpinned = []
+    for line in requirements.splitlines():
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        if line.startswith('-e '):
+            install_req = InstallRequirement.from_editable(line[3:].strip())
+        else:
+            install_req = InstallRequirement.from_line(line)
+        if not is_pinned(install_req):
+            unpinned.append(line)
+    return unpinned
+
+
+def output_diff(path, existing, compiled):
+    """Show how an existing output differs from the compiled one
+
+    The outputs are compared as returned by
+    :func:`pip_compile.utils.normalized_output`, so packages listed in a
+    different order don't count as differences.
+
+    :return: A unified diff, empty if there are no differences
+    :rtype: str
+
+    """
+    lines = difflib.unified_diff(
+        [line + '\n' for line in normalized_output(existing)],
+        [line + '\n' for line in normalized_output(compiled)],
+        fromfile=path, tofile='{} (compiled)'.format(path))
+    return ''.join(lines)
+
+
+def write_outputs(options, requirements, graph):
+    """Write compiled requirements to ``--output`` and ``--json-output``
+
+    :param options: Parsed command line options
+    :param requirements: The pinned requirements as produced by
+                         :func:`print_requirements`
+    :param graph: The dependency graph of the pinned requirements
+    :type graph: pip_compile.graph.DependencyGraph
+
+    """
+    if options.output == '-':
+        sys.stdout.write(requirements)
+    elif options.output:
+        with open(options.output, 'w') as output:
+            output.write(requirements)
+
+    if options.json_output == '-':
+        graph.write(sys.stdout, options.json_format)
+    elif options.json_output:
+        with open(options.json_output, 'w') as output:
+            graph.write(output, options.json_format)
+
@@ -0,0 +1,166 @@
+"""Parsed constraints indexed by canonical package name"""
+import copy
+import hashlib
+import json
+import os
+from collections import OrderedDict
+
+from pip._vendor.packaging.utils import canonicalize_name
+from pip.req import InstallRequirement
+
+from pip_compile import usage
+from pip_compile.cache import (COMMENT_RE, EDITABLE_RE, INCLUDE_RE,
+                               cache_subdir)
+from pip_compile.utils import atomic_write
+
+
+class ConstraintIndex(object):
+    """The requirements from all constraints files of a compile
+
+    Membership checks compare canonical names as defined in PEP 503, so e.g.
+    ``Foo_Bar`` and ``foo-bar`` refer to the same constrained package.
+
+    """
+    def __init__(self, requirements=()):
+        """Index parsed constraints
+
+        :param requirements: Requirements parsed from constraints files
+        :type requirements: list of pip.req.req_install.InstallRequirement
+
+        """
+        self._requirements = list(requirements)
+        #: Canonical names of the constrained packages
+        self.names = {canonicalize_name(req.name)
+                      for req in self._requirements if req.name}
+
+    def __contains__(self, name):
+        return bool(name) and canonicalize_name(name) in self.names
+
+    def __len__(self):
+        return len(self.names)
+
+    def requirements(self):
+        """Return copies of the constraints for adding to a requirement set"""
+        return [copy.copy(req) for req in self._requirements]
+
+
+def serialize_requirement(install_req):
+    """Convert a parsed requirement into a JSON serializable dict
+
+    :type install_req: pip.req.req_install.InstallRequirement
+    :rtype: collections.OrderedDict
+
+    """
+    if install_req.editable:
+        line = install_req.link.url
+    else:
+        if install_req.link:
+            line = install_req.link.url
+        else:
+            line = str(install_req.req)
+        # pip keeps environment markers apart from the requirement
+        if install_req.markers:
+            line = '{}; {}'.format(line, install_req.markers)
+    return OrderedDict([('line', line),
+                        ('editable', install_req.editable),
+                        ('constraint', install_req.constraint),
+                        ('comes_from', install_req.comes_from),
+                        ('options', install_req.options)])
+
+
+def load_requirement(entry, isolated=False, wheel_cache=None):
+    """Create a requirement from :func:`serialize_requirement` output
+
+    :rtype: pip.req.req_install.InstallRequirement
+
+    """
+    if entry['editable']:
+        return InstallRequirement.from_editable(
+            entry['line'], comes_from=entry['comes_from'],
+            constraint=entry['constraint'], isolated=isolated,
+            wheel_cache=wheel_cache)
+    return InstallRequirement.from_line(
+        entry['line'], entry['comes_from'], constraint=entry['constraint'],
+        isolated=isolated, options=entry['options'], wheel_cache=wheel_cache)
+
+
+def only_requirement_lines(paths):
+    """Check that files don't contain options which affect the whole compile
+
+    Requirement lines, ``-e`` lines and ``-r`` / ``-c`` includes only produce
+    requirements. Other option lines, e.g. ``--index-url``, modify the package
+    finder while parsing, which can't be reproduced from cached requirements.
+
+    :param paths: Paths of requirements files and the files they include.
+                  Paths of directories are skipped.
+    :rtype: bool
+
+    """
+    for path in paths:
+        if not os.path.isfile(path):
+            continue
+        with open(path) as f:
+            for line in f:
+                line = COMMENT_RE.sub('', line).strip()
+                if (line.startswith('-') and not INCLUDE_RE.match(line) and
+                        not EDITABLE_RE.match(line)):
+                    return False
+    return True
+
+
+class ConstraintCache(object):
+    """Parsed constraints files stored on disk
+
+    Parsing a requirements file with pip builds an option parser for every
+    line, which is slow for long constraints files. The requirements are
+    stored in serialized form along with the hashes of the file and the files
+    it includes, and are used as long as none of the files change.
+
+    """
+    def __init__(self, cache_dir):
+        self.directory = cache_subdir(cache_dir, 'constraints')
+
+    def _path(self, filename):
+        key = hashlib.sha256(filename.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, key[:2], '{}.json'.format(key))
+
+    def get(self, filename, digests, isolated=False, wheel_cache=None):
+        """Return the stored requirements of a file, or ``None``
+
+        :param filename: Absolute path of the file
+        :param digests: Current digests of the file and the files it
+                        includes, as returned by
+                        :func:`pip_compile.cache.requirement_file_digests`
+        :rtype: list of pip.req.req_install.InstallRequirement
+
+        """
+        try:
+            with open(self._path(filename)) as f:
+                entry = json.load(f)
+        except (IOError, ValueError):
+            usage.miss('constraints')
+            return None
+        if entry.get('filename') != filename or entry['digests'] != digests:
+            usage.miss('constraints')
+            return None
+        usage.hit('constraints', self._path(filename))
+        return [load_requirement(requirement, isolated, wheel_cache)
+                for requirement in entry['requirements']]
+
+    def put(self, filename, digests, requirements):
+        """Store the requirements parsed from a file
+
+        Nothing is stored if the file or its includes contain options which
+        affect the whole compile.
+
+        """
+        if not only_requirement_lines(digests):
+            return
+        entry = OrderedDict([
+            ('filename', filename),
+            ('digests', digests),
+            ('requirements', [serialize_requirement(req)
+                              for req in requirements])])
+        atomic_write(self._path(filename),
+                     json.dumps(entry, indent=4).encode('utf-8'))
+        usage.use('constraints', self._path(filename))
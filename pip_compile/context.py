@@ -0,0 +1,301 @@
+"""State shared by compiles running in the same process"""
+import copy
+import os
+import threading
+
+from pip.index import FormatControl
+from pip.req import parse_requirements
+
+from pip_compile import timings
+from pip_compile.cache import is_url, requirement_file_digests
+from pip_compile.constraints import ConstraintCache, ConstraintIndex
+from pip_compile.unpack import UnpackCache
+from pip_compile.vcs import GitMirrors
+from pip_compile.wheels import PipCompileWheelCache
+
+
+#: Lists of the package finder which options in requirements files change
+FINDER_LISTS = ('index_urls', 'find_links', 'secure_origins')
+#: Flags of the package finder which options in requirements files set
+FINDER_FLAGS = ('allow_all_prereleases', 'process_dependency_links',
+                'use_wheel')
+
+
+def copy_finder(finder):
+    """Copy a package finder so that changing its options leaves it intact
+
+    The copy shares the session and the index page caches of the original.
+
+    :type finder: pip_compile.index.PipCompilePackageFinder
+    :rtype: pip_compile.index.PipCompilePackageFinder
+
+    """
+    copied = copy.copy(finder)
+    for name in FINDER_LISTS + ('dependency_links',):
+        setattr(copied, name, list(getattr(finder, name)))
+    copied.format_control = FormatControl(
+        set(finder.format_control.no_binary),
+        set(finder.format_control.only_binary))
+    return copied
+
+
+def finder_changes(before, after):
+    """Describe how parsing a requirements file changed a package finder
+
+    :param before: The finder before parsing
+    :param after: A copy of ``before`` used for parsing
+    :return: Changes for :func:`apply_finder_changes`
+    :rtype: list of tuple
+
+    """
+    changes = []
+    for name in FINDER_LISTS:
+        old, new = getattr(before, name), getattr(after, name)
+        if new == old:
+            continue
+        if new[:len(old)] == old:
+            changes.append(('extend', name, new[len(old):]))
+        else:
+            # e.g. --index-url or --no-index
+            changes.append(('replace', name, list(new)))
+    for name in FINDER_FLAGS:
+        value = getattr(after, name, None)
+        if value != getattr(before, name, None):
+            changes.append(('set', name, value))
+    old, new = before.format_control, after.format_control
+    if (new.no_binary, new.only_binary) != (old.no_binary, old.only_binary):
+        changes.append(('set', 'format_control',
+                        (set(new.no_binary), set(new.only_binary))))
+    return changes
+
+
+def apply_finder_changes(finder, changes):
+    """Apply changes returned by :func:`finder_changes` to another finder"""
+    for operation, name, value in changes:
+        if operation == 'extend':
+            getattr(finder, name).extend(
+                item for item in value if item not in getattr(finder, name))
+        elif operation == 'replace':
+            setattr(finder, name, list(value))
+        elif name == 'format_control':
+            finder.format_control = FormatControl(set(value[0]),
+                                                  set(value[1]))
+        else:
+            setattr(finder, name, value)
+
+
+class LazySession(object):
+    """Stands in for the session of a context until it's actually used
+
+    pip requires a session for parsing requirements files and for creating a
+    requirement set, but only uses it for remote files and downloads.
+
+    """
+    def __init__(self, context):
+        self._context = context
+
+    def __getattr__(self, name):
+        return getattr(self._context.session, name)
+
+
+class CompileContext(object):
+    """The session, package finder and caches used for compiling
+
+    A single compile uses a context of its own. In batch mode all jobs share
+    one context, so the HTTP session and its cache, the package finder,
+    parsed requirements and constraints files and the metadata of prepared
+    packages are reused across jobs. Each compile gets a copy of the finder
+    from :meth:`new_finder`, to which the options of its own requirements
+    files are applied, so they don't affect other compiles. With a cache
+    directory and ``--constraint-cache``, parsed constraints files are also
+    stored on disk for later runs, with ``--git-mirrors``, Git requirements
+    are cloned from mirrors kept there, and with ``--unpack-cache``,
+    unpacked sdists are kept there too.
+
+    The session, finder and wheel cache are created when first used, so a
+    compile answered from the resolution cache never builds them. ``--flat``
+    compiles parse files without them, and only use :attr:`lazy_session`.
+
+    """
+    #: Whether remote requirements files are only fetched once
+    reuse_remote_files = True
+
+    def __init__(self, command, options, metadata_store=None):
+        """Create a context from command line options
+
+        :param command: The command whose ``_build_session`` and
+                        ``_build_package_finder`` methods are used
+        :type command: pip_compile.command.CompileCommand
+        :param options: Parsed command line options shared by all compiles
+        :param metadata_store: Store for the metadata of prepared packages
+        :type metadata_store: pip_compile.metadata.MetadataStore
+
+        """
+        self.metadata_store = metadata_store
+        self.constraint_cache = (ConstraintCache(options.cache_dir)
+                                 if options.constraint_cache and
+                                 options.cache_dir else None)
+        self.git_mirrors = (GitMirrors(options.cache_dir, options.offline)
+                            if options.git_mirrors and options.cache_dir
+                            else None)
+        self.unpack_cache = (UnpackCache(options.cache_dir,
+                                         options.unpack_cache_size)
+                             if options.unpack_cache and options.cache_dir
+                             else None)
+        self._command = command
+        self._options = options
+        self._session = None
+        #: Creates the session only if a remote file needs to be fetched
+        self.lazy_session = LazySession(self)
+        self._finder = None
+        self._wheel_cache = None
+        self._parsed = {}
+        self._lock = threading.RLock()
+
+    @property
+    def session(self):
+        with self._lock:
+            if self._session is None:
+                self._session = self._command._build_session(self._options)
+            return self._session
+
+    @property
+    def finder(self):
+        with self._lock:
+            if self._finder is None:
+                self._finder = self._command._build_package_finder(
+                    self._options, self.session)
+            return self._finder
+
+    def new_finder(self, target=None):
+        """Return a package finder for one compile
+
+        The finders of all compiles share the session, the index page cache
+        and command line options with :attr:`finder`. Options in the
+        requirements files a compile parses only change its own finder.
+
+        :param target: The ``--target`` whose wheel tags the finder accepts,
+                       or ``None`` for the running interpreter
+        :type target: pip_compile.targets.Target
+        :rtype: pip_compile.index.PipCompilePackageFinder
+
+        """
+        with self._lock:
+            finder = copy_finder(self.finder)
+        if target is not None:
+            finder.valid_tags = target.supported_tags()
+        return finder
+
+    @property
+    def wheel_cache(self):
+        with self._lock:
+            if self._wheel_cache is None:
+                self._wheel_cache = PipCompileWheelCache(
+                    self._options.cache_dir, self._options.format_control)
+            return self._wheel_cache
+
+    def parse_requirements(self, filename, options, constraint=False,
+                           finder=None):
+        """Parse a requirements or constraints file once per context
+
+        Local files are parsed again when they or the files they include
+        change. Remote files are parsed once, unless
+        :attr:`reuse_remote_files` is false.
+
+        Files are parsed with a copy of :attr:`finder`, and the changes
+        options in the file made to it are recorded. They are applied to
+        ``finder`` every time the file is used, as is a ``--require-hashes``
+        line to ``options``. For ``--flat`` compiles, which don't use a
+        package finder, files are parsed separately without applying options
+        to a finder.
+
+        :param filename: Path or URL of the file
+        :param options: Parsed command line options of the compile
+        :param constraint: Parse the file as a constraints file
+        :param finder: The package finder of the compile, as returned by
+                       :meth:`new_finder`
+        :return: Copies of the parsed requirements, which the caller may add
+                 to a requirement set
+        :rtype: list of pip.req.req_install.InstallRequirement
+
+        """
+        if not is_url(filename):
+            filename = os.path.abspath(filename)
+        digests = requirement_file_digests(filename)
+        key = (filename, constraint, options.flat)
+        with self._lock:
+            entry = self._parsed.get(key)
+            if (entry is None or entry[0] != digests or
+                    digests is None and not self.reuse_remote_files):
+                entry = self._load_constraints(filename, digests, options,
+                                               constraint)
+                if entry is None:
+                    entry = self._parse(filename, digests, options,
+                                        constraint)
+                self._parsed[key] = entry
+            digests, requirements, require_hashes, changes = entry
+        if require_hashes:
+            options.require_hashes = True
+        if finder is not None:
+            apply_finder_changes(finder, changes)
+        return [copy.copy(req) for req in requirements]
+
+    def _load_constraints(self, filename, digests, options, constraint):
+        if not (constraint and digests and self.constraint_cache):
+            return None
+        requirements = self.constraint_cache.get(
+            filename, digests, isolated=options.isolated_mode,
+            wheel_cache=None if options.flat else self.wheel_cache)
+        if requirements is None:
+            timings.count('constraint_cache.misses')
+            return None
+        timings.count('constraint_cache.hits')
+        # Files with option lines aren't stored, so there's no --require-hashes
+        # and no finder options
+        return digests, requirements, False, []
+
+    def _parse(self, filename, digests, options, constraint):
+        require_hashes = options.require_hashes
+        options.require_hashes = False
+        if options.flat:
+            finder, session, wheel_cache = None, self.lazy_session, None
+        else:
+            finder, session, wheel_cache = (copy_finder(self.finder),
+                                            self.session, self.wheel_cache)
+        try:
+            requirements = list(parse_requirements(
+                filename, constraint=constraint, finder=finder,
+                options=options, session=session, wheel_cache=wheel_cache))
+            changes = (finder_changes(self.finder, finder)
+                       if finder is not None else [])
+            entry = (digests, requirements, options.require_hashes, changes)
+        finally:
+            options.require_hashes = require_hashes or options.require_hashes
+        if constraint and digests and self.constraint_cache:
+            self.constraint_cache.put(filename, digests, requirements)
+        return entry
+
+    def constraint_index(self, options, finder=None):
+        """Parse all constraints files of a compile into one index
+
+        :param options: Parsed command line options of the compile
+        :param finder: The package finder of the compile
+        :rtype: pip_compile.constraints.ConstraintIndex
+
+        """
+        return ConstraintIndex(
+            req
+            for filename in options.constraints
+            for req in self.parse_requirements(filename, options,
+                                               constraint=True,
+                                               finder=finder))
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
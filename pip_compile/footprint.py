@@ -0,0 +1,166 @@
+"""Measuring and limiting the memory and disk used by a compile
+
+pip keeps the unpacked source tree of every prepared package in the build
+directory until the compile finishes, so the build directory of a large graph
+can grow to many gigabytes. With ``--release-builds``, each tree is removed as
+soon as its metadata has been read and its wheel built, and the link of the
+requirement no longer refers to the parsed index page it was found on.
+
+A :class:`Footprint` measures the peak memory use of the process and the peak
+size of the build directory after each prepared package, and fails the
+compile when ``--max-rss`` or ``--max-build-size`` is exceeded. The size of
+the build directory is tracked incrementally: the tree of each package is
+measured once after it has been prepared, and its size is subtracted when the
+tree is released.
+
+"""
+import os
+import sys
+import threading
+
+from pip import logger
+from pip.exceptions import InstallationError
+from pip.locations import PIP_DELETE_MARKER_FILENAME
+
+from pip_compile import timings
+from pip_compile.index import make_link
+from pip_compile.utils import tree_size
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+MEGABYTE = 1024 * 1024
+
+
+def peak_rss():
+    """Return the peak resident set size of the process in bytes
+
+    :return: The peak, or ``None`` if it can't be measured on this platform
+    :rtype: int
+
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS and in kilobytes elsewhere
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def release_build(req):
+    """Remove the build tree of a prepared requirement
+
+    Only trees pip unpacked into the build directory are removed, never local
+    directories or editable checkouts. The link of the requirement is replaced
+    by one which refers to the index page by its URL only, so the links of the
+    page can be freed.
+
+    :type req: pip.req.req_install.InstallRequirement
+    :return: Whether a build tree was removed
+    :rtype: bool
+
+    """
+    if req.link is not None and req.link.comes_from is not None:
+        req.link = make_link(req.link.url, str(req.link.comes_from),
+                              getattr(req.link, 'requires_python', None))
+    if (req.editable or not req.source_dir or not os.path.exists(
+            os.path.join(req.source_dir, PIP_DELETE_MARKER_FILENAME))):
+        return False
+    req.remove_temporary_source()
+    req._egg_info_path = None
+    return True
+
+
+class Footprint(object):
+    """The peak memory use and build directory size of a compile"""
+    def __init__(self, build_dir, max_rss=None, max_build_size=None):
+        """Create a footprint
+
+        :param build_dir: The build directory of the compile
+        :param max_rss: The memory limit in megabytes, or ``None``
+        :param max_build_size: The build directory size limit in megabytes,
+                               or ``None``
+
+        """
+        self.build_dir = build_dir and os.path.abspath(build_dir)
+        self.max_rss = max_rss
+        self.max_build_size = max_build_size
+        self.peak_rss = None
+        self.build_size = 0
+        self.peak_build_size = 0
+        self._tree_sizes = {}
+        self._lock = threading.Lock()
+
+    def _build_tree(self, req):
+        """Return the build tree of a requirement in the build directory"""
+        if not self.build_dir or req is None or not req.source_dir:
+            return None
+        source_dir = os.path.abspath(req.source_dir)
+        if not source_dir.startswith(self.build_dir + os.sep):
+            return None
+        return source_dir
+
+    def check(self, req=None):
+        """Measure the memory use and add the build tree of a requirement
+
+        The tree is measured only the first time its requirement is checked.
+
+        :param req: A prepared requirement, or ``None`` to only measure the
+                    memory use
+        :type req: pip.req.req_install.InstallRequirement
+        :raise pip.exceptions.InstallationError: if a limit is exceeded
+
+        """
+        rss = peak_rss()
+        source_dir = self._build_tree(req)
+        tree_bytes = None
+        if source_dir is not None and source_dir not in self._tree_sizes:
+            tree_bytes = tree_size(source_dir)
+        with self._lock:
+            if rss is not None:
+                self.peak_rss = max(self.peak_rss or 0, rss)
+            if (tree_bytes is not None and
+                    source_dir not in self._tree_sizes):
+                self._tree_sizes[source_dir] = tree_bytes
+                self.build_size += tree_bytes
+            build_size = self.build_size
+            self.peak_build_size = max(self.peak_build_size, build_size)
+        if self.max_rss and rss is not None and rss > self.max_rss * MEGABYTE:
+            raise InstallationError(
+                'Memory use of {:.0f} MB exceeds --max-rss {} MB'.format(
+                    float(rss) / MEGABYTE, self.max_rss))
+        if (self.max_build_size and
+                build_size > self.max_build_size * MEGABYTE):
+            raise InstallationError(
+                'Build directory size of {:.0f} MB exceeds --max-build-size '
+                '{} MB'.format(float(build_size) / MEGABYTE,
+                               self.max_build_size))
+
+    def release(self, req):
+        """Release the build tree of a requirement with :func:`release_build`
+
+        :type req: pip.req.req_install.InstallRequirement
+        :return: Whether a build tree was removed
+        :rtype: bool
+
+        """
+        source_dir = self._build_tree(req)
+        if not release_build(req):
+            return False
+        with self._lock:
+            self.build_size -= self._tree_sizes.pop(source_dir, 0)
+        return True
+
+    def report(self):
+        """Log the peaks and record them for ``--timings``"""
+        timings.gauge('footprint.peak_build_bytes', self.peak_build_size)
+        if self.peak_rss is None:
+            logger.info('Peak build directory size: %.1f MB',
+                        float(self.peak_build_size) / MEGABYTE)
+            return
+        timings.gauge('footprint.peak_rss_bytes', self.peak_rss)
+        logger.info('Peak memory use: %.1f MB, peak build directory size: '
+                    '%.1f MB', float(self.peak_rss) / MEGABYTE,
+                    float(self.peak_build_size) / MEGABYTE)
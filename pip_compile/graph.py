@@ -0,0 +1,313 @@
+"""Compiled dependency graphs
+
+A :class:`DependencyGraph` numbers the pinned packages of a compile and keeps
+their dependencies and dependents in compressed adjacency arrays, so graphs
+of thousands of packages can be ordered, exported and queried without
+building a dict or a list of objects per edge.
+
+The graph is exported with ``--json-output`` either as a single JSON object
+mapping each package to its dependencies, or as newline delimited JSON with
+one object per package. ``pip-compile why PACKAGE --graph FILE`` reads either
+format and shows which packages depend on a package.
+
+"""
+import json
+import optparse
+import sys
+from array import array
+from collections import OrderedDict
+
+from pip._vendor import pkg_resources
+from pip._vendor.packaging.utils import canonicalize_name
+
+JSON_FORMATS = ('json', 'ndjson')
+
+
+def _compress(adjacency):
+    """Pack lists of node ids into an offset array and a target array"""
+    offsets = array('i', [0])
+    targets = array('i')
+    for ids in adjacency:
+        targets.extend(ids)
+        offsets.append(len(targets))
+    return offsets, targets
+
+
+def _label_name(label):
+    try:
+        return canonicalize_name(
+            pkg_resources.Requirement.parse(label).project_name)
+    except ValueError:
+        return canonicalize_name(label)
+
+
+class DependencyGraph(object):
+    """Pinned packages and the dependencies between them
+
+    Nodes are numbered from zero in the order they're given. The dependencies
+    of node ``n`` are ``targets[offsets[n]:offsets[n + 1]]``, and dependents
+    are stored the same way in reverse arrays.
+
+    """
+    def __init__(self, labels, dependencies, requirements=None):
+        """Create a graph
+
+        :param labels: The pinned requirement of each node, e.g.
+                       ``Jinja2==2.8``
+        :param dependencies: For each node, the ids of the nodes it depends
+                             on
+        :param requirements: The requirement objects of the nodes, if the
+                             graph is built from a requirement set
+        :type requirements: list of pip.req.req_install.InstallRequirement
+
+        """
+        self.labels = list(labels)
+        self.requirements = requirements
+        self.names = [_label_name(label) for label in self.labels]
+        self._offsets, self._targets = _compress(dependencies)
+        dependents = [[] for _ in self.labels]
+        for node, ids in enumerate(dependencies):
+            for target in ids:
+                dependents[target].append(node)
+        self._reverse_offsets, self._reverse_targets = _compress(dependents)
+        self._ids = {}
+        for node, label in enumerate(self.labels):
+            self._ids.setdefault(label, node)
+            self._ids.setdefault(self.names[node], node)
+
+    @classmethod
+    def from_requirement_set(cls, requirement_set):
+        """Build the graph of the requirements a requirement set would install
+
+        Nodes are in the order of the requirement set, and dependencies in the
+        order they were added, so :meth:`topological_order` matches the order
+        of pip's ``RequirementSet._to_install()``.
+
+        :type requirement_set: pip.req.RequirementSet
+
+        """
+        requirements = [req for req in requirement_set.requirements.values()
+                        if not req.constraint and not req.satisfied_by]
+        ids = {req: node for node, req in enumerate(requirements)}
+        dependencies = [
+            [ids[dependency]
+             for dependency in requirement_set._dependencies.get(req, ())
+             if dependency in ids]
+            for req in requirements]
+        return cls([str(req.req) for req in requirements], dependencies,
+                   requirements)
+
+    @classmethod
+    def from_dict(cls, graph):
+        """Build a graph from a mapping of packages to their dependencies
+
+        :param graph: The graph as returned by :meth:`to_dict`. Dependencies
+                      missing from the keys are added as nodes.
+        :type graph: dict
+
+        """
+        labels = list(graph)
+        ids = {label: node for node, label in enumerate(labels)}
+        dependencies = []
+        for label in list(labels):
+            node_dependencies = []
+            for dependency in graph[label]:
+                if dependency not in ids:
+                    ids[dependency] = len(labels)
+                    labels.append(dependency)
+                node_dependencies.append(ids[dependency])
+            dependencies.append(node_dependencies)
+        dependencies.extend([] for _ in range(len(labels) -
+                                              len(dependencies)))
+        return cls(labels, dependencies)
+
+    @classmethod
+    def load(cls, path):
+        """Read a graph written with ``--json-output`` in either format"""
+        with open(path) as f:
+            text = f.read()
+        try:
+            data = json.loads(text, object_pairs_hook=OrderedDict)
+        except ValueError:
+            data = None
+        if isinstance(data, dict) and not ('package' in data and
+                                           'dependencies' in data):
+            return cls.from_dict(data)
+        # Newline delimited JSON, one package per line
+        graph = OrderedDict()
+        for line in text.splitlines():
+            if line.strip():
+                entry = json.loads(line)
+                graph[entry['package']] = entry['dependencies']
+        return cls.from_dict(graph)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def find(self, name):
+        """Return the id of a node by its label or package name
+
+        :return: The node id, or ``None`` if the package isn't in the graph
+        :rtype: int
+
+        """
+        if name in self._ids:
+            return self._ids[name]
+        return self._ids.get(canonicalize_name(name))
+
+    def dependencies(self, node):
+        """Return the ids of the nodes a node depends on"""
+        return self._targets[self._offsets[node]:self._offsets[node + 1]]
+
+    def dependents(self, node):
+        """Return the ids of the nodes which depend on a node"""
+        return self._reverse_targets[self._reverse_offsets[node]:
+                                     self._reverse_offsets[node + 1]]
+
+    def topological_order(self):
+        """Order nodes so that dependencies come before their dependents
+
+        Nodes are visited depth first in id order without recursion. In a
+        dependency cycle, the node visited first comes last.
+
+        :rtype: list of int
+
+        """
+        offsets, targets = self._offsets, self._targets
+        visited = bytearray(len(self.labels))
+        order = []
+        for root in range(len(self.labels)):
+            if visited[root]:
+                continue
+            visited[root] = 1
+            stack = [[root, offsets[root]]]
+            while stack:
+                top = stack[-1]
+                node, position = top
+                if position < offsets[node + 1]:
+                    top[1] = position + 1
+                    target = targets[position]
+                    if not visited[target]:
+                        visited[target] = 1
+                        stack.append([target, offsets[target]])
+                else:
+                    stack.pop()
+                    order.append(node)
+        return order
+
+    def to_dict(self):
+        """Return a mapping from each package to a list of its dependencies"""
+        return {self.labels[node]: [self.labels[dependency]
+                                    for dependency in self.dependencies(node)]
+                for node in range(len(self.labels))}
+
+    def iter_json(self):
+        """Serialize the graph as one JSON object, one package at a time
+
+        The output matches ``json.dump(graph.to_dict(), f, indent=4)`` except
+        that packages are in topological order.
+
+        :return: Chunks of the JSON text
+        :rtype: iterator of str
+
+        """
+        order = self.topological_order()
+        if not order:
+            yield '{}'
+            return
+        yield '{'
+        for index, node in enumerate(order):
+            dependencies = self.dependencies(node)
+            if dependencies:
+                value = '[\n{}\n    ]'.format(',\n'.join(
+                    '        {}'.format(json.dumps(self.labels[dependency]))
+                    for dependency in dependencies))
+            else:
+                value = '[]'
+            yield '{}\n    {}: {}'.format(',' if index else '',
+                                         json.dumps(self.labels[node]), value)
+        yield '\n}'
+
+    def iter_ndjson(self):
+        """Serialize the graph as one JSON object per line and package
+
+        Packages are in topological order, so each package comes after its
+        dependencies unless they form a cycle.
+
+        :return: The lines, including line feeds
+        :rtype: iterator of str
+
+        """
+        for node in self.topological_order():
+            yield json.dumps(OrderedDict([
+                ('package', self.labels[node]),
+                ('dependencies', [self.labels[dependency]
+                                  for dependency in self.dependencies(node)])
+            ])) + '\n'
+
+    def write(self, output, json_format='json'):
+        """Write the graph to a file object
+
+        :param json_format: One of :data:`JSON_FORMATS`
+
+        """
+        chunks = (self.iter_ndjson() if json_format == 'ndjson'
+                  else self.iter_json())
+        for chunk in chunks:
+            output.write(chunk)
+
+    def why(self, node):
+        """Describe the packages which depend on a node
+
+        :return: Lines of an indented tree with the node at the root and the
+                 packages depending on each package indented below it. Each
+                 package is expanded only once.
+        :rtype: list of str
+
+        """
+        lines = [self.labels[node]]
+        expanded = {node}
+        stack = [(dependent, 1) for dependent in
+                 reversed(self.dependents(node))]
+        while stack:
+            node, depth = stack.pop()
+            if node in expanded:
+                lines.append('{}{} (see above)'.format('  ' * depth,
+                                                       self.labels[node]))
+                continue
+            expanded.add(node)
+            lines.append('{}{}'.format('  ' * depth, self.labels[node]))
+            stack.extend((dependent, depth + 1) for dependent in
+                         reversed(self.dependents(node)))
+        return lines
+
+
+def why_main(args, output=None):
+    """Run ``pip-compile why PACKAGE --graph FILE``
+
+    :param args: Command line arguments after ``why``
+    :param output: Stream for the result, defaults to :data:`sys.stdout`
+    :return: The exit status
+    :rtype: int
+
+    """
+    output = output or sys.stdout
+    parser = optparse.OptionParser(
+        usage='%prog why PACKAGE --graph FILE',
+        description='Show which packages depend on PACKAGE in a dependency '
+                    'graph written with --json-output.')
+    parser.add_option('-g', '--graph', metavar='FILE',
+                      help='The JSON or newline delimited JSON dependency '
+                           'graph')
+    options, packages = parser.parse_args(args)
+    if len(packages) != 1 or not options.graph:
+        parser.error('give one PACKAGE and --graph FILE')
+    graph = DependencyGraph.load(options.graph)
+    node = graph.find(packages[0])
+    if node is None:
+        sys.stderr.write('{} is not in {}\n'.format(packages[0],
+                                                    options.graph))
+        return 1
+    for line in graph.why(node):
+        output.write(line + '\n')
+    return 0
@@ -0,0 +1,447 @@
+"""Finding packages with cached index pages"""
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from pip import logger
+from pip._vendor import requests
+from pip._vendor.cachecontrol import CacheControlAdapter
+from pip._vendor.packaging.utils import canonicalize_name
+from pip._vendor.six.moves.urllib import parse as urllib_parse
+from pip._vendor.six.moves.urllib import request as urllib_request
+from pip.index import (HTMLPage, Link, PackageFinder, egg_info_matches,
+                       fmt_ctl_formats)
+from pip.utils import ARCHIVE_EXTENSIONS
+
+from pip_compile import timings, usage
+from pip_compile.cache import cache_subdir
+from pip_compile.metadata import pinned_version
+from pip_compile.utils import atomic_write
+
+# Seconds to keep using a fetched index page, matching the max-age PyPI sends
+PAGE_TTL = 600
+
+
+def make_link(url, page, requires_python=None):
+    """Create a link found on an index page
+
+    :param url: URL of the link
+    :param page: The page the link was found on, or its URL
+    :param requires_python: The ``data-requires-python`` of the link
+    :rtype: pip.index.Link
+
+    """
+    kwargs = {}
+    # pip < 9.0.0 doesn't know about Requires-Python
+    if requires_python:
+        kwargs['requires_python'] = requires_python
+    return Link(url, page, **kwargs)
+
+
+class LinkPage(object):
+    """The links found on an index page
+
+    Used in place of :class:`pip.index.HTMLPage`, so the parsed HTML doesn't
+    need to be kept around.
+
+    """
+    def __init__(self, url, links):
+        """Create a page
+
+        :param url: URL of the page
+        :param links: ``(url, requires_python)`` pairs of the links on the page
+
+        """
+        self.url = url
+        self.links = [make_link(link_url, self, requires_python)
+                      for link_url, requires_python in links]
+
+    @classmethod
+    def from_html_page(cls, page):
+        return cls(page.url, [(link.url, getattr(link, 'requires_python', None))
+                              for link in page.links])
+
+    def __str__(self):
+        return self.url
+
+
+class IndexPageCache(object):
+    """Links of index pages stored on disk by page URL
+
+    Each entry holds the links found on the page along with the time the page
+    was fetched and its ``ETag`` and ``Last-Modified`` headers, which are used
+    for revalidating the entry.
+
+    """
+    def __init__(self, cache_dir):
+        self.directory = cache_subdir(cache_dir, 'index-pages')
+
+    def _path(self, url):
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, key[:2], '{}.json'.format(key))
+
+    def get(self, url):
+        """Return the stored entry for a page, or ``None``"""
+        try:
+            with open(self._path(url)) as f:
+                entry = json.load(f, object_pairs_hook=OrderedDict)
+        except (IOError, ValueError):
+            usage.miss('index-pages')
+            return None
+        if entry.get('url') != url:
+            usage.miss('index-pages')
+            return None
+        usage.hit('index-pages', self._path(url))
+        return entry
+
+    def put(self, entry):
+        atomic_write(self._path(entry['url']),
+                     json.dumps(entry, indent=4).encode('utf-8'))
+        usage.use('index-pages', self._path(entry['url']))
+
+
+class PinnedLinkCache(object):
+    """Links chosen for requirements pinned with ``==``, stored on disk
+
+    Each entry is keyed by the project, the pinned version and everything else
+    the finder's choice depends on: the indexes and find-links locations, the
+    allowed formats and the supported wheel tags. It holds the URL of the
+    chosen artifact along with its hash, so a later run can use the link
+    without looking at the index pages at all.
+
+    """
+    def __init__(self, cache_dir):
+        self.directory = cache_subdir(cache_dir, 'pinned-links')
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], '{}.json'.format(key))
+
+    def get(self, key):
+        """Return the stored entry for a key, or ``None``"""
+        try:
+            with open(self._path(key)) as f:
+                entry = json.load(f, object_pairs_hook=OrderedDict)
+        except (IOError, ValueError):
+            usage.miss('pinned-links')
+            return None
+        if entry.get('key') != key:
+            usage.miss('pinned-links')
+            return None
+        usage.hit('pinned-links', self._path(key))
+        return entry
+
+    def put(self, key, link, version):
+        """Store the link chosen for a pinned requirement
+
+        :param key: The key computed by the finder
+        :param link: The chosen link
+        :type link: pip.index.Link
+        :param version: The version of the chosen artifact
+
+        """
+        entry = OrderedDict([
+            ('key', key),
+            ('version', version),
+            ('url', link.url),
+            ('hash_name', link.hash_name),
+            ('hash', link.hash),
+            ('requires_python', getattr(link, 'requires_python', None)),
+            ('comes_from', (str(link.comes_from)
+                            if link.comes_from is not None else None)),
+            ('recorded', time.time())])
+        atomic_write(self._path(key),
+                     json.dumps(entry, indent=4).encode('utf-8'))
+        usage.use('pinned-links', self._path(key))
+
+
+def _page_unchanged(entry, response):
+    if response.status_code == 304:
+        return True
+    etag = response.headers.get('ETag')
+    if etag:
+        return etag == entry['etag']
+    last_modified = response.headers.get('Last-Modified')
+    return bool(last_modified) and last_modified == entry['last_modified']
+
+
+def _link_version(link, search):
+    """Return the version string in the filename of a link, or ``None``"""
+    if link.egg_fragment:
+        return egg_info_matches(link.egg_fragment, search.supplied, link)
+    egg_info, ext = link.splitext()
+    if ext == '.whl':
+        parts = link.filename.split('-')
+        return parts[1] if len(parts) in (5, 6) else None
+    if ext not in ARCHIVE_EXTENSIONS:
+        return None
+    return egg_info_matches(egg_info, search.supplied, link)
+
+
+class PipCompilePackageFinder(PackageFinder):
+    """A PackageFinder which caches parsed index pages
+
+    The links of each fetched index page are reused for ``page_ttl`` seconds,
+    so a finder shared by several compiles doesn't fetch and parse the same
+    pages again. With a ``page_cache``, the links are also stored on disk for
+    later runs. Expired entries are revalidated using their ``ETag`` and
+    ``Last-Modified`` headers, and only parsed again if the page changed. In
+    ``offline`` mode, stored entries are used regardless of their age and
+    pages aren't fetched at all.
+
+    For requirements pinned to a single version with ``==``, only the links of
+    that version are evaluated and sorted. With a ``pin_cache``, the chosen
+    link is also stored on disk and reused by later runs for ``page_ttl``
+    seconds, or regardless of its age in ``offline`` mode.
+
+    """
+    def __init__(self, *args, **kwargs):
+        self.page_ttl = kwargs.pop('page_ttl', PAGE_TTL)
+        self.page_cache = kwargs.pop('page_cache', None)
+        self.pin_cache = kwargs.pop('pin_cache', None)
+        self.offline = kwargs.pop('offline', False)
+        self._pages = {}
+        self._pages_lock = threading.Lock()
+        self._local = threading.local()
+        super(PipCompilePackageFinder, self).__init__(*args, **kwargs)
+
+    def find_requirement(self, req, upgrade):
+        """Find a link for a requirement
+
+        *pip_compile modifications:*
+
+        Requirements pinned with ``==`` are first looked up in the pin cache
+        and then among the links of the pinned version only. All versions
+        are only enumerated by pip if no compatible file of the pinned
+        version exists, so that pip reports the available versions.
+
+        """
+        with timings.span('find', package=req):
+            if req.satisfied_by is None and pinned_version(req):
+                link = self._find_pinned(req)
+                if link is not None:
+                    return link
+            return super(PipCompilePackageFinder, self).find_requirement(
+                req, upgrade)
+
+    def _pin_key(self, project_name, version):
+        canonical_name = canonicalize_name(project_name)
+        inputs = {
+            'name': canonical_name,
+            'version': version,
+            'index_urls': self.index_urls,
+            'find_links': self.find_links,
+            'dependency_links': self.dependency_links,
+            'formats': sorted(fmt_ctl_formats(self.format_control,
+                                              canonical_name)),
+            'prereleases': self.allow_all_prereleases,
+            'valid_tags': self.valid_tags,
+            # pip checks Requires-Python against the running interpreter
+            'python': list(sys.version_info[:3]),
+        }
+        serialized = json.dumps(inputs, sort_keys=True).encode('utf-8')
+        return hashlib.sha256(serialized).hexdigest()
+
+    def _find_pinned(self, req):
+        """Find a link for a requirement pinned with ``==``
+
+        :return: The best link of the pinned version, or ``None`` if there is
+                 no compatible file
+        :rtype: pip.index.Link
+
+        """
+        key = None
+        if self.pin_cache is not None:
+            key = self._pin_key(req.name, pinned_version(req))
+            entry = self.pin_cache.get(key)
+            if entry is not None and (
+                    self.offline or
+                    time.time() - entry['recorded'] < self.page_ttl):
+                timings.count('pinned_links.hits')
+                logger.debug('Using recorded link %s for %s',
+                             entry['url'], req)
+                return make_link(entry['url'], entry['comes_from'],
+                                  entry['requires_python'])
+            timings.count('pinned_links.misses')
+        self._local.specifier = req.specifier
+        try:
+            candidates = self.find_all_candidates(req.name)
+        finally:
+            self._local.specifier = None
+        compatible_versions = set(req.specifier.filter(
+            [str(candidate.version) for candidate in candidates],
+            prereleases=self.allow_all_prereleases or None))
+        applicable_candidates = [candidate for candidate in candidates
+                                 if str(candidate.version) in
+                                 compatible_versions]
+        if not applicable_candidates:
+            logger.debug('No compatible file of the pinned version of %s, '
+                         'looking at all versions', req)
+            return None
+        best_candidate = max(applicable_candidates,
+                             key=self._candidate_sort_key)
+        logger.debug('Using pinned version %s', best_candidate.version)
+        if key is not None:
+            self.pin_cache.put(key, best_candidate.location,
+                               str(best_candidate.version))
+        return best_candidate.location
+
+    def _package_versions(self, links, search):
+        """Return the candidates for links
+
+        *pip_compile modifications:*
+
+        While looking for a pinned requirement, links of other versions are
+        dropped before pip evaluates their format, wheel tags and
+        Requires-Python. Versions are only parsed once per version string.
+        Links whose version can't be told from the filename are left for pip
+        to evaluate.
+
+        """
+        specifier = getattr(self._local, 'specifier', None)
+        if specifier is not None:
+            links = self._pinned_links(links, search, specifier)
+        return super(PipCompilePackageFinder, self)._package_versions(
+            links, search)
+
+    @staticmethod
+    def _pinned_links(links, search, specifier):
+        matches = {}
+        for link in links:
+            version = _link_version(link, search)
+            if version is not None:
+                if version not in matches:
+                    matches[version] = specifier.contains(version,
+                                                          prereleases=True)
+                if not matches[version]:
+                    continue
+            yield link
+
+    def _get_page(self, link):
+        now = time.time()
+        with self._pages_lock:
+            fetched, page = self._pages.get(link.url, (None, None))
+        if page is not None and now - fetched < self.page_ttl:
+            timings.count('index_pages.hits')
+            return page
+        if self.page_cache is None:
+            timings.count('index_pages.misses')
+            page = HTMLPage.get_page(link, session=self.session)
+            if page is None:
+                return None
+            page = LinkPage.from_html_page(page)
+        else:
+            entry = self.page_cache.get(link.url)
+            if self.offline:
+                if entry is None:
+                    logger.warning('Skipping %s which is not in the index '
+                                   'page cache', link)
+                    return None
+                timings.count('index_pages.hits')
+            elif entry is None or now - entry['fetched'] >= self.page_ttl:
+                timings.count('index_pages.misses')
+                entry = self._fetch_page(link, entry)
+                if entry is None:
+                    return None
+                self.page_cache.put(entry)
+            else:
+                timings.count('index_pages.hits')
+            page = LinkPage(entry['page_url'], entry['links'])
+        with self._pages_lock:
+            self._pages[link.url] = (now, page)
+        return page
+
+    def _fetch_page(self, link, entry):
+        """Fetch an index page, revalidating a stored entry for it
+
+        Adapted from ``HTMLPage.get_page()`` in pip 9.0.1. VCS and archive
+        links are still handled by pip and aren't stored.
+
+        :param link: Link to the page
+        :param entry: The expired entry for the page, or ``None``
+        :return: The entry to store, or ``None`` if the page couldn't be
+                 fetched
+        :rtype: dict
+
+        """
+        url = link.url.split('#', 1)[0]
+        scheme, netloc, path, params, query, fragment = \
+            urllib_parse.urlparse(url)
+        if (scheme not in ('http', 'https', 'file') or
+                link.filename.endswith(ARCHIVE_EXTENSIONS)):
+            page = HTMLPage.get_page(link, session=self.session)
+            if page is None:
+                return None
+            page = LinkPage.from_html_page(page)
+            return self._entry(link, page, None, time.time())
+
+        # Tack index.html onto file:// URLs that point to directories
+        if (scheme == 'file' and
+                os.path.isdir(urllib_request.url2pathname(path))):
+            # add trailing slash if not present so urljoin doesn't trim
+            # final segment
+            if not url.endswith('/'):
+                url += '/'
+            url = urllib_parse.urljoin(url, 'index.html')
+
+        headers = {'Accept': 'text/html', 'Cache-Control': 'max-age=600'}
+        if entry and entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry['last_modified']:
+            headers['If-Modified-Since'] = entry['last_modified']
+        logger.debug('Getting page %s', url)
+        fetched = time.time()
+        try:
+            response = self.session.get(url, headers=headers)
+            if response.status_code != 304:
+                response.raise_for_status()
+        except requests.RequestException as exc:
+            if entry:
+                logger.warning('Could not revalidate %s: %s - using the '
+                               'cached page', link, exc)
+                return entry
+            logger.debug('Could not fetch URL %s: %s - skipping', link, exc)
+            return None
+
+        if entry and _page_unchanged(entry, response):
+            logger.debug('Page %s is unchanged', url)
+            entry = OrderedDict(entry)
+            entry['fetched'] = fetched
+            return entry
+
+        content_type = response.headers.get('Content-Type', 'unknown')
+        if not content_type.lower().startswith('text/html'):
+            logger.debug('Skipping page %s because of Content-Type: %s',
+                         link, content_type)
+            return None
+        page = LinkPage.from_html_page(
+            HTMLPage(response.content, response.url, response.headers))
+        return self._entry(link, page, response, fetched)
+
+    @staticmethod
+    def _entry(link, page, response, fetched):
+        headers = response.headers if response is not None else {}
+        return OrderedDict([
+            ('url', link.url),
+            ('page_url', page.url),
+            ('fetched', fetched),
+            ('etag', headers.get('ETag')),
+            ('last_modified', headers.get('Last-Modified')),
+            ('links', [(page_link.url,
+                        getattr(page_link, 'requires_python', None))
+                       for page_link in page.links])])
+
+
+class OfflineAdapter(CacheControlAdapter):
+    """A transport adapter which only returns responses from pip's HTTP cache
+
+    Requests which can't be answered from the cache fail with a connection
+    error instead of accessing the network.
+
+    """
+    def get_connection(self, url, proxies=None):
+        raise requests.ConnectionError(
+            'No network access in offline mode: {}'.format(url))
@@ -0,0 +1,283 @@
+"""Metadata of requirements pointing to local directories
+
+Local directories are usually given without a package name, so pip has to run
+``setup.py egg_info`` in each of them to find out what they are. Their
+metadata is stored by directory and interpreter along with a hash of the
+files which define the package, and reused until those files change. When
+only the name and version are needed, they can often be read from the files
+without running anything, see :func:`static_metadata`.
+
+"""
+import ast
+import hashlib
+import io
+import json
+import os
+from collections import OrderedDict
+from email.parser import FeedParser
+
+from pip._vendor.packaging.version import InvalidVersion, Version
+from pip._vendor import six
+from pip._vendor.six.moves import configparser
+from pip.download import url_to_path
+
+from pip_compile import usage
+from pip_compile.cache import cache_subdir, source_tree_digest
+from pip_compile.utils import INTERPRETER, atomic_write
+
+try:
+    from tomllib import loads as toml_loads
+except ImportError:
+    try:
+        from toml import loads as toml_loads
+    except ImportError:
+        toml_loads = None
+
+# Metadata keys of setup() arguments read by static_metadata()
+SETUP_KEYWORDS = {'name': 'name',
+                  'version': 'version',
+                  'python_requires': 'requires_python'}
+
+
+def local_directory(install_req):
+    """Return the local directory a requirement points to
+
+    :type install_req: pip.req.req_install.InstallRequirement
+    :return: The absolute path, or ``None`` if the requirement isn't a local
+             directory
+    :rtype: str
+
+    """
+    link = install_req.link
+    if not link or link.scheme != 'file':
+        return None
+    path = url_to_path(link.url_without_fragment)
+    if not os.path.isdir(path):
+        return None
+    return os.path.abspath(path)
+
+
+def _read(path):
+    try:
+        with io.open(path, encoding='utf-8') as f:
+            return f.read()
+    except (IOError, OSError, UnicodeDecodeError):
+        return None
+
+
+def _pkg_info_metadata(path):
+    """Read the name and version from the ``PKG-INFO`` of an unpacked sdist"""
+    text = _read(os.path.join(path, 'PKG-INFO'))
+    if text is None:
+        return {}
+    feed_parser = FeedParser()
+    feed_parser.feed(text)
+    pkg_info = feed_parser.close()
+    return {'name': pkg_info.get('Name'),
+            'version': pkg_info.get('Version'),
+            'requires_python': pkg_info.get('Requires-Python')}
+
+
+def _pyproject_metadata(path):
+    """Read the name and version from the ``[project]`` table of
+    ``pyproject.toml``, unless they're declared dynamic"""
+    text = _read(os.path.join(path, 'pyproject.toml'))
+    if text is None or toml_loads is None:
+        return {}
+    try:
+        project = toml_loads(text).get('project', {})
+    except ValueError:
+        return {}
+    dynamic = project.get('dynamic', [])
+    return {key: project.get(field)
+            for key, field in (('name', 'name'),
+                               ('version', 'version'),
+                               ('requires_python', 'requires-python'))
+            if field not in dynamic}
+
+
+def _setup_cfg_metadata(path):
+    """Read the name and version from the ``[metadata]`` section of
+    ``setup.cfg``
+
+    Versions read with ``attr:`` or ``file:`` aren't static.
+
+    """
+    parser = configparser.RawConfigParser()
+    try:
+        parser.read(os.path.join(path, 'setup.cfg'))
+    except (configparser.Error, UnicodeDecodeError):
+        return {}
+    metadata = {}
+    for key, section, option in (('name', 'metadata', 'name'),
+                                 ('version', 'metadata', 'version'),
+                                 ('requires_python', 'options',
+                                  'python_requires')):
+        if parser.has_option(section, option):
+            value = parser.get(section, option).strip()
+            if not value.startswith(('attr:', 'file:')):
+                metadata[key] = value
+    return metadata
+
+
+def _setup_py_metadata(path):
+    """Read literal ``name``, ``version`` and ``python_requires`` arguments of
+    the ``setup()`` call in ``setup.py``
+
+    :return: The literal arguments, or ``None`` if there's no single
+             ``setup()`` call or some of the arguments aren't string literals
+             and thus can't be known without running ``setup.py``
+    :rtype: dict
+
+    """
+    text = _read(os.path.join(path, 'setup.py'))
+    if text is None:
+        return {}
+    try:
+        tree = ast.parse(text)
+    except (SyntaxError, ValueError):
+        return None
+    calls = [node for node in ast.walk(tree)
+             if isinstance(node, ast.Call) and
+             getattr(node.func, 'id', getattr(node.func, 'attr', None)) ==
+             'setup']
+    if len(calls) != 1:
+        return None
+    call = calls[0]
+    # Python < 3.5 keeps *args and **kwargs out of the keywords
+    if getattr(call, 'starargs', None) or getattr(call, 'kwargs', None):
+        return None
+    metadata = {}
+    for keyword in call.keywords:
+        if keyword.arg is None:
+            # setup(**kwargs)
+            return None
+        key = SETUP_KEYWORDS.get(keyword.arg)
+        if key:
+            try:
+                value = ast.literal_eval(keyword.value)
+            except ValueError:
+                return None
+            if not isinstance(value, six.string_types):
+                return None
+            metadata[key] = value
+    return metadata
+
+
+def static_metadata(path):
+    """Read the name and version of a local directory package without running
+    ``setup.py``
+
+    The ``PKG-INFO`` file of an unpacked sdist is used if present. Otherwise
+    the ``[project]`` table of ``pyproject.toml`` (if a TOML parser is
+    installed) and ``setup.cfg`` are read, and literal arguments of the
+    ``setup()`` call in ``setup.py`` override ``setup.cfg``.
+
+    :param path: Path of the directory
+    :return: The name, normalized version and Python version requirement in
+             the format of :func:`pip_compile.metadata.extract_metadata`,
+             without any requirements, or ``None`` if the name or version
+             can't be determined statically
+    :rtype: collections.OrderedDict
+
+    """
+    metadata = _pkg_info_metadata(path)
+    if not (metadata.get('name') and metadata.get('version')):
+        metadata = _pyproject_metadata(path)
+    if not (metadata.get('name') and metadata.get('version')):
+        setup_py = _setup_py_metadata(path)
+        if setup_py is None:
+            return None
+        metadata = _setup_cfg_metadata(path)
+        metadata.update(setup_py)
+    name = metadata.get('name')
+    version = metadata.get('version')
+    if not (isinstance(name, six.string_types) and
+            isinstance(version, six.string_types) and name and version):
+        return None
+    try:
+        version = str(Version(version))
+    except InvalidVersion:
+        pass
+    return OrderedDict([('name', name),
+                        ('version', version),
+                        ('requires_python',
+                         metadata.get('requires_python') or None)])
+
+
+class LocalMetadataStore(object):
+    """Metadata of local directory packages stored by path
+
+    Entries are kept in memory, and also on disk if a cache directory is
+    given. An entry is only used while the ``setup.py``, ``setup.cfg`` and
+    ``pyproject.toml`` files of the directory have the same contents as when
+    it was stored, as computed by
+    :func:`pip_compile.cache.source_tree_digest`. Metadata which ``setup.py``
+    reads from other files, e.g. a version number in the package itself, is
+    not tracked. Entries are also keyed by the interpreter which ran
+    ``setup.py``, since it may compute dependencies differently on other
+    interpreters.
+
+    """
+    description = 'stored metadata of local directory'
+
+    def __init__(self, cache_dir=None, interpreter=INTERPRETER):
+        """Create a store
+
+        :param cache_dir: The pip cache directory, or ``None`` for a store
+                          which only lives as long as the process
+        :param interpreter: The interpreter running ``setup.py``
+
+        """
+        self.directory = cache_dir and cache_subdir(cache_dir,
+                                                    'local-metadata')
+        self.interpreter = interpreter
+        self._entries = {}
+
+    def _path(self, path):
+        key = hashlib.sha256('{}\n{}'.format(
+            self.interpreter, path).encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, key[:2], '{}.json'.format(key))
+
+    def get(self, path):
+        """Return stored metadata for a local directory, or ``None``
+
+        :param path: Absolute path of the directory
+
+        """
+        digest = source_tree_digest(path)
+        entry = self._entries.get(path)
+        if entry is None and self.directory:
+            try:
+                with open(self._path(path)) as f:
+                    entry = json.load(f, object_pairs_hook=OrderedDict)
+            except (IOError, ValueError):
+                entry = None
+        if (entry is None or entry.get('path') != path or
+                entry.get('interpreter') != self.interpreter or
+                entry['digest'] != digest):
+            if self.directory:
+                usage.miss('local-metadata')
+            return None
+        if self.directory:
+            usage.hit('local-metadata', self._path(path))
+        self._entries[path] = entry
+        return entry['metadata']
+
+    def put(self, path, metadata):
+        """Store metadata extracted from a prepared local directory
+
+        :param path: Absolute path of the directory
+        :param metadata: Metadata as returned by
+                         :func:`pip_compile.metadata.extract_metadata`
+
+        """
+        entry = OrderedDict([('path', path),
+                             ('interpreter', self.interpreter),
+                             ('digest', source_tree_digest(path)),
+                             ('metadata', metadata)])
+        self._entries[path] = entry
+        if self.directory:
+            atomic_write(self._path(path),
+                         json.dumps(entry, indent=4).encode('utf-8'))
+            usage.use('local-metadata', self._path(path))
@@ -0,0 +1,408 @@
+"""Dependency metadata of prepared packages
+
+The metadata needed for resolving the dependencies of a package is extracted
+from the wheel ``METADATA`` or ``egg_info`` output of a prepared requirement.
+The requirements are stored with their environment markers unevaluated, so the
+dependencies can later be computed for any marker environment without
+downloading or building the package again.
+
+"""
+import hashlib
+import json
+import os
+import sys
+from collections import OrderedDict
+from email.parser import FeedParser
+
+from pip._vendor import pkg_resources
+from pip._vendor.packaging.markers import InvalidMarker, Marker
+from pip._vendor.packaging.specifiers import InvalidSpecifier, SpecifierSet
+from pip._vendor.packaging.utils import canonicalize_name
+from pip._vendor.packaging.version import InvalidVersion, Version
+
+from pip_compile import usage
+from pip_compile.cache import cache_subdir
+from pip_compile.graph import DependencyGraph
+from pip_compile.local import LocalMetadataStore
+from pip_compile.utils import INTERPRETER, atomic_write
+from pip_compile.vcs import VcsMetadataStore
+
+
+def pinned_version(install_req):
+    """Return the version a requirement is pinned to using ``==``
+
+    :param install_req: The requirement to check
+    :type install_req: pip.req.req_install.InstallRequirement or
+                       pip._vendor.pkg_resources.Requirement
+    :return: The normalized version, or ``None`` if the requirement isn't
+             pinned to a single version or points to a link
+    :rtype: str
+
+    """
+    if getattr(install_req, 'link', None) or getattr(install_req, 'editable',
+                                                     False):
+        return None
+    specifiers = list(install_req.specifier)
+    if (len(specifiers) != 1 or
+            specifiers[0].operator != '==' or
+            specifiers[0].version.endswith('.*')):
+        return None
+    try:
+        return str(Version(specifiers[0].version))
+    except InvalidVersion:
+        return None
+
+
+def _parse_pkg_info(dist):
+    if (isinstance(dist, pkg_resources.DistInfoDistribution) and
+            dist.has_metadata('METADATA')):
+        text = dist.get_metadata('METADATA')
+    elif dist.has_metadata('PKG-INFO'):
+        text = dist.get_metadata('PKG-INFO')
+    else:
+        text = ''
+    feed_parser = FeedParser()
+    feed_parser.feed(text)
+    return feed_parser.close()
+
+
+def extract_metadata(dist):
+    """Extract the metadata needed for resolving a distribution's dependencies
+
+    :param dist: A prepared distribution
+    :type dist: pip._vendor.pkg_resources.Distribution
+    :return: A JSON serializable dict with the name, version, Python version
+             requirement and unevaluated requirements of the distribution
+    :rtype: collections.OrderedDict
+
+    """
+    pkg_info = _parse_pkg_info(dist)
+    metadata = OrderedDict([
+        ('name', dist.project_name),
+        ('version', dist.version),
+        ('requires_python', pkg_info.get('Requires-Python'))])
+    if (isinstance(dist, pkg_resources.DistInfoDistribution) and
+            dist.has_metadata('METADATA')):
+        metadata['requires_dist'] = pkg_info.get_all('Requires-Dist') or []
+        metadata['provides_extra'] = pkg_info.get_all('Provides-Extra') or []
+    else:
+        sections = []
+        for name in 'requires.txt', 'depends.txt':
+            if dist.has_metadata(name):
+                sections.extend(
+                    [extra, list(reqs)]
+                    for extra, reqs in pkg_resources.split_sections(
+                        dist.get_metadata_lines(name)))
+        metadata['requires_txt'] = sections
+    return metadata
+
+
+def _evaluate(marker, environment, extra=None):
+    marker_environment = dict(environment or {})
+    marker_environment['extra'] = extra
+    return marker.evaluate(marker_environment)
+
+
+def _unique(reqs):
+    result = []
+    for req in reqs:
+        if req not in result:
+            result.append(req)
+    return result
+
+
+def dependency_map(metadata, environment=None):
+    """Compute the dependencies of a package for each of its extras
+
+    This mirrors how ``pkg_resources`` computes dependencies of egg-info and
+    dist-info distributions, except that markers are evaluated against the
+    given environment instead of the running interpreter.
+
+    :param metadata: Metadata returned by :func:`extract_metadata`
+    :param environment: Marker environment overrides, or ``None`` for the
+                        running interpreter
+    :return: A mapping from safe extra names to lists of requirements. The
+             requirements of the package itself are under the ``None`` key.
+    :rtype: collections.OrderedDict
+
+    """
+    dependencies = OrderedDict([(None, [])])
+    if 'requires_dist' in metadata:
+        reqs = []
+        for line in metadata['requires_dist']:
+            reqs.extend(pkg_resources.parse_requirements(line))
+
+        def reqs_for_extra(extra):
+            return _unique(req for req in reqs
+                           if not req.marker or
+                           _evaluate(req.marker, environment, extra))
+
+        common = reqs_for_extra(None)
+        dependencies[None].extend(common)
+        for extra in metadata['provides_extra']:
+            dependencies[pkg_resources.safe_extra(extra.strip())] = [
+                req for req in reqs_for_extra(extra) if req not in common]
+    else:
+        for extra, reqs in metadata['requires_txt']:
+            if extra:
+                if ':' in extra:
+                    extra, marker = extra.split(':', 1)
+                    try:
+                        if not _evaluate(Marker(marker), environment):
+                            reqs = []
+                    except InvalidMarker:
+                        reqs = []
+                extra = pkg_resources.safe_extra(extra) or None
+            dependencies.setdefault(extra, []).extend(
+                pkg_resources.parse_requirements(reqs))
+    return dependencies
+
+
+def requires_python_matches(metadata, python_version=None):
+    """Check whether a package supports a Python version
+
+    :param metadata: Metadata returned by :func:`extract_metadata`
+    :param python_version: The version to check, defaults to the version of
+                           the running interpreter
+    :rtype: bool
+
+    """
+    if not metadata['requires_python']:
+        return True
+    if python_version is None:
+        python_version = '.'.join(map(str, sys.version_info[:3]))
+    try:
+        specifier = SpecifierSet(metadata['requires_python'])
+    except InvalidSpecifier:
+        # pip also ignores invalid Requires-Python metadata
+        return True
+    return Version(python_version) in specifier
+
+
+def metadata_extras(metadata):
+    """Return the names of the extras a package provides"""
+    return [extra for extra in dependency_map(metadata) if extra]
+
+
+def metadata_requires(metadata, extras=(), environment=None):
+    """Return the requirements of a package with the given extras
+
+    :param metadata: Metadata returned by :func:`extract_metadata`
+    :param extras: Names of extras provided by the package
+    :param environment: Marker environment overrides, or ``None`` for the
+                        running interpreter
+    :rtype: list of pip._vendor.pkg_resources.Requirement
+
+    """
+    dependencies = dependency_map(metadata, environment)
+    requires = list(dependencies[None])
+    for extra in extras:
+        requires.extend(dependencies[pkg_resources.safe_extra(extra)])
+    return requires
+
+
+def artifact_key(link):
+    """Identify the artifact metadata is extracted from
+
+    :type link: pip.index.Link
+    :return: The hash of the artifact given in the link, its URL if the link
+             has no hash, or ``None`` if there is no link
+    :rtype: str
+
+    """
+    if link is None:
+        return None
+    if link.hash:
+        return '{}={}'.format(link.hash_name, link.hash)
+    return link.url_without_fragment
+
+
+class MetadataStore(object):
+    """Package metadata stored by package name, version and artifact
+
+    Entries are kept in memory, and also on disk if a cache directory is
+    given. Each entry is keyed by the artifact the metadata was extracted
+    from, as returned by :func:`artifact_key`, and unless the artifact is a
+    wheel also by the :data:`INTERPRETER` which ran ``setup.py``, since
+    ``setup.py`` may compute dependencies differently on other interpreters.
+    Metadata of local directories is kept in the :attr:`local` store, and
+    metadata of Git requirements in the :attr:`vcs` store.
+
+    """
+    description = 'stored metadata'
+    #: The artifact must be known for looking up metadata
+    needs_link = True
+
+    def __init__(self, cache_dir=None):
+        """Create a store
+
+        :param cache_dir: The pip cache directory, or ``None`` for a store
+                          which only lives as long as the process
+
+        """
+        self.directory = cache_dir and cache_subdir(cache_dir, 'metadata')
+        self._entries = {}
+        #: Metadata of local directory requirements
+        self.local = LocalMetadataStore(cache_dir)
+        #: Metadata of Git requirements
+        self.vcs = VcsMetadataStore(cache_dir)
+
+    def _key(self, name, version, link):
+        interpreter = (None if link is not None and link.is_wheel
+                       else INTERPRETER)
+        return (canonicalize_name(name), version, artifact_key(link),
+                interpreter)
+
+    def _path(self, key):
+        name, version = key[:2]
+        digest = hashlib.sha256(json.dumps(key[2:]).encode('utf-8'))
+        return os.path.join(self.directory, name, '{}-{}.json'.format(
+            version, digest.hexdigest()))
+
+    def has_version(self, name, version):
+        """Tell whether metadata of a package version is stored for any
+        artifact
+
+        :rtype: bool
+
+        """
+        name = canonicalize_name(name)
+        if any(key[:2] == (name, version) for key in list(self._entries)):
+            return True
+        if not self.directory:
+            return False
+        try:
+            filenames = os.listdir(os.path.join(self.directory, name))
+        except OSError:
+            return False
+        # Normalized versions don't contain dashes
+        prefix = '{}-'.format(version)
+        return any(filename.startswith(prefix) for filename in filenames)
+
+    def get(self, name, version, extras=(), link=None):
+        """Return stored metadata for a package version, or ``None``
+
+        The metadata covers all extras of the package, so ``extras`` is
+        ignored.
+
+        :param link: The artifact of the package version
+        :type link: pip.index.Link
+
+        """
+        key = self._key(name, version, link)
+        if key in self._entries:
+            if self.directory:
+                usage.hit('metadata', self._path(key))
+            return self._entries[key]
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(key)) as f:
+                entry = json.load(f, object_pairs_hook=OrderedDict)
+        except (IOError, ValueError):
+            usage.miss('metadata')
+            return None
+        usage.hit('metadata', self._path(key))
+        self._entries[key] = entry
+        return entry
+
+    def put(self, metadata, link=None):
+        """Store metadata returned by :func:`extract_metadata`
+
+        :param metadata: The metadata to store
+        :param link: The artifact the metadata was extracted from
+        :type link: pip.index.Link
+
+        """
+        entry = OrderedDict(metadata)
+        if link:
+            entry['artifact'] = OrderedDict([
+                ('url', link.url_without_fragment),
+                ('hash_name', link.hash_name),
+                ('hash', link.hash)])
+        try:
+            version = str(Version(metadata['version']))
+        except InvalidVersion:
+            return
+        key = self._key(metadata['name'], version, link)
+        if key[3]:
+            entry['interpreter'] = key[3]
+        self._entries[key] = entry
+        if self.directory:
+            atomic_write(self._path(key),
+                         json.dumps(entry, indent=4).encode('utf-8'))
+            usage.use('metadata', self._path(key))
+
+
+class PreviousGraph(object):
+    """Dependencies from a previously compiled JSON dependency graph
+
+    Provides metadata in the same format as :class:`MetadataStore`, but only
+    for packages whose dependencies are known to resolve the same way as in a
+    full compile: the package must be pinned to the same version and extras
+    as in the previous graph, and each of its dependencies must be pinned in
+    constraints. Other packages, i.e. ones whose pin changed or which depend
+    on packages not pinned by constraints, are prepared again.
+
+    """
+    description = 'dependencies from previous graph'
+    #: Metadata is looked up by package name and version only
+    needs_link = False
+
+    def __init__(self, graph):
+        """Index a graph as produced by ``--json-output``
+
+        :param graph: A mapping from pinned packages to lists of their pinned
+                      dependencies
+        :type graph: dict
+
+        """
+        self.constrained_names = set()
+        self.reused = set()
+        self._dependencies = {}
+        for package, dependencies in graph.items():
+            try:
+                req = pkg_resources.Requirement.parse(package)
+            except ValueError:
+                continue
+            version = pinned_version(req)
+            if version:
+                key = (canonicalize_name(req.project_name), version,
+                       frozenset(req.extras))
+                self._dependencies[key] = (req.project_name, dependencies)
+
+    @classmethod
+    def load(cls, path):
+        """Read a graph written with ``--json-output`` in either format"""
+        return cls(DependencyGraph.load(path).to_dict())
+
+    def get(self, name, version, extras=(), link=None):
+        """Return metadata for a package pinned to a version with extras
+
+        ``link`` is ignored, since the previous graph doesn't record
+        artifacts.
+
+        :return: The metadata, or ``None`` if the package isn't in the
+                 previous graph or has to be prepared again
+        """
+        key = (canonicalize_name(name), version,
+               frozenset(pkg_resources.safe_extra(extra) for extra in extras))
+        try:
+            project_name, dependencies = self._dependencies[key]
+        except KeyError:
+            return None
+        for dependency in dependencies:
+            try:
+                dependency_name = pkg_resources.Requirement.parse(
+                    dependency).project_name
+            except ValueError:
+                return None
+            if canonicalize_name(dependency_name) not in self.constrained_names:
+                return None
+        self.reused.add(key)
+        sections = [[None, list(dependencies)]]
+        sections.extend([extra, []] for extra in sorted(key[2]))
+        return OrderedDict([('name', project_name),
+                            ('version', version),
+                            ('requires_python', None),
+                            ('requires_txt', sections)])
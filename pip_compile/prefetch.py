@@ -0,0 +1,161 @@
+"""Fetching index pages and artifacts ahead of preparation
+
+Requirements pinned with ``==`` are known as soon as the requirements files
+are parsed, but pip only looks them up and downloads them when
+:meth:`~pip.req.RequirementSet.prepare_files` reaches each of them. With
+``--prefetch N``, a :class:`Prefetcher` looks them up in a pool of ``N``
+threads in the meantime, sharing the pooled connections of the session. The
+artifacts are downloaded into a temporary directory, from which pip then
+unpacks them. Pins in constraints are fetched as soon as a requirement or a
+dependency found during resolution refers to them, not before, since most
+of them may never be needed. Sdists already in the unpack cache aren't
+downloaded.
+
+"""
+import os
+import shutil
+import tempfile
+
+from pip import logger
+from pip._vendor.packaging.utils import canonicalize_name
+from pip._vendor.requests.models import CONTENT_CHUNK_SIZE
+from pip.download import path_to_url
+from pip.index import Link
+
+from pip_compile import timings
+from pip_compile.metadata import pinned_version
+from pip_compile.unpack import artifact_digest
+from pip_compile.workers import worker_pool
+
+
+class Prefetcher(object):
+    """Looks up and downloads pinned requirements in background threads"""
+    def __init__(self, finder, session, wheel_cache, jobs, unpack_cache=None):
+        """Create a prefetcher
+
+        :param finder: The finder used for looking up requirements
+        :type finder: pip.index.PackageFinder
+        :param session: The session used for downloading artifacts
+        :param wheel_cache: Artifacts with a wheel in this cache aren't
+                            downloaded, since pip uses the wheel instead
+        :type wheel_cache: pip.wheel.WheelCache
+        :param jobs: The number of threads, or 0 to prefetch nothing
+        :param unpack_cache: Sdists in this cache aren't downloaded, since
+                             their metadata is read from there instead
+        :type unpack_cache: pip_compile.unpack.UnpackCache
+
+        """
+        self._finder = finder
+        self._session = session
+        self._wheel_cache = wheel_cache
+        self._unpack_cache = unpack_cache
+        self._results = {}
+        self._closed = False
+        self._pool = jobs and worker_pool(jobs)
+        self.directory = jobs and tempfile.mkdtemp(prefix='pip-prefetch-')
+
+    def submit(self, install_req, download=True):
+        """Start looking up a requirement pinned with ``==``
+
+        :type install_req: pip.req.req_install.InstallRequirement
+        :param download: Also download the artifact found
+
+        """
+        key = canonicalize_name(install_req.name)
+        if not self._pool or self._closed or key in self._results:
+            return
+        self._results[key] = self._pool.apply_async(
+            self._fetch, (install_req, pinned_version(install_req), download))
+
+    def get(self, install_req):
+        """Return the prefetched artifact of a requirement
+
+        Waits for the download if it's still in progress. Each artifact is
+        handed out once.
+
+        :return: The remote link and a link to the downloaded copy, or
+                 ``None`` if the requirement wasn't downloaded, e.g. because
+                 it's pinned to another version by now
+        :rtype: tuple
+
+        """
+        if not self._pool:
+            return None
+        result = self._results.pop(canonicalize_name(install_req.name), None)
+        if result is None:
+            return None
+        fetched = result.get()
+        if fetched is None or fetched[0] != pinned_version(install_req):
+            timings.count('prefetch.misses')
+            return None
+        timings.count('prefetch.hits')
+        return fetched[1:]
+
+    def _fetch(self, install_req, version, download):
+        if self._closed:
+            return None
+        try:
+            with timings.span('prefetch', package=install_req):
+                link = self._finder.find_requirement(install_req,
+                                                     upgrade=False)
+                if (not download or link is None or link.scheme == 'file' or
+                        self._wheel_cache.cached_wheel(
+                            link, install_req.name) != link or
+                        self._unpacked(link)):
+                    return None
+                return version, link, self._download(install_req, link)
+        except Exception as exc:
+            # pip reports the error when it prepares the requirement
+            logger.debug('Prefetching %s failed: %s', install_req, exc)
+            return None
+
+    def _unpacked(self, link):
+        if self._unpack_cache is None:
+            return False
+        digest = artifact_digest(link)
+        return bool(digest) and digest in self._unpack_cache
+
+    def _download(self, install_req, link):
+        """Download an artifact into the prefetch directory
+
+        :return: A link to the downloaded file, with the hash of the remote
+                 link so that pip still verifies it
+        :rtype: pip.index.Link
+
+        """
+        response = self._session.get(link.url_without_fragment,
+                                     headers={'Accept-Encoding': 'identity'},
+                                     stream=True)
+        response.raise_for_status()
+        directory = os.path.join(self.directory,
+                                 canonicalize_name(install_req.name))
+        os.mkdir(directory)
+        path = os.path.join(directory, link.filename)
+        try:
+            chunks = response.raw.stream(CONTENT_CHUNK_SIZE,
+                                         decode_content=False)
+        except AttributeError:
+            # Responses from pip's HTTP cache are plain file objects
+            chunks = iter(lambda: response.raw.read(CONTENT_CHUNK_SIZE), b'')
+        with open(path, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+        timings.count('prefetch.downloads')
+        url = path_to_url(path)
+        if link.hash:
+            url = '{}#{}={}'.format(url, link.hash_name, link.hash)
+        return Link(url)
+
+    def close(self):
+        """Wait for running downloads and delete the downloaded files"""
+        self._closed = True
+        if self._pool:
+            self._pool.close()
+            self._pool.join()
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,161 @@
+"""Recording HTTP traffic of a compile and replaying it without network access
+
+``pip-compile --record DIR`` stores every HTTP and HTTPS response the session
+receives, i.e. index pages and downloaded artifacts, in a
+:class:`TrafficArchive`. ``pip-compile --replay DIR`` answers the same requests
+from the archive instead of the network. Requests which weren't recorded fail
+with a connection error.
+
+"""
+import hashlib
+import io
+import json
+import os
+from collections import OrderedDict
+
+from pip._vendor import requests
+from pip._vendor.requests.adapters import HTTPAdapter
+from pip._vendor.requests.packages.urllib3._collections import HTTPHeaderDict
+from pip._vendor.requests.packages.urllib3.response import HTTPResponse
+
+from pip_compile.utils import atomic_write
+
+# Removed from recorded requests so that full responses are stored. A replayed
+# response is then usable regardless of what the replaying compile has cached.
+CONDITIONAL_HEADERS = ('If-None-Match', 'If-Modified-Since')
+
+
+class TrafficArchive(object):
+    """HTTP responses stored by request method and URL
+
+    Bodies are stored once per content under ``objects/``, and each request
+    is stored under ``requests/`` with the status, reason and headers of the
+    response and the digest of its body.
+
+    """
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _request_path(self, method, url):
+        key = hashlib.sha256(
+            '{} {}'.format(method, url).encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, 'requests', key[:2],
+                            '{}.json'.format(key))
+
+    def _object_path(self, digest):
+        return os.path.join(self.directory, 'objects', digest[:2], digest)
+
+    def put(self, method, url, status, reason, headers, body):
+        """Store a response
+
+        :param headers: ``(name, value)`` pairs of response headers
+        :param body: The response body as received, i.e. before decoding any
+                     ``Content-Encoding``
+        :type body: bytes
+
+        """
+        digest = hashlib.sha256(body).hexdigest()
+        if not os.path.exists(self._object_path(digest)):
+            atomic_write(self._object_path(digest), body)
+        entry = OrderedDict([('method', method),
+                             ('url', url),
+                             ('status', status),
+                             ('reason', reason),
+                             ('headers', list(headers)),
+                             ('body', digest)])
+        atomic_write(self._request_path(method, url),
+                     json.dumps(entry, indent=4).encode('utf-8'))
+
+    def get(self, method, url):
+        """Return a stored response
+
+        :return: The status, reason, header pairs and body, or ``None`` if
+                 the request wasn't recorded
+        :rtype: tuple
+
+        """
+        try:
+            with open(self._request_path(method, url)) as f:
+                entry = json.load(f)
+            with open(self._object_path(entry['body']), 'rb') as f:
+                body = f.read()
+        except (IOError, ValueError):
+            return None
+        if entry['method'] != method or entry['url'] != url:
+            return None
+        return entry['status'], entry['reason'], entry['headers'], body
+
+
+def _build_response(adapter, request, status, reason, headers, body):
+    header_dict = HTTPHeaderDict()
+    for name, value in headers:
+        header_dict.add(name, value)
+    raw = HTTPResponse(body=io.BytesIO(body), headers=header_dict,
+                       status=status, reason=reason, preload_content=False,
+                       decode_content=False)
+    # HTTPAdapter.build_response() even for subclasses, which may do more
+    # in theirs, e.g. caching
+    return HTTPAdapter.build_response(adapter, request, raw)
+
+
+class RecordingAdapter(HTTPAdapter):
+    """A transport adapter which stores the responses of another adapter"""
+    def __init__(self, adapter, archive):
+        """Wrap an adapter
+
+        :param adapter: The adapter which sends the requests
+        :type adapter: pip._vendor.requests.adapters.BaseAdapter
+        :type archive: TrafficArchive
+
+        """
+        super(RecordingAdapter, self).__init__()
+        self.adapter = adapter
+        self.archive = archive
+
+    def send(self, request, **kwargs):
+        for name in CONDITIONAL_HEADERS:
+            request.headers.pop(name, None)
+        response = self.adapter.send(request, **kwargs)
+        headers = response.raw.headers
+        headers = list(getattr(headers, 'iteritems', headers.items)())
+        body = response.raw.read(decode_content=False)
+        self.archive.put(request.method, request.url, response.status_code,
+                         response.reason, headers, body)
+        return _build_response(self, request, response.status_code,
+                               response.reason, headers, body)
+
+    def close(self):
+        self.adapter.close()
+        super(RecordingAdapter, self).close()
+
+
+class ReplayAdapter(HTTPAdapter):
+    """A transport adapter which answers requests from a TrafficArchive"""
+    def __init__(self, archive):
+        super(ReplayAdapter, self).__init__()
+        self.archive = archive
+
+    def send(self, request, **kwargs):
+        stored = self.archive.get(request.method, request.url)
+        if stored is None:
+            raise requests.ConnectionError(
+                '{} {} was not recorded in {}'.format(
+                    request.method, request.url, self.archive.directory),
+                request=request)
+        return _build_response(self, request, *stored)
+
+
+def record(session, directory):
+    """Store the HTTP and HTTPS responses of a session in a directory"""
+    archive = TrafficArchive(directory)
+    for prefix, adapter in list(session.adapters.items()):
+        if prefix.startswith('http'):
+            session.mount(prefix, RecordingAdapter(adapter, archive))
+
+
+def replay(session, directory):
+    """Answer HTTP and HTTPS requests of a session from a directory"""
+    archive = TrafficArchive(directory)
+    for prefix in list(session.adapters):
+        if prefix.startswith('http'):
+            session.mount(prefix, ReplayAdapter(archive))
@@ -0,0 +1,250 @@
+"""Serving compiles from a long-running process
+
+``pip-compile --serve SOCKET`` listens on a UNIX socket for requests sent by
+:mod:`pip_compile.client`. Each request carries the command line arguments,
+working directory and ``PIP_*`` environment variables of the client. The
+request is compiled in the server process, and the output is streamed back to
+the client as JSON lines like ``{"stdout": "..."}``, followed by
+``{"status": 0}``.
+
+Sessions, package finders and parsed requirements files are kept in memory
+between requests with the same index, session and cache options, as is the
+metadata of prepared packages.
+
+"""
+import copy
+import json
+import logging
+import os
+import signal
+import socket
+import sys
+import threading
+
+from pip import logger
+from pip._vendor.six.moves import socketserver
+from pip.exceptions import InstallationError
+
+from pip_compile.context import CompileContext
+from pip_compile.metadata import MetadataStore
+
+
+class ServerContext(CompileContext):
+    """A compile context kept open between requests
+
+    Remote requirements files are fetched again for every request, since
+    they may have changed since the previous one.
+
+    """
+    reuse_remote_files = False
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # Closed when the server shuts down
+        pass
+
+
+def context_key(options):
+    """Return the options which affect the session, finder and caches"""
+    return (options.index_url,
+            tuple(options.extra_index_urls),
+            options.no_index,
+            tuple(options.find_links),
+            tuple(options.trusted_hosts),
+            options.pre,
+            options.process_dependency_links,
+            tuple(sorted(options.format_control.no_binary)),
+            tuple(sorted(options.format_control.only_binary)),
+            options.cache_dir,
+            options.cert,
+            options.client_cert,
+            options.proxy,
+            options.timeout,
+            options.retries,
+            options.isolated_mode,
+            options.index_cache_ttl,
+            options.offline,
+            options.record,
+            options.replay,
+            options.unpack_cache,
+            options.unpack_cache_size,
+            options.git_mirrors,
+            options.constraint_cache)
+
+
+class ClientStream(object):
+    """A file-like object which sends what is written to it to the client"""
+    encoding = 'utf-8'
+
+    def __init__(self, wfile, name):
+        self._wfile = wfile
+        self._name = name
+
+    def write(self, data):
+        if isinstance(data, bytes):
+            data = data.decode('utf-8', 'replace')
+        self._wfile.write(
+            (json.dumps({self._name: data}) + '\n').encode('utf-8'))
+
+    def flush(self):
+        self._wfile.flush()
+
+    def isatty(self):
+        return False
+
+
+class CompileRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline().decode('utf-8'))
+            argv = request['argv']
+            cwd = request['cwd']
+            environ = request.get('environ', {})
+        except (ValueError, KeyError, TypeError) as exc:
+            ClientStream(self.wfile, 'stderr').write(
+                'Invalid request: {}\n'.format(exc))
+            status = 2
+        else:
+            status = self.server.run_request(argv, cwd, environ, self.wfile)
+        self.wfile.write(
+            (json.dumps({'status': status}) + '\n').encode('utf-8'))
+
+
+class CompileServer(socketserver.UnixStreamServer):
+    """Runs compile requests one at a time in the server process
+
+    The compile contexts, including the metadata of prepared packages, are
+    shared by all requests with the same index, session and cache options.
+
+    """
+    def __init__(self, path, command_class):
+        """Listen on a UNIX socket
+
+        :param path: Path of the socket
+        :param command_class: The command to run for each request
+        :type command_class: type
+
+        """
+        self._command_class = command_class
+        self._contexts = {}
+        socketserver.UnixStreamServer.__init__(self, path,
+                                               CompileRequestHandler)
+
+    def context(self, command, options, metadata_store):
+        """Return the shared context for compiling with the given options
+
+        Used as :meth:`pip_compile.command.CompileCommand.create_context` of
+        commands run by the server.
+
+        """
+        # Relative --find-links directories refer to the client's working
+        # directory, so make them absolute before sharing the finder
+        options.find_links = [os.path.abspath(link)
+                              if os.path.exists(link) else link
+                              for link in options.find_links]
+        directory = metadata_store and metadata_store.directory
+        key = context_key(options) + (directory,)
+        if key not in self._contexts:
+            # Metadata kept in memory is only shared by requests using the
+            # same indexes, since another index may serve other artifacts
+            # for the same versions
+            self._contexts[key] = ServerContext(
+                command, copy.copy(options), metadata_store or MetadataStore())
+        return self._contexts[key]
+
+    def run_request(self, argv, cwd, environ, wfile):
+        """Run a command in the client's working directory and environment
+
+        :param argv: Command line arguments of the client
+        :param cwd: Working directory of the client
+        :param environ: ``PIP_*`` environment variables of the client
+        :param wfile: Stream for sending output to the client
+        :return: The exit status of the command
+        :rtype: int
+
+        """
+        saved_streams = sys.stdout, sys.stderr
+        saved_cwd = os.getcwd()
+        saved_environ = dict(os.environ)
+        root_logger = logging.getLogger()
+        saved_handlers = root_logger.handlers[:]
+        saved_level = root_logger.level
+        sys.stdout = ClientStream(wfile, 'stdout')
+        sys.stderr = ClientStream(wfile, 'stderr')
+        try:
+            os.chdir(cwd)
+            for name in list(os.environ):
+                if name.startswith('PIP_'):
+                    del os.environ[name]
+            os.environ.update((name, value)
+                              for name, value in environ.items()
+                              if name.startswith('PIP_'))
+            command = self._command_class()
+            command.server = self
+            try:
+                return command.main(argv)
+            except SystemExit as exc:
+                # optparse exits after --help and on invalid arguments
+                if exc.code is None or isinstance(exc.code, int):
+                    return exc.code or 0
+                sys.stderr.write('{}\n'.format(exc.code))
+                return 1
+        except socket.error:
+            # The client went away
+            return 1
+        finally:
+            sys.stdout, sys.stderr = saved_streams
+            os.chdir(saved_cwd)
+            os.environ.clear()
+            os.environ.update(saved_environ)
+            root_logger.handlers[:] = saved_handlers
+            root_logger.setLevel(saved_level)
+
+    def server_close(self):
+        socketserver.UnixStreamServer.server_close(self)
+        for context in self._contexts.values():
+            context.close()
+
+
+def is_serving(path):
+    """Check whether a server is listening on a UNIX socket"""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except socket.error:
+        return False
+    finally:
+        sock.close()
+    return True
+
+
+def serve(path, command_class):
+    """Serve compile requests until interrupted
+
+    :param path: Path of the UNIX socket to listen on
+    :param command_class: The command to run for each request
+    :type command_class: type
+
+    """
+    if os.path.exists(path):
+        if is_serving(path):
+            raise InstallationError(
+                'A pip-compile server is already listening on {}'
+                .format(path))
+        # Left behind by a server which didn't shut down cleanly
+        os.remove(path)
+    server = CompileServer(path, command_class)
+
+    def terminate(signum, frame):
+        # shutdown() waits for the serve loop, so it can't run in the thread
+        # running the loop. The current request is finished first.
+        threading.Thread(target=server.shutdown).start()
+
+    signal.signal(signal.SIGTERM, terminate)
+    logger.info('Serving compiles on %s', path)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.remove(path)
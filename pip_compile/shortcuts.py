@@ -0,0 +1,211 @@
+"""Repeating compiles answered from the resolution cache without pip
+
+Importing pip takes most of the time of a compile answered from the
+resolution cache. After such a compile, a shortcut is stored in the cache
+directory, keyed by everything the parsed options depend on: the command
+line, the working directory, ``PIP_*`` and other environment variables which
+locate configuration files, and the interpreter with its ``sys.path``. The
+shortcut holds the outputs along with digests of the inputs they were
+compiled from: requirements and constraints files, local directories, pip's
+configuration files and pip itself.
+
+:func:`run` is called by :func:`pip_compile.main` before anything from pip is
+imported. If a shortcut exists and its inputs are unchanged, the outputs are
+written, or compared to the existing ones for ``--check``, and pip is never
+imported. This module must therefore only import modules which don't import
+pip.
+
+Shortcuts are looked up in the cache directory given with ``--cache-dir`` or
+``PIP_CACHE_DIR``, or in pip's default cache directory on POSIX systems.
+
+"""
+import hashlib
+import io
+import json
+import os
+import sys
+from collections import OrderedDict
+
+from pip_compile import usage
+from pip_compile.cache import ResolutionCache, cache_subdir, path_digest
+from pip_compile.utils import atomic_write, normalized_output
+from pip_compile.version import __version__
+
+# The exit status of a successful compile, as in pip.status_codes
+SUCCESS = 0
+# Environment variables which affect where pip looks for configuration files
+LOCATION_VARIABLES = ('HOME', 'XDG_CACHE_HOME', 'XDG_CONFIG_DIRS',
+                      'XDG_CONFIG_HOME')
+
+
+def shortcut_key(argv, cwd=None, environ=None):
+    """Compute the key of a shortcut
+
+    :param argv: The command line arguments
+    :param cwd: The working directory, or ``None`` for the current one
+    :param environ: The environment, or ``None`` for :data:`os.environ`
+    :return: A hex digest
+    :rtype: str
+
+    """
+    if environ is None:
+        environ = os.environ
+    inputs = {
+        'argv': list(argv),
+        'cwd': cwd or os.getcwd(),
+        'environ': {name: value for name, value in environ.items()
+                    if name.startswith('PIP_') or
+                    name in LOCATION_VARIABLES},
+        'executable': sys.executable,
+        'python': sys.version,
+        'prefix': sys.prefix,
+        'path': sys.path,
+        'pip_compile': __version__,
+    }
+    serialized = json.dumps(inputs, sort_keys=True).encode('utf-8')
+    return hashlib.sha256(serialized).hexdigest()
+
+
+def default_cache_dir(argv, environ=None):
+    """Find the cache directory without parsing options with pip
+
+    :param argv: The command line arguments
+    :param environ: The environment, or ``None`` for :data:`os.environ`
+    :return: The directory given with ``--cache-dir`` or ``PIP_CACHE_DIR``,
+             pip's default cache directory on POSIX systems, or ``None``
+    :rtype: str
+
+    """
+    if environ is None:
+        environ = os.environ
+    if environ.get('PIP_NO_CACHE_DIR') or '--no-cache-dir' in argv:
+        return None
+    cache_dir = environ.get('PIP_CACHE_DIR')
+    for index, arg in enumerate(argv):
+        if arg == '--cache-dir' and index + 1 < len(argv):
+            cache_dir = argv[index + 1]
+        elif arg.startswith('--cache-dir='):
+            cache_dir = arg.partition('=')[2]
+    if cache_dir:
+        return os.path.abspath(os.path.expanduser(cache_dir))
+    if sys.platform == 'darwin':
+        return os.path.expanduser('~/Library/Caches/pip')
+    if os.name == 'posix':
+        return os.path.join(environ.get('XDG_CACHE_HOME') or
+                            os.path.expanduser('~/.cache'), 'pip')
+    return None
+
+
+class Shortcuts(object):
+    """Shortcuts stored in the cache directory"""
+    def __init__(self, cache_dir):
+        self.directory = cache_subdir(cache_dir, 'shortcuts')
+        self._resolutions = ResolutionCache(cache_dir)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], '{}.json'.format(key))
+
+    def get(self, key):
+        """Return a shortcut whose inputs are unchanged, or ``None``
+
+        :param key: The key from :func:`shortcut_key`
+
+        """
+        try:
+            with open(self._path(key)) as f:
+                entry = json.load(f, object_pairs_hook=OrderedDict)
+        except (IOError, ValueError):
+            usage.miss('shortcuts')
+            return None
+        if entry.get('key') != key or entry['resolution'] not in \
+                self._resolutions:
+            usage.miss('shortcuts')
+            return None
+        for path, digest in entry['inputs'].items():
+            if path_digest(path) != digest:
+                usage.miss('shortcuts')
+                return None
+        usage.hit('shortcuts', self._path(key))
+        self._resolutions.use(entry['resolution'])
+        return entry
+
+    def put(self, key, resolution, inputs, outputs, check=None,
+            verbosity=0):
+        """Store a shortcut
+
+        :param key: The key from :func:`shortcut_key`
+        :param resolution: The resolution cache key of the compile
+        :param inputs: Paths mapped to their digests as returned by
+                       :func:`pip_compile.cache.path_digest`
+        :param outputs: Pairs of an ``--output`` or ``--json-output`` path,
+                        or ``-`` for standard output, and the text written
+                        there
+        :param check: The ``--check`` path, in which case ``outputs`` are
+                      compared to the existing files instead of written
+        :param verbosity: The verbosity of pip's logging
+
+        """
+        entry = OrderedDict([('key', key),
+                             ('resolution', resolution),
+                             ('inputs', inputs),
+                             ('outputs', outputs),
+                             ('check', check),
+                             ('verbosity', verbosity)])
+        atomic_write(self._path(key),
+                     json.dumps(entry, indent=4).encode('utf-8'))
+        usage.use('shortcuts', self._path(key))
+
+
+def _read(path):
+    try:
+        with io.open(path, encoding='utf-8') as f:
+            return f.read()
+    except IOError:
+        return None
+
+
+def _write(path, text):
+    if path == '-':
+        sys.stdout.write(text)
+    else:
+        with io.open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+
+def _info(entry, message):
+    # Messages pip would log at the INFO level, which goes to stdout
+    if entry['verbosity'] >= 0:
+        sys.stdout.write('{}\n'.format(message))
+
+
+def run(argv):
+    """Repeat a compile from its shortcut if possible
+
+    :param argv: The command line arguments
+    :return: The exit status, or ``None`` if the compile has to be run
+    :rtype: int
+
+    """
+    cache_dir = default_cache_dir(argv)
+    if not cache_dir:
+        return None
+    with usage.recording(cache_dir):
+        entry = Shortcuts(cache_dir).get(shortcut_key(argv))
+    if entry is None:
+        return None
+    if entry['check']:
+        # Differences are shown by the full compile, which also checks for
+        # unpinned lines
+        for path, text in entry['outputs']:
+            existing = _read(path)
+            if (existing is None or
+                    normalized_output(existing) != normalized_output(text)):
+                return None
+        _info(entry, 'Using cached resolution {}'.format(
+            entry['resolution']))
+        _info(entry, '{} is up to date'.format(entry['check']))
+        return SUCCESS
+    _info(entry, 'Using cached resolution {}'.format(entry['resolution']))
+    for path, text in entry['outputs']:
+        _write(path, text)
+    return SUCCESS
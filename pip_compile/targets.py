@@ -0,0 +1,233 @@
+"""Compiling for other Python versions and platforms
+
+Each ``--target NAME:KEY=VALUE,...`` option defines a target with a marker
+environment and wheel tags. Requirements are resolved once per target, with
+environment markers evaluated against the target instead of the running
+interpreter, and only wheels compatible with the target are considered.
+Compiles for all targets share one session, package finder cache and
+metadata store, so each package is downloaded and prepared only once.
+
+Only the evaluation of markers and the choice of wheels follow the target.
+Sdists are still prepared by running ``setup.py egg_info`` with the running
+interpreter, and their metadata is stored and reused for all targets. An sdist
+whose ``setup.py`` computes its dependencies from ``sys.version_info`` or the
+platform, instead of declaring them with environment markers, gets the
+dependencies of the running interpreter on every target.
+
+"""
+import copy
+import re
+from collections import OrderedDict
+
+from pip._vendor.packaging.markers import default_environment
+from pip.pep425tags import get_abbr_impl, get_supported
+
+#: Keys of a target which select wheel tags instead of marker variables
+TAG_KEYS = ('platform', 'abi', 'implementation')
+#: Placeholder in ``--output`` and ``--json-output`` for the target name
+TARGET_PLACEHOLDER = '{target}'
+
+TARGET_NAME_RE = re.compile(r'^[A-Za-z0-9][A-Za-z0-9_.-]*$')
+
+
+class Target(object):
+    """A Python version and platform to compile requirements for"""
+    def __init__(self, name, markers=None, tags=None):
+        """Create a target
+
+        :param name: Name of the target, used in output file names
+        :param markers: Marker variables which differ from the running
+                        interpreter, e.g. ``{'python_version': '3.8'}``
+        :param tags: Wheel tag overrides, with the ``platform``, ``abi`` and
+                     ``implementation`` keys of :data:`TAG_KEYS`
+
+        """
+        self.name = name
+        self.markers = OrderedDict(markers or ())
+        self.tags = dict(tags or ())
+
+    @classmethod
+    def parse(cls, spec):
+        """Parse a ``--target`` option value
+
+        :param spec: ``NAME:KEY=VALUE,...``, where each key is an environment
+                     marker variable or one of :data:`TAG_KEYS`, e.g.
+                     ``py38-arm:python_version=3.8,platform=linux_aarch64``
+        :raise Exception: if the value is malformed
+
+        """
+        name, _, assignments = spec.partition(':')
+        if not TARGET_NAME_RE.match(name):
+            raise Exception('--target needs a name of letters, digits, "_", '
+                            '"." and "-" before ":", got {!r}'.format(spec))
+        marker_keys = default_environment()
+        markers = OrderedDict()
+        tags = {}
+        for assignment in assignments.split(',') if assignments else []:
+            key, _, value = assignment.partition('=')
+            key, value = key.strip(), value.strip()
+            if not value:
+                raise Exception('--target {}: expected KEY=VALUE, got {!r}'
+                                .format(name, assignment))
+            if key in TAG_KEYS:
+                tags[key] = value
+            elif key in marker_keys:
+                markers[key] = value
+            else:
+                raise Exception(
+                    '--target {}: {!r} is neither an environment marker '
+                    'variable nor one of {}'.format(name, key,
+                                                    ', '.join(TAG_KEYS)))
+        return cls(name, markers, tags)
+
+    @property
+    def environment(self):
+        """The marker environment of the target
+
+        Variables not given for the target are taken from the running
+        interpreter. ``python_full_version`` defaults to ``python_version``.
+
+        :rtype: dict
+
+        """
+        environment = default_environment()
+        if ('python_version' in self.markers and
+                'python_full_version' not in self.markers):
+            environment['python_full_version'] = self.markers['python_version']
+        environment.update(self.markers)
+        return environment
+
+    @property
+    def python_version(self):
+        """The full Python version of the target, for Requires-Python"""
+        return self.environment['python_full_version']
+
+    def supported_tags(self):
+        """Return the wheel tags compatible with the target
+
+        The ABI defaults to the CPython ABI of the target's Python version,
+        e.g. ``cp38`` or ``cp36m``, if the target sets ``python_version``.
+
+        :return: ``(python, abi, platform)`` tags in order of preference
+        :rtype: list of tuple
+
+        """
+        versions = None
+        abi = self.tags.get('abi')
+        implementation = self.tags.get('implementation')
+        if 'python_version' in self.markers:
+            version = tuple(int(part) for part in
+                            self.markers['python_version'].split('.')[:2])
+            versions = ['{}{}'.format(*version)]
+            if not abi and (implementation or get_abbr_impl()) == 'cp':
+                abi = 'cp{}{}{}'.format(version[0], version[1],
+                                        'm' if (3, 0) <= version < (3, 8)
+                                        else '')
+        return get_supported(versions=versions,
+                             platform=self.tags.get('platform'),
+                             impl=implementation, abi=abi)
+
+    def marker(self):
+        """Return an environment marker which only matches this target
+
+        :return: The marker, or ``None`` if the target doesn't set any marker
+                 variables
+        :rtype: str
+
+        """
+        if not self.markers:
+            return None
+        return ' and '.join('{} == "{}"'.format(key, value)
+                            for key, value in self.markers.items())
+
+    @property
+    def key(self):
+        """The name, marker variables and wheel tags of the target as text
+
+        :return: The target in ``--target`` syntax, e.g.
+                 ``py38:python_version=3.8,platform=linux_aarch64``
+        :rtype: str
+
+        """
+        assignments = list(self.markers.items()) + sorted(self.tags.items())
+        return '{}:{}'.format(self.name, ','.join(
+            '{}={}'.format(key, value) for key, value in assignments))
+
+    def __str__(self):
+        return self.name
+
+
+def target_path(path, target):
+    """Return the output path of a target
+
+    :param path: A ``--output`` or ``--json-output`` path, ``-`` or ``None``
+    :return: The path with :data:`TARGET_PLACEHOLDER` replaced by the target
+             name, or ``None`` if the path doesn't contain the placeholder
+    :rtype: str
+
+    """
+    if path and TARGET_PLACEHOLDER in path:
+        return path.replace(TARGET_PLACEHOLDER, target.name)
+    return None
+
+
+def target_options(options, target):
+    """Return the options for compiling one target
+
+    Outputs without :data:`TARGET_PLACEHOLDER` are left out, since they're
+    written once for all targets.
+
+    """
+    options = copy.copy(options)
+    options.targets = []
+    options.output = target_path(options.output, target)
+    options.json_output = target_path(options.json_output, target)
+    return options
+
+
+def merge_requirements(results):
+    """Merge the pinned requirements of several targets
+
+    Lines pinned for every target are kept as is. Other lines get an
+    environment marker matching the targets they were pinned for. Editable
+    and URL requirements can't be given a marker in a requirements file, so
+    they must be the same for all targets.
+
+    :param results: ``(target, requirements)`` pairs, where ``requirements``
+                    is the output of
+                    :func:`pip_compile.command.print_requirements`
+    :return: The merged requirements
+    :rtype: str
+    :raise Exception: if a line needs a marker for a target which doesn't set
+                      any marker variables, or if an editable or URL line
+                      needs a marker
+
+    """
+    lines = OrderedDict()
+    for target, requirements in results:
+        for line in requirements.splitlines():
+            lines.setdefault(line, []).append(target)
+    merged = []
+    for line, targets in lines.items():
+        if len(targets) == len(results):
+            merged.append(line)
+            continue
+        if line.startswith('-e ') or '://' in line:
+            raise Exception(
+                '{} is only pinned for targets {}, but editable and URL '
+                'requirements can\'t have environment markers. Write an '
+                'output for each target by using {} in the output path.'
+                .format(line, ', '.join(str(target) for target in targets),
+                        TARGET_PLACEHOLDER))
+        markers = []
+        for target in targets:
+            marker = target.marker()
+            if marker is None:
+                raise Exception(
+                    '{} is only pinned for some targets, but target {} sets '
+                    'no environment marker variables to tell it apart'
+                    .format(line, target))
+            markers.append('({})'.format(marker) if len(targets) > 1 and
+                           len(target.markers) > 1 else marker)
+        merged.append('{} ; {}'.format(line, ' or '.join(markers)))
+    return ''.join('{}\n'.format(line) for line in merged)
@@ -0,0 +1,276 @@
+"""Recording where the time of a compile goes
+
+``pip-compile --timings FILE`` records spans of time for the phases of the
+compile and for each step of preparing a package, along with counters for
+HTTP requests and cache lookups. The report is written in Chrome's trace event
+format, so it can be opened in ``chrome://tracing`` or Perfetto to see
+concurrent work on a timeline. Totals per phase and per package and the
+counters are stored in the same JSON object next to the trace events.
+
+The functions in this module do nothing unless called inside
+:func:`recording`, so instrumented code doesn't need to check whether timings
+are wanted.
+
+"""
+import functools
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import pip.download
+import pip.req.req_set
+from pip import logger
+from pip._vendor import six
+from pip.req import InstallRequirement
+
+#: The recorder of the :func:`recording` block being run
+_active = None
+_local = threading.local()
+
+
+def _package_name(package):
+    """Return the name of a package given as a string or a requirement"""
+    if package is None or isinstance(package, six.string_types):
+        return package
+    return package.name or str(package.link or package)
+
+
+class Recorder(object):
+    """Spans and counters collected during a compile
+
+    Packages are stored as given and named when the report is created, since
+    requirements for local directories only get their names while being
+    prepared.
+
+    """
+    def __init__(self):
+        self.start = time.time()
+        self.spans = []
+        self.counters = OrderedDict()
+        self.threads = OrderedDict()
+        self._package_info = []
+        self._lock = threading.Lock()
+
+    def add_span(self, name, package, start, end, args):
+        thread = threading.current_thread()
+        with self._lock:
+            self.threads.setdefault(thread.ident, thread.name)
+            self.spans.append((name, package, thread.ident, start, end,
+                               args))
+
+    def count(self, name, value=1, package=None):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+            if package is not None:
+                self._package_info.append((package, name, value, True))
+
+    def gauge(self, name, value):
+        with self._lock:
+            self.counters[name] = max(self.counters.get(name, value), value)
+
+    def annotate(self, package, key, value):
+        with self._lock:
+            self._package_info.append((package, key, value, False))
+
+    def packages(self):
+        """Return the time spent, counters and annotations by package"""
+        packages = OrderedDict()
+
+        def package_info(package):
+            name = _package_name(package)
+            if name not in packages:
+                packages[name] = OrderedDict([('seconds', OrderedDict())])
+            return packages[name]
+
+        for name, package, ident, start, end, args in self.spans:
+            if package is not None:
+                seconds = package_info(package)['seconds']
+                seconds[name] = seconds.get(name, 0.0) + end - start
+        for package, key, value, is_counter in self._package_info:
+            info = package_info(package)
+            info[key] = info.get(key, 0) + value if is_counter else value
+        return packages
+
+    def trace_events(self):
+        """Return the spans as Chrome trace events"""
+        pid = os.getpid()
+        events = [OrderedDict([('name', 'thread_name'),
+                               ('ph', 'M'),
+                               ('pid', pid),
+                               ('tid', ident),
+                               ('args', {'name': name})])
+                  for ident, name in self.threads.items()]
+        for name, package, ident, start, end, args in self.spans:
+            args = OrderedDict(args)
+            category = 'phase'
+            if package is not None:
+                category = 'package'
+                args['package'] = _package_name(package)
+            events.append(OrderedDict([
+                ('name', name),
+                ('cat', category),
+                ('ph', 'X'),
+                ('ts', int((start - self.start) * 1e6)),
+                ('dur', int((end - start) * 1e6)),
+                ('pid', pid),
+                ('tid', ident),
+                ('args', args)]))
+        return events
+
+    def report(self):
+        """Return the trace events, totals and counters as one JSON object
+
+        Durations of nested spans are also included in the spans which
+        enclose them. For counters named ``<name>.hits`` and
+        ``<name>.misses``, a ``<name>.hit_rate`` is added.
+
+        """
+        phases = OrderedDict()
+        for name, package, ident, start, end, args in self.spans:
+            if package is None:
+                phases[name] = phases.get(name, 0.0) + end - start
+        counters = OrderedDict(self.counters)
+        for name in self.counters:
+            if name.endswith('.hits'):
+                prefix = name[:-len('.hits')]
+                lookups = (self.counters[name] +
+                           self.counters.get(prefix + '.misses', 0))
+                counters[prefix + '.hit_rate'] = (
+                    float(self.counters[name]) / lookups)
+        return OrderedDict([
+            ('traceEvents', self.trace_events()),
+            ('displayTimeUnit', 'ms'),
+            ('total_seconds', time.time() - self.start),
+            ('phases', phases),
+            ('packages', self.packages()),
+            ('counters', counters)])
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=1)
+
+
+def _stack():
+    if not hasattr(_local, 'packages'):
+        _local.packages = []
+    return _local.packages
+
+
+def _current_package():
+    stack = _stack()
+    return stack[-1] if stack else None
+
+
+@contextmanager
+def span(name, package=None, **args):
+    """Record the time spent in a block
+
+    :param name: Name of the phase or step
+    :param package: The package the step is for, as a name or an
+                    :class:`~pip.req.req_install.InstallRequirement`. Spans
+                    without a package are phases of the compile, unless they
+                    are nested in a span for a package in the same thread.
+    :param args: Additional information stored with the trace event
+
+    """
+    recorder = _active
+    if recorder is None:
+        yield
+        return
+    stack = _stack()
+    if package is None and stack:
+        package = stack[-1]
+    stack.append(package)
+    start = time.time()
+    try:
+        yield
+    finally:
+        stack.pop()
+        recorder.add_span(name, package, start, time.time(), args)
+
+
+def count(name, value=1):
+    """Increase a counter, also for the package being prepared if any"""
+    if _active is not None:
+        _active.count(name, value, _current_package())
+
+
+def gauge(name, value):
+    """Record a measurement, keeping the highest value seen"""
+    if _active is not None:
+        _active.gauge(name, value)
+
+
+def annotate(key, value, package=None):
+    """Store information about a package in the report"""
+    if package is None:
+        package = _current_package()
+    if _active is not None and package is not None:
+        _active.annotate(package, key, value)
+
+
+def count_response(response, *args, **kwargs):
+    """Count HTTP requests and transferred bytes
+
+    Used as a ``response`` hook of the session. Bytes are counted from the
+    ``Content-Length`` header, since downloads are streamed.
+
+    """
+    if _active is None:
+        return
+    count('http.requests')
+    if getattr(response, 'from_cache', False):
+        count('http.cache.hits')
+    else:
+        count('http.cache.misses')
+        try:
+            count('http.bytes',
+                  int(response.headers.get('Content-Length', 0)))
+        except ValueError:
+            pass
+
+
+def _timed(name, function):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        with span(name):
+            return function(*args, **kwargs)
+    return wrapper
+
+
+# Steps of pip's RequirementSet._prepare_file() which have no subclass hook:
+# fetching a link (which includes unpacking it), unpacking archives and
+# running setup.py egg_info
+_PIP_STEPS = [(pip.req.req_set, 'unpack_url', 'fetch'),
+              (pip.download, 'unpack_file', 'unpack'),
+              (InstallRequirement, 'run_egg_info', 'egg_info')]
+
+
+@contextmanager
+def recording(path=None):
+    """Record timings of the enclosed block and write them to a file
+
+    :param path: Where to write the report, or ``None`` to not record at all
+
+    """
+    global _active
+    if not path:
+        yield None
+        return
+    recorder = Recorder()
+    originals = [(owner, attr, vars(owner)[attr])
+                 for owner, attr, name in _PIP_STEPS]
+    for owner, attr, name in _PIP_STEPS:
+        setattr(owner, attr, _timed(name, getattr(owner, attr)))
+    previous, _active = _active, recorder
+    try:
+        yield recorder
+    finally:
+        _active = previous
+        for owner, attr, original in originals:
+            setattr(owner, attr, original)
+        recorder.write(path)
+        logger.info('Wrote timings to %s', path)
@@ -0,0 +1,215 @@
+"""Unpacked source distributions stored by the SHA-256 of their artifact
+
+pip unpacks each sdist into a fresh build directory and runs ``setup.py
+egg_info`` in it on every compile. With ``--unpack-cache``, the unpacked tree
+is kept in the cache directory along with the ``egg_info`` output, keyed by
+the SHA-256 digest of the artifact and the interpreter which ran ``egg_info``.
+The digest is known before downloading from the ``#sha256=`` fragment of
+links on package indexes, or by hashing a local archive, so later compiles of
+the same artifact on the same interpreter read the metadata from the stored
+``egg_info`` output without downloading, unpacking or running anything.
+
+Entries are created in a temporary directory and renamed into place, so
+concurrent compiles never see a partial tree. The least recently used entries
+are removed when the cache grows beyond its size limit.
+
+"""
+import json
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+
+from pip._vendor import pkg_resources
+from pip.download import url_to_path
+
+from pip_compile import usage
+from pip_compile.cache import cache_subdir
+from pip_compile.metadata import extract_metadata
+from pip_compile.utils import INTERPRETER, ensure_dir, file_digest, tree_size
+
+#: Default size limit of the unpack cache in megabytes
+DEFAULT_MAX_SIZE = 1024
+
+
+def artifact_digest(link):
+    """Return the SHA-256 digest of the sdist a link points to
+
+    :type link: pip.index.Link
+    :return: The hex digest from the link's ``#sha256=`` fragment or of a
+             local archive, or ``None`` for wheels, directories, VCS links and
+             remote links without a SHA-256 fragment
+    :rtype: str
+
+    """
+    if not link or link.is_wheel or not link.is_artifact:
+        return None
+    if link.hash_name == 'sha256':
+        return link.hash
+    if link.scheme == 'file':
+        path = url_to_path(link.url_without_fragment)
+        if os.path.isfile(path):
+            return file_digest(path)
+    return None
+
+
+class UnpackCache(object):
+    """Unpacked sdists with their ``egg_info`` output in the cache directory"""
+    description = 'unpacked sdist'
+
+    def __init__(self, cache_dir, max_size=DEFAULT_MAX_SIZE,
+                 interpreter=INTERPRETER):
+        """Create an unpack cache
+
+        :param cache_dir: The pip cache directory
+        :param max_size: The size limit in megabytes
+        :param interpreter: The interpreter running ``egg_info``, since
+                            ``setup.py`` may compute dependencies differently
+                            on other interpreters
+
+        """
+        self.directory = cache_subdir(cache_dir, 'unpacked')
+        self.max_size = max_size * 1024 * 1024
+        self.interpreter = interpreter
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _name(self, digest):
+        return '{}-{}'.format(digest, self.interpreter)
+
+    def _path(self, name):
+        return os.path.join(self.directory, name[:2], name)
+
+    def _digest_lock(self, digest):
+        with self._lock:
+            return self._locks.setdefault(digest, threading.Lock())
+
+    def __contains__(self, digest):
+        return os.path.exists(os.path.join(self._path(self._name(digest)),
+                                           'entry.json'))
+
+    def get(self, digest):
+        """Return the metadata of a stored sdist, or ``None``
+
+        Reading an entry marks it as recently used.
+
+        :param digest: The SHA-256 digest of the artifact
+
+        """
+        path = self._path(self._name(digest))
+        try:
+            with open(os.path.join(path, 'entry.json')) as f:
+                entry = json.load(f)
+            egg_info = os.path.join(path, 'tree', entry['egg_info'])
+            dist = pkg_resources.Distribution(
+                os.path.dirname(egg_info),
+                project_name=os.path.splitext(os.path.basename(egg_info))[0],
+                metadata=pkg_resources.PathMetadata(os.path.dirname(egg_info),
+                                                    egg_info))
+            metadata = extract_metadata(dist)
+            os.utime(path, None)
+        except (IOError, OSError, ValueError, KeyError):
+            # Missing, or evicted by a concurrent compile
+            usage.miss('unpacked')
+            return None
+        usage.hit('unpacked', path)
+        return metadata
+
+    def put(self, digest, source_dir, egg_info):
+        """Store an unpacked sdist after pip has run ``egg_info`` in it
+
+        :param digest: The SHA-256 digest of the artifact
+        :param source_dir: The directory the sdist was unpacked into
+        :param egg_info: The ``.egg-info`` directory inside ``source_dir``
+
+        """
+        name = self._name(digest)
+        path = self._path(name)
+        with self._digest_lock(digest):
+            if os.path.exists(path):
+                return
+            ensure_dir(os.path.dirname(path))
+            temp_path = tempfile.mkdtemp(dir=os.path.dirname(path),
+                                         prefix='.tmp-')
+            try:
+                shutil.copytree(source_dir, os.path.join(temp_path, 'tree'),
+                                symlinks=True)
+                entry = OrderedDict([
+                    ('digest', digest),
+                    ('interpreter', self.interpreter),
+                    ('egg_info', os.path.relpath(egg_info, source_dir)),
+                    ('size', tree_size(temp_path))])
+                with open(os.path.join(temp_path, 'entry.json'), 'w') as f:
+                    json.dump(entry, f, indent=4)
+                try:
+                    os.rename(temp_path, path)
+                except OSError:
+                    # Stored by a concurrent compile
+                    pass
+            finally:
+                if os.path.exists(temp_path):
+                    shutil.rmtree(temp_path, ignore_errors=True)
+        usage.use('unpacked', path)
+        self.evict(keep=name)
+
+    def entries(self):
+        """Return the stored entries of all interpreters, least recently used
+        first
+
+        :return: ``(name, size, last_used)`` tuples, where the name is
+                 ``<digest>-<interpreter>``
+        :rtype: list of tuple
+
+        """
+        entries = []
+        if not os.path.isdir(self.directory):
+            return entries
+        for prefix in os.listdir(self.directory):
+            prefix_path = os.path.join(self.directory, prefix)
+            if prefix.startswith('.') or not os.path.isdir(prefix_path):
+                continue
+            for name in os.listdir(prefix_path):
+                path = os.path.join(prefix_path, name)
+                if name.startswith('.'):
+                    continue
+                try:
+                    with open(os.path.join(path, 'entry.json')) as f:
+                        size = json.load(f)['size']
+                    last_used = os.stat(path).st_mtime
+                except (IOError, OSError, ValueError, KeyError):
+                    continue
+                entries.append((name, size, last_used))
+        entries.sort(key=lambda entry: entry[2])
+        return entries
+
+    def evict(self, keep=None):
+        """Remove least recently used entries beyond the size limit
+
+        :param keep: The name of an entry not to remove
+        :return: The number of entries removed
+        :rtype: int
+
+        """
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for name, size, _ in entries:
+            if total <= self.max_size:
+                break
+            if name == keep:
+                continue
+            path = self._path(name)
+            # Renamed first, so that readers see the entry either complete or
+            # not at all
+            temp_path = tempfile.mkdtemp(dir=os.path.dirname(path),
+                                         prefix='.tmp-')
+            try:
+                os.rename(path, os.path.join(temp_path, name))
+            except OSError:
+                continue
+            finally:
+                shutil.rmtree(temp_path, ignore_errors=True)
+            total -= size
+            removed += 1
+        return removed
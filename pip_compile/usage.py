@@ -0,0 +1,364 @@
+"""Tracking the use of cache entries and removing the least recently used
+
+pip's wheel cache and the caches of pip_compile grow with every package
+version compiled. Compiles record which entries they read or store, and how
+many lookups of each cache hit, in a small index in the cache directory,
+``pip_compile/usage.json``. The index holds the time each entry was last used
+and its size at that time, and the hit and miss counts of each cache.
+
+``pip-compile cache stats`` shows the number of entries, sizes and hit rates
+of the caches. ``pip-compile cache prune --max-size MB`` removes the least
+recently used entries until the caches fit in ``MB`` megabytes, which compiles
+also do when finishing with ``--cache-max-size MB``. Entries not in the index,
+e.g. ones created before it existed, count as last used when they were last
+modified. Git mirrors aren't removed, since fetching them again is expensive.
+
+The functions recording the use of entries do nothing unless called inside
+:func:`recording`. Like :mod:`pip_compile.shortcuts`, this module must only
+import modules which don't import pip, so ``pip-compile cache`` runs quickly.
+
+"""
+import json
+import optparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from pip_compile.utils import atomic_write, tree_size
+
+#: The caches, their paths relative to the cache directory and the depth of
+#: their entries below that path
+SECTIONS = OrderedDict([
+    ('wheels', ('wheels', 4)),
+    ('metadata', (os.path.join('pip_compile', 'metadata'), 2)),
+    ('local-metadata', (os.path.join('pip_compile', 'local-metadata'), 2)),
+    ('vcs-metadata', (os.path.join('pip_compile', 'vcs-metadata'), 2)),
+    ('unpacked', (os.path.join('pip_compile', 'unpacked'), 2)),
+    ('resolutions', (os.path.join('pip_compile', 'resolutions'), 2)),
+    ('shortcuts', (os.path.join('pip_compile', 'shortcuts'), 2)),
+    ('constraints', (os.path.join('pip_compile', 'constraints'), 2)),
+    ('index-pages', (os.path.join('pip_compile', 'index-pages'), 2)),
+    ('pinned-links', (os.path.join('pip_compile', 'pinned-links'), 2)),
+])
+#: The path of the index relative to the cache directory
+INDEX_PATH = os.path.join('pip_compile', 'usage.json')
+MEGABYTE = 1024 * 1024
+
+#: The recorder of the :func:`recording` block being run
+_active = None
+
+
+def _entry_size(path):
+    if os.path.isdir(path):
+        return tree_size(path)
+    return os.path.getsize(path)
+
+
+def _remove(path):
+    """Remove an entry so that readers see it either complete or not at all"""
+    if not os.path.isdir(path):
+        os.remove(path)
+        return
+    temp_path = tempfile.mkdtemp(dir=os.path.dirname(path), prefix='.tmp-')
+    try:
+        os.rename(path, os.path.join(temp_path, os.path.basename(path)))
+    finally:
+        shutil.rmtree(temp_path, ignore_errors=True)
+
+
+class UsageIndex(object):
+    """The use of cache entries recorded in the cache directory"""
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.path = os.path.join(cache_dir, INDEX_PATH)
+
+    def load(self):
+        """Return the index as ``{'sections': ..., 'entries': ...}``
+
+        ``sections`` maps cache names to their ``hits`` and ``misses``, and
+        ``entries`` maps paths relative to the cache directory to their
+        ``section``, ``last_used`` time and ``size``.
+
+        """
+        try:
+            with open(self.path) as f:
+                index = json.load(f, object_pairs_hook=OrderedDict)
+        except (IOError, ValueError):
+            index = {}
+        return OrderedDict([('sections', index.get('sections', {})),
+                            ('entries', index.get('entries', {}))])
+
+    def _write(self, index):
+        # Written compactly, since it's read and written by every compile
+        atomic_write(self.path,
+                     json.dumps(index, separators=(',', ':')).encode('utf-8'))
+
+    def update(self, used, counts):
+        """Add the entries used and the lookups made by a compile
+
+        Updates made by concurrent compiles may be lost, which only affects
+        the order in which entries are removed.
+
+        :param used: Paths relative to the cache directory mapped to their
+                     section and the time they were last used
+        :param counts: Sections mapped to their ``[hits, misses]``
+
+        """
+        index = self.load()
+        for section, (hits, misses) in counts.items():
+            section_counts = index['sections'].setdefault(
+                section, OrderedDict([('hits', 0), ('misses', 0)]))
+            section_counts['hits'] += hits
+            section_counts['misses'] += misses
+        for relative_path, (section, last_used) in used.items():
+            try:
+                size = _entry_size(os.path.join(self.cache_dir,
+                                                relative_path))
+            except OSError:
+                index['entries'].pop(relative_path, None)
+                continue
+            index['entries'][relative_path] = OrderedDict([
+                ('section', section),
+                ('last_used', last_used),
+                ('size', size)])
+        self._write(index)
+
+    def entries(self, index=None):
+        """Return the entries of all caches, least recently used first
+
+        :param index: The loaded index, or ``None`` to load it
+        :return: ``(section, relative_path, size, last_used)`` tuples
+        :rtype: list of tuple
+
+        """
+        if index is None:
+            index = self.load()
+        entries = []
+        for section, (section_path, depth) in SECTIONS.items():
+            top = os.path.join(self.cache_dir, section_path)
+            paths = [top]
+            for _ in range(depth):
+                paths = [os.path.join(path, name)
+                         for path in paths if os.path.isdir(path)
+                         for name in sorted(os.listdir(path))
+                         if not name.startswith('.')]
+            for path in paths:
+                relative_path = os.path.relpath(path, self.cache_dir)
+                recorded = index['entries'].get(relative_path)
+                try:
+                    modified = os.stat(path).st_mtime
+                    if recorded is None:
+                        size = _entry_size(path)
+                except OSError:
+                    continue
+                if recorded is None:
+                    last_used = modified
+                else:
+                    size = recorded['size']
+                    last_used = max(recorded['last_used'], modified)
+                entries.append((section, relative_path, size, last_used))
+        entries.sort(key=lambda entry: entry[3])
+        return entries
+
+    def stats(self):
+        """Return the entry count, size, hits and misses of each cache
+
+        :rtype: OrderedDict
+
+        """
+        index = self.load()
+        stats = OrderedDict(
+            (section, OrderedDict([('entries', 0), ('size', 0),
+                                   ('hits', 0), ('misses', 0)]))
+            for section in SECTIONS)
+        for section, _, size, _ in self.entries(index):
+            stats[section]['entries'] += 1
+            stats[section]['size'] += size
+        for section, counts in index['sections'].items():
+            if section in stats:
+                stats[section]['hits'] = counts['hits']
+                stats[section]['misses'] = counts['misses']
+        return stats
+
+    def prune(self, max_size):
+        """Remove least recently used entries until the caches fit
+
+        :param max_size: The size limit in megabytes
+        :return: The number of entries removed and the bytes freed
+        :rtype: tuple
+
+        """
+        index = self.load()
+        entries = self.entries(index)
+        total = sum(size for _, _, size, _ in entries)
+        removed = freed = 0
+        for _, relative_path, size, _ in entries:
+            if total <= max_size * MEGABYTE:
+                break
+            try:
+                _remove(os.path.join(self.cache_dir, relative_path))
+            except OSError:
+                continue
+            index['entries'].pop(relative_path, None)
+            total -= size
+            removed += 1
+            freed += size
+        existing = set(relative_path for _, relative_path, _, _ in entries)
+        for relative_path in list(index['entries']):
+            if relative_path not in existing:
+                del index['entries'][relative_path]
+        self._write(index)
+        return removed, freed
+
+
+class UsageRecorder(object):
+    """The cache entries used and the lookups made during a compile"""
+    def __init__(self, cache_dir):
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.used = {}
+        self.counts = {}
+        self._lock = threading.Lock()
+
+    def count(self, section, hit):
+        with self._lock:
+            counts = self.counts.setdefault(section, [0, 0])
+            counts[0 if hit else 1] += 1
+
+    def use(self, section, path):
+        relative_path = os.path.relpath(os.path.abspath(path), self.cache_dir)
+        if relative_path.startswith(os.pardir):
+            # Not in the cache directory being recorded
+            return
+        with self._lock:
+            self.used[relative_path] = (section, time.time())
+
+
+def hit(section, path):
+    """Record a lookup which found an entry in a cache"""
+    if _active is not None:
+        _active.count(section, True)
+        _active.use(section, path)
+
+
+def miss(section):
+    """Record a lookup which didn't find an entry in a cache"""
+    if _active is not None:
+        _active.count(section, False)
+
+
+def use(section, path):
+    """Record storing or otherwise using an entry of a cache"""
+    if _active is not None:
+        _active.use(section, path)
+
+
+@contextmanager
+def recording(cache_dir, max_size=None):
+    """Record the use of cache entries in the enclosed block
+
+    The index is updated when the block exits, after which least recently
+    used entries are removed if the caches are larger than ``max_size``.
+    Lookups which missed are only counted along with entries which were
+    used, or when pruning, so a compile which uses no cache entry doesn't
+    write the index.
+
+    :param cache_dir: The pip cache directory, or ``None`` to not record at
+                      all
+    :param max_size: The size limit in megabytes, or ``None``
+
+    """
+    global _active
+    if not cache_dir:
+        yield None
+        return
+    recorder = UsageRecorder(cache_dir)
+    previous, _active = _active, recorder
+    try:
+        yield recorder
+    finally:
+        _active = previous
+        index = UsageIndex(recorder.cache_dir)
+        try:
+            if recorder.used or (recorder.counts and max_size is not None):
+                index.update(recorder.used, recorder.counts)
+            if max_size is not None:
+                index.prune(max_size)
+        except (IOError, OSError) as exc:
+            sys.stderr.write('Could not update the cache usage index: '
+                             '{}\n'.format(exc))
+
+
+def _format_size(size):
+    if size < MEGABYTE:
+        return '{:.1f} kB'.format(size / 1024.0)
+    return '{:.1f} MB'.format(float(size) / MEGABYTE)
+
+
+def write_stats(stats, output):
+    """Write the statistics returned by :meth:`UsageIndex.stats` as a table"""
+    row = '{:<16}{:>9}{:>12}{:>8}{:>8}{:>10}\n'
+    output.write(row.format('cache', 'entries', 'size', 'hits', 'misses',
+                            'hit rate'))
+    totals = OrderedDict([('entries', 0), ('size', 0), ('hits', 0),
+                          ('misses', 0)])
+    for section, section_stats in list(stats.items()) + [('total', totals)]:
+        lookups = section_stats['hits'] + section_stats['misses']
+        hit_rate = ('{:.0%}'.format(float(section_stats['hits']) / lookups)
+                    if lookups else '-')
+        output.write(row.format(section, section_stats['entries'],
+                                _format_size(section_stats['size']),
+                                section_stats['hits'],
+                                section_stats['misses'], hit_rate))
+        if section != 'total':
+            for key in totals:
+                totals[key] += section_stats[key]
+
+
+def cache_main(args, output=None):
+    """Run ``pip-compile cache stats`` or ``pip-compile cache prune``
+
+    :param args: Command line arguments after ``cache``
+    :param output: Stream for the result, defaults to :data:`sys.stdout`
+    :return: The exit status
+    :rtype: int
+
+    """
+    # Imported here, since shortcuts imports this module
+    from pip_compile.shortcuts import default_cache_dir
+
+    output = output or sys.stdout
+    parser = optparse.OptionParser(
+        usage='%prog cache stats|prune [--cache-dir DIR] [--max-size MB]',
+        description='Show the sizes and hit rates of the wheel cache and the '
+                    'caches of pip_compile, or remove their least recently '
+                    'used entries.')
+    parser.add_option('--cache-dir', metavar='DIR',
+                      help='The pip cache directory')
+    parser.add_option('--max-size', metavar='MB', type='int',
+                      help='Remove entries until the caches fit in MB '
+                           'megabytes')
+    options, commands = parser.parse_args(args)
+    if commands not in (['stats'], ['prune']):
+        parser.error('give stats or prune')
+    if commands == ['prune'] and (options.max_size is None or
+                                  options.max_size < 0):
+        parser.error('prune needs a non-negative --max-size MB')
+    argv = ['--cache-dir', options.cache_dir] if options.cache_dir else []
+    cache_dir = default_cache_dir(argv)
+    if not cache_dir:
+        sys.stderr.write('No cache directory\n')
+        return 1
+    index = UsageIndex(cache_dir)
+    if commands == ['prune']:
+        removed, freed = index.prune(options.max_size)
+        output.write('Removed {} entries, {} from {}\n'.format(
+            removed, _format_size(freed), cache_dir))
+        return 0
+    output.write('Cache directory: {}\n'.format(cache_dir))
+    write_stats(index.stats(), output)
+    return 0
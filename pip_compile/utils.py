@@ -0,0 +1,150 @@
+"""Helpers shared by pip_compile modules"""
+import errno
+import hashlib
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+from contextlib import contextmanager
+
+#: The interpreter running ``setup.py egg_info`` for metadata of sdists and
+#: local directories
+INTERPRETER = '{}-{}.{}'.format(platform.python_implementation().lower(),
+                                *sys.version_info[:2])
+
+
+def file_digest(path, algorithm='sha256'):
+    """Return the hex digest of a file's contents
+
+    :param path: Path of the file to hash
+    :param algorithm: Name of a :mod:`hashlib` algorithm
+    :return: The hex digest, or ``None`` if the file doesn't exist
+    :rtype: str
+
+    """
+    digest = hashlib.new(algorithm)
+    try:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(65536), b''):
+                digest.update(chunk)
+    except IOError as exc:
+        if exc.errno == errno.ENOENT:
+            return None
+        raise
+    return digest.hexdigest()
+
+
+def tree_size(path):
+    """Return the total size in bytes of the files in a directory tree
+
+    Files removed while walking the tree are skipped.
+
+    """
+    size = 0
+    for directory, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                size += os.lstat(os.path.join(directory, filename)).st_size
+            except OSError:
+                pass
+    return size
+
+
+def ensure_dir(path):
+    """Create a directory and its parents unless it already exists"""
+    try:
+        os.makedirs(path)
+    except OSError as exc:
+        if exc.errno != errno.EEXIST:
+            raise
+
+
+@contextmanager
+def atomic_file(path):
+    """Open a file for writing so readers never see a partial file
+
+    The data is written into a temporary file in the same directory, which is
+    renamed over the target path when the ``with`` block exits successfully.
+
+    """
+    directory = os.path.dirname(path)
+    ensure_dir(directory)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            yield f
+        if os.name == 'nt' and os.path.exists(path):
+            # os.rename() doesn't overwrite existing files on Windows
+            os.remove(path)
+        os.rename(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def atomic_write(path, data):
+    """Atomically write bytes into a file"""
+    with atomic_file(path) as f:
+        f.write(data)
+
+
+def atomic_copy(source, path):
+    """Atomically copy a file"""
+    with atomic_file(path) as f:
+        with open(source, 'rb') as source_file:
+            shutil.copyfileobj(source_file, f)
+
+
+def _graph_entries(text):
+    """Parse a ``--json-output`` graph, or return ``None`` for other text"""
+    try:
+        data = json.loads(text)
+    except ValueError:
+        data = None
+    if isinstance(data, dict) and not ('package' in data and
+                                       'dependencies' in data):
+        return 'json', data.items()
+    entries = []
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            return None
+        if not isinstance(entry, dict) or 'package' not in entry:
+            return None
+        entries.append((entry['package'], entry['dependencies']))
+    return ('ndjson', entries) if entries else None
+
+
+def normalized_output(text):
+    """Return the lines of a compiled output in a canonical order
+
+    The order of packages in outputs depends on the order in which they were
+    found, so ``--check`` compares outputs with this instead of as text.
+    Blank lines and comments of requirements lists are dropped. The
+    dependencies of packages in ``--json-output`` graphs are sorted, and the
+    lines of the two graph formats differ.
+
+    :param text: A requirements list or a ``--json-output`` graph
+    :rtype: list of str
+
+    """
+    graph = _graph_entries(text)
+    if graph is None:
+        lines = [line.strip() for line in text.splitlines()]
+        return sorted(line for line in lines
+                      if line and not line.startswith('#'))
+    json_format, entries = graph
+    if json_format == 'ndjson':
+        return sorted(
+            '{{"package": {}, "dependencies": {}}}'.format(
+                json.dumps(package), json.dumps(sorted(dependencies)))
+            for package, dependencies in entries)
+    return sorted('{}: {}'.format(json.dumps(package),
+                                  json.dumps(sorted(dependencies)))
+                  for package, dependencies in entries)
@@ -0,0 +1,261 @@
+"""Mirrors of Git repositories for VCS requirements
+
+pip clones the repository of each non-editable ``git+`` requirement from its
+remote into the build directory on every compile. With a cache directory,
+each repository is instead kept as a bare mirror, and requirements are cloned
+from the mirror. A mirror is only fetched when the pinned revision is missing
+from it, or when the requirement follows a branch, which may have moved.
+Revisions pinned to a tag or a commit which the mirror already has don't
+access the network at all.
+
+Metadata of a prepared Git requirement is stored by the repository URL and
+the commit it was resolved to, so later compiles of the same commit don't
+clone or run ``setup.py egg_info`` either.
+
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+
+from pip.download import path_to_url
+from pip.exceptions import InstallationError
+from pip.index import Link
+from pip.vcs.git import Git
+
+from pip_compile import timings, usage
+from pip_compile.cache import cache_subdir
+from pip_compile.utils import INTERPRETER, atomic_write, ensure_dir
+
+COMMIT_RE = re.compile(r'^[0-9a-f]{40}$')
+ABBREVIATED_COMMIT_RE = re.compile(r'^[0-9a-fA-F]{7,40}$')
+
+
+def is_git_requirement(install_req):
+    """Check whether a requirement is cloned from a Git repository by pip
+
+    Editable requirements are left out, since pip keeps their checkouts in
+    the source directory between compiles.
+
+    :type install_req: pip.req.req_install.InstallRequirement
+    :rtype: bool
+
+    """
+    return bool(install_req.link and not install_req.editable and
+                install_req.link.url.startswith('git+'))
+
+
+def git_url_rev(link):
+    """Split a ``git+`` link into the repository URL and the revision
+
+    :type link: pip.index.Link
+    :return: The URL and the revision, which is ``None`` if the link doesn't
+             pin one
+    :rtype: tuple
+
+    """
+    return Git(link.url).get_url_rev()
+
+
+def _mirror_name(url):
+    return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+
+class GitMirrors(object):
+    """Bare mirrors of Git repositories in the cache directory"""
+    def __init__(self, cache_dir, offline=False):
+        """Create a mirror cache
+
+        :param cache_dir: The pip cache directory
+        :param offline: Never fetch, and fail for revisions missing from the
+                        mirrors
+
+        """
+        self.directory = cache_subdir(cache_dir, 'vcs')
+        self.offline = offline
+        self._git = Git()
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def path(self, url):
+        """Return the path of the mirror of a repository"""
+        return os.path.join(self.directory,
+                            '{}.git'.format(_mirror_name(url)))
+
+    def _path_lock(self, path):
+        with self._lock:
+            return self._locks.setdefault(path, threading.Lock())
+
+    def _git_output(self, args, cwd):
+        return self._git.run_command(args, show_stdout=False, cwd=cwd,
+                                     on_returncode='ignore').strip()
+
+    def _fixed_commit(self, path, rev):
+        """Return the commit of a tag or commit the mirror already has
+
+        :return: The full commit hash, or ``None`` if the revision is
+                 missing or is a branch
+        :rtype: str
+
+        """
+        commit = self._git_output(
+            ['rev-parse', '-q', '--verify',
+             'refs/tags/{}^{{commit}}'.format(rev)], path)
+        if COMMIT_RE.match(commit):
+            return commit
+        if ABBREVIATED_COMMIT_RE.match(rev):
+            commit = self._git_output(
+                ['rev-parse', '-q', '--verify', '{}^{{commit}}'.format(rev)],
+                path)
+            if COMMIT_RE.match(commit) and commit.startswith(rev.lower()):
+                return commit
+        return None
+
+    def _clone(self, url, path):
+        ensure_dir(self.directory)
+        temp_path = tempfile.mkdtemp(dir=self.directory, prefix='.tmp-')
+        try:
+            self._git.run_command(['clone', '-q', '--mirror', url, temp_path],
+                                  show_stdout=False)
+            os.rename(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                shutil.rmtree(temp_path)
+
+    def resolve(self, url, rev=None):
+        """Make sure the mirror of a repository has a revision
+
+        :param url: The repository URL
+        :param rev: A tag, branch or commit, or ``None`` for the default
+                    branch
+        :return: The full hash of the commit the revision points to
+        :rtype: str
+        :raise InstallationError: if the revision doesn't exist
+
+        """
+        path = self.path(url)
+        with self._path_lock(path):
+            if os.path.isdir(path):
+                commit = rev and self._fixed_commit(path, rev)
+                if commit or self.offline:
+                    timings.count('vcs_mirror.hits')
+                    return commit or self._commit(path, url, rev)
+                timings.count('vcs_mirror.misses')
+                with timings.span('fetch_mirror', url=url):
+                    self._git.run_command(['fetch', '-q', '--prune',
+                                           '--tags', 'origin'],
+                                          show_stdout=False, cwd=path)
+            elif self.offline:
+                raise InstallationError(
+                    'No mirror of {} in the cache directory in --offline '
+                    'mode'.format(url))
+            else:
+                timings.count('vcs_mirror.misses')
+                with timings.span('clone_mirror', url=url):
+                    self._clone(url, path)
+            return self._commit(path, url, rev)
+
+    def _commit(self, path, url, rev):
+        commit = self._git_output(
+            ['rev-parse', '-q', '--verify',
+             '{}^{{commit}}'.format(rev or 'HEAD')], path)
+        if not COMMIT_RE.match(commit):
+            raise InstallationError('{} has no revision {}'.format(url, rev))
+        return commit
+
+    def mirror_link(self, link):
+        """Return a link which clones a ``git+`` link from its mirror
+
+        :param link: A link whose repository has been resolved with
+                     :meth:`resolve`
+        :type link: pip.index.Link
+        :rtype: pip.index.Link
+
+        """
+        url, rev = git_url_rev(link)
+        fragment = link.url.partition('#')[2]
+        return Link('git+{}{}{}'.format(path_to_url(self.path(url)),
+                                        '@{}'.format(rev) if rev else '',
+                                        '#{}'.format(fragment) if fragment
+                                        else ''))
+
+
+class VcsMetadataStore(object):
+    """Metadata of Git requirements stored by repository URL and commit
+
+    Entries are kept in memory, and also on disk if a cache directory is
+    given. The ``subdirectory`` fragment of a link is part of the key, since
+    it selects a different package in the same commit, and so is the
+    interpreter which ran ``setup.py``, since it may compute dependencies
+    differently on other interpreters.
+
+    """
+    description = 'stored metadata of commit'
+
+    def __init__(self, cache_dir=None, interpreter=INTERPRETER):
+        """Create a store
+
+        :param cache_dir: The pip cache directory, or ``None`` for a store
+                          which only lives as long as the process
+        :param interpreter: The interpreter running ``setup.py``
+
+        """
+        self.directory = cache_dir and cache_subdir(cache_dir, 'vcs-metadata')
+        self.interpreter = interpreter
+        self._entries = {}
+
+    def _key(self, link, commit):
+        url, _ = git_url_rev(link)
+        return '{}@{}#{} {}'.format(url, commit,
+                                    link.subdirectory_fragment or '',
+                                    self.interpreter)
+
+    def _path(self, key):
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, digest[:2],
+                            '{}.json'.format(digest))
+
+    def get(self, link, commit):
+        """Return stored metadata for a commit, or ``None``
+
+        :param link: The ``git+`` link of the requirement
+        :type link: pip.index.Link
+        :param commit: The full commit hash the link resolves to
+
+        """
+        key = self._key(link, commit)
+        entry = self._entries.get(key)
+        if entry is None and self.directory:
+            try:
+                with open(self._path(key)) as f:
+                    entry = json.load(f, object_pairs_hook=OrderedDict)
+            except (IOError, ValueError):
+                usage.miss('vcs-metadata')
+                return None
+        if entry is None or entry.get('key') != key:
+            if self.directory:
+                usage.miss('vcs-metadata')
+            return None
+        if self.directory:
+            usage.hit('vcs-metadata', self._path(key))
+        self._entries[key] = entry
+        return entry['metadata']
+
+    def put(self, link, commit, metadata):
+        """Store metadata extracted from a prepared Git requirement
+
+        :param metadata: Metadata as returned by
+                         :func:`pip_compile.metadata.extract_metadata`
+
+        """
+        key = self._key(link, commit)
+        entry = OrderedDict([('key', key), ('metadata', metadata)])
+        self._entries[key] = entry
+        if self.directory:
+            atomic_write(self._path(key),
+                         json.dumps(entry, indent=4).encode('utf-8'))
+            usage.use('vcs-metadata', self._path(key))
@@ -0,0 +1,229 @@
+"""Building wheels for the pip wheel cache"""
+import os
+import tempfile
+import time
+
+import pip
+from pip import logger
+from pip._vendor.packaging.utils import canonicalize_name
+from pip.download import path_to_url, unpack_url
+from pip.locations import PIP_DELETE_MARKER_FILENAME
+from pip.pep425tags import implementation_tag
+from pip.utils import ensure_dir, rmtree
+from pip.utils.logging import indent_log
+from pip.wheel import WheelBuilder, WheelCache, _cache_for_link
+
+from pip_compile import timings, usage
+from pip_compile.utils import atomic_copy
+from pip_compile.workers import worker_pool
+
+
+class PipCompileWheelCache(WheelCache):
+    """A WheelCache which records the use of cached wheels
+
+    Lookups are counted for ``pip-compile cache stats``, and the directories
+    of wheels found are marked as recently used, see
+    :mod:`pip_compile.usage`.
+
+    """
+    def cached_wheel(self, link, package_name):
+        cached = super(PipCompileWheelCache, self).cached_wheel(link,
+                                                                package_name)
+        if (not self._cache_dir or not link or link.is_wheel or
+                not link.is_artifact):
+            return cached
+        if cached is link:
+            usage.miss('wheels')
+        else:
+            usage.hit('wheels', _cache_for_link(self._cache_dir, link))
+        return cached
+
+
+class PipCompileWheelBuilder(WheelBuilder):
+    """A WheelBuilder which builds wheels concurrently
+
+    Each ``setup.py bdist_wheel`` runs in its own subprocess, so building
+    independent sdists from a pool of threads keeps up to ``jobs`` builds
+    running at a time. Finished wheels are moved into the wheel cache
+    atomically, and the time spent building each wheel is recorded in
+    :attr:`build_times`.
+
+    """
+    def __init__(self, *args, **kwargs):
+        self._jobs = kwargs.pop('jobs', 1)
+        self.build_times = {}
+        super(PipCompileWheelBuilder, self).__init__(*args, **kwargs)
+
+    def _build_one(self, req, output_dir, python_tag=None):
+        """Build one wheel.
+
+        :return: The filename of the built wheel, or None if the build failed.
+
+        *pip_compile modifications:*
+
+        Copied from pip 9.0.1. The wheel is copied into the output directory
+        through a temporary file and renamed into place, so concurrent
+        readers of the wheel cache never see a partially written wheel. The
+        build time is stored in :attr:`build_times` and recorded for
+        ``--timings``.
+
+        """
+        start = time.time()
+        tempd = tempfile.mkdtemp('pip-wheel-')
+        try:
+            with timings.span('wheel_build', package=req):
+                built = self._WheelBuilder__build_one(req, tempd,
+                                                      python_tag=python_tag)
+            if built:
+                try:
+                    wheel_name = os.listdir(tempd)[0]
+                    wheel_path = os.path.join(output_dir, wheel_name)
+                    atomic_copy(os.path.join(tempd, wheel_name), wheel_path)
+                    logger.info('Stored in directory: %s', output_dir)
+                    return wheel_path
+                except:
+                    pass
+            # Ignore return, we can't do anything else useful.
+            self._clean_one(req)
+            return None
+        finally:
+            rmtree(tempd)
+            self.build_times[req.name] = time.time() - start
+
+    def build_into_cache(self, req):
+        """Build a wheel into the cache directory for the requirement's link
+
+        :return: The filename of the built wheel, or None if the build failed.
+
+        """
+        output_dir = _cache_for_link(self._cache_root, req.link)
+        try:
+            ensure_dir(output_dir)
+        except OSError as e:
+            logger.warning("Building wheel for %s failed: %s", req.name, e)
+            return None
+        wheel_path = self._build_one(req, output_dir,
+                                     python_tag=implementation_tag)
+        if wheel_path:
+            usage.use('wheels', output_dir)
+        return wheel_path
+
+    def should_build(self, req):
+        """Return whether to build a wheel for a prepared requirement
+
+        Wheels aren't built for constraints, wheels, editables, VCS links,
+        requirements whose source tree has been removed, or when binaries are
+        disabled for the package.
+
+        """
+        if (req.constraint or req.is_wheel or req.editable or
+                (req.link and not req.link.is_artifact) or
+                not req.source_dir):
+            return False
+        link = req.link
+        base, ext = link.splitext()
+        if pip.index.egg_info_matches(base, None, link) is None:
+            # Doesn't look like a package - don't autobuild a wheel
+            # because we'll have no way to lookup the result sanely
+            return False
+        if "binary" not in pip.index.fmt_ctl_formats(
+                self.finder.format_control,
+                canonicalize_name(req.name)):
+            logger.info(
+                "Skipping bdist_wheel for %s, due to binaries "
+                "being disabled for it.", req.name)
+            return False
+        return True
+
+    def build(self, autobuilding=False):
+        """Build wheels.
+
+        :param unpack: If True, replace the sdist we built from with the
+            newly built wheel, in preparation for installation.
+        :return: True if all the wheels built correctly.
+
+        *pip_compile modifications:*
+
+        Copied from pip 9.0.1 and reduced to the ``autobuilding=True`` case
+        used by pip_compile. Wheels are built concurrently, after which the
+        requirements are updated to point to the wheels in the original
+        order. Requirements released by ``--release-builds`` have had their
+        wheels built while preparing them, and are skipped by
+        :meth:`should_build`.
+
+        """
+        assert autobuilding and self._cache_root
+        # unpack sdists and constructs req set
+        self.requirement_set.prepare_files(self.finder)
+
+        reqset = self.requirement_set.requirements.values()
+
+        buildset = [req for req in reqset if self.should_build(req)]
+
+        if not buildset:
+            return True
+
+        # Build the wheels.
+        logger.info(
+            'Building wheels for collected packages: %s',
+            ', '.join([req.name for req in buildset]),
+        )
+        with indent_log():
+            if self._jobs > 1 and len(buildset) > 1:
+                pool = worker_pool(min(self._jobs, len(buildset)))
+                try:
+                    wheel_files = pool.map(self.build_into_cache, buildset)
+                finally:
+                    pool.close()
+                    pool.join()
+            else:
+                wheel_files = [self.build_into_cache(req)
+                               for req in buildset]
+
+            build_success, build_failure = [], []
+            for req, wheel_file in zip(buildset, wheel_files):
+                if wheel_file:
+                    build_success.append(req)
+                    # XXX: This is mildly duplicative with prepare_files,
+                    # but not close enough to pull out to a single common
+                    # method.
+                    # The code below assumes temporary source dirs -
+                    # prevent it doing bad things.
+                    if req.source_dir and not os.path.exists(os.path.join(
+                            req.source_dir, PIP_DELETE_MARKER_FILENAME)):
+                        raise AssertionError(
+                            "bad source dir - missing marker")
+                    # Delete the source we built the wheel from
+                    req.remove_temporary_source()
+                    # set the build directory again - name is known from
+                    # the work prepare_files did.
+                    req.source_dir = req.build_location(
+                        self.requirement_set.build_dir)
+                    # Update the link for this.
+                    req.link = pip.index.Link(path_to_url(wheel_file))
+                    assert req.link.is_wheel
+                    # extract the wheel into the dir
+                    with timings.span('unpack_wheel', package=req):
+                        unpack_url(
+                            req.link, req.source_dir, None, False,
+                            session=self.requirement_set.session)
+                else:
+                    build_failure.append(req)
+
+        for req in buildset:
+            logger.info('Wheel build time for %s: %.1fs',
+                        req.name, self.build_times.get(req.name, 0.0))
+
+        # notify success/failure
+        if build_success:
+            logger.info(
+                'Successfully built %s',
+                ' '.join([req.name for req in build_success]),
+            )
+        if build_failure:
+            logger.info(
+                'Failed to build %s',
+                ' '.join([req.name for req in build_failure]),
+            )
+        # Return True if all builds were successful
+        return len(build_failure) == 0
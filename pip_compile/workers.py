@@ -0,0 +1,23 @@
+"""Thread pools for running pip operations concurrently"""
+from multiprocessing.pool import ThreadPool
+
+from pip.utils.logging import _log_state, get_indentation
+
+
+def _init_worker_thread(indentation):
+    """Initialize pip's thread-local log indentation in a worker thread"""
+    _log_state.indentation = indentation
+
+
+def worker_pool(jobs):
+    """Create a pool of threads which can run pip's preparation code
+
+    Log messages from the worker threads are indented like messages logged in
+    the calling thread at the time the pool is created.
+
+    :param jobs: The number of worker threads
+    :rtype: multiprocessing.pool.ThreadPool
+
+    """
+    return ThreadPool(jobs, initializer=_init_worker_thread,
+                      initargs=(get_indentation(),))
@@ -0,0 +1,80 @@
+import threading
+
+import pytest
+
+from pip_compile import api
+from pip_compile.command import CompileCommand
+
+
+@pytest.fixture
+def constraints(tmpdir):
+    path = tmpdir.join('constraints.txt')
+    path.write('pkg==1.0\nother==2.0\n')
+    return str(path)
+
+
+def test_compile(tmpdir, constraints):
+    tmpdir.join('requirements.txt').write('other\n')
+    with api.Context(['--flat'], cache_dir=False) as context:
+        result = api.compile(packages=['pkg'], constraints=[constraints],
+                             context=context)
+        assert result.lines == ['pkg==1.0']
+        assert result.to_dict() == {'pkg==1.0': []}
+        result = api.compile(
+            requirements=[str(tmpdir.join('requirements.txt'))],
+            constraints=[constraints], context=context)
+        assert result.requirements == 'other==2.0\n'
+    result = api.compile(packages=['pkg', 'other'], constraints=[constraints],
+                         flat=True, cache_dir=False)
+    assert sorted(result.lines) == ['other==2.0', 'pkg==1.0']
+
+
+def test_compile_unpinned(constraints):
+    with pytest.raises(Exception) as excinfo:
+        api.compile(packages=['pkg', 'loose'], constraints=[constraints],
+                    flat=True, cache_dir=False)
+    assert 'loose' in str(excinfo.value)
+
+
+def test_context_options():
+    with pytest.raises(TypeError):
+        api.Context(no_such_option=True)
+    with pytest.raises(Exception) as excinfo:
+        api.Context(['pkg'])
+    assert 'pkg' in str(excinfo.value)
+    with pytest.raises(Exception) as excinfo:
+        api.Context(output='requirements.lock')
+    assert 'output' in str(excinfo.value)
+    with api.Context(['--flat'], cache_dir=False) as context:
+        with pytest.raises(TypeError):
+            api.compile(packages=['pkg'], context=context, pre=True)
+
+
+def test_compiles_keep_index_options_of_their_files(tmpdir, monkeypatch):
+    used = {}
+
+    def record_finder(self, options, finder, requirement_set, constraints):
+        used[options.requirements[0]] = list(finder.index_urls)
+
+    monkeypatch.setattr(CompileCommand, 'fail_if_any_unpinned_packages',
+                        record_finder)
+    internal = tmpdir.join('internal.txt')
+    internal.write('--index-url https://internal.example.com/simple\n')
+    public = tmpdir.join('public.txt')
+    public.write('# only the index of the context\n')
+    with api.Context(['-i', 'https://public.example.com/simple'],
+                     cache_dir=False) as context:
+        for path in internal, public:
+            api.compile(requirements=[str(path)], context=context)
+        assert used[str(internal)] == ['https://internal.example.com/simple']
+        assert used[str(public)] == context.finder.index_urls
+        used.clear()
+        threads = [threading.Thread(target=api.compile, kwargs={
+            'requirements': [str(path)], 'context': context})
+            for path in (internal, public) * 2]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert used[str(internal)] == ['https://internal.example.com/simple']
+        assert used[str(public)] == context.finder.index_urls
@@ -0,0 +1,100 @@
+import json
+
+import pytest
+from pip.exceptions import InstallationError
+
+import pip_compile.command
+from pip_compile.batch import job_options, load_manifest
+
+
+def write_manifest(tmpdir, jobs):
+    path = tmpdir.join('manifest.json')
+    path.write(json.dumps(jobs))
+    return str(path)
+
+
+def test_load_manifest(tmpdir):
+    jobs = load_manifest(write_manifest(tmpdir, [
+        {'requirements': ['svc1/requirements.txt'],
+         'output': 'svc1/requirements.lock',
+         'json_output': '-'},
+        {'name': 'svc2',
+         'constraints': ['https://example.com/constraints.txt'],
+         'packages': ['Flask']}]))
+    assert jobs[0]['requirements'] == [
+        str(tmpdir.join('svc1', 'requirements.txt'))]
+    assert jobs[0]['output'] == str(tmpdir.join('svc1', 'requirements.lock'))
+    assert jobs[0]['json_output'] == '-'
+    assert jobs[0]['name'] == jobs[0]['output']
+    assert jobs[1]['constraints'] == ['https://example.com/constraints.txt']
+    assert jobs[1]['packages'] == ['Flask']
+    assert jobs[1]['output'] is None
+    assert jobs[1]['name'] == 'svc2'
+
+
+@pytest.mark.parametrize('jobs', [
+    {'requirements': ['requirements.txt']},
+    [['requirements.txt']],
+    [{'output': 'requirements.lock'}],
+    [{'requirements': ['requirements.txt'], 'outptu': 'requirements.lock'}],
+])
+def test_load_manifest_invalid(tmpdir, jobs):
+    with pytest.raises(InstallationError):
+        load_manifest(write_manifest(tmpdir, jobs))
+
+
+def test_job_options(tmpdir):
+    options, args = pip_compile.command.CompileCommand().parse_args(
+        ['-c', 'shared.txt', '--batch', 'manifest.json'])
+    job = load_manifest(write_manifest(tmpdir, [
+        {'constraints': ['own.txt'], 'packages': ['Flask'],
+         'output': 'out.txt'}]))[0]
+    job_opts, job_args = job_options(options, job)
+    assert job_opts.constraints == ['shared.txt', str(tmpdir.join('own.txt'))]
+    assert job_opts.output == str(tmpdir.join('out.txt'))
+    assert job_opts.batch is None
+    assert job_args == ['Flask']
+    assert options.constraints == ['shared.txt']
+
+
+def test_main(tmpdir):
+    tmpdir.join('constraints.txt').write('pkg==1.0\nother==2.0\n')
+    manifest = write_manifest(tmpdir, [
+        {'packages': ['pkg'], 'output': 'svc1.txt'},
+        {'packages': ['pkg', 'other'], 'output': 'svc2.txt'}])
+    assert pip_compile.command.CompileCommand().main(
+        ['--flat', '--no-cache-dir',
+         '-c', str(tmpdir.join('constraints.txt')),
+         '--batch', manifest]) == 0
+    assert tmpdir.join('svc1.txt').read() == 'pkg==1.0\n'
+    assert tmpdir.join('svc2.txt').read() == 'pkg==1.0\nother==2.0\n'
+    assert pip_compile.command.CompileCommand().main(
+        ['--flat', '--no-cache-dir', '--batch', manifest, 'pkg']) != 0
+
+
+@pytest.mark.parametrize('batch_jobs', ['1', '4'])
+def test_jobs_keep_index_options_of_their_files(tmpdir, monkeypatch,
+                                                batch_jobs):
+    used = {}
+
+    def record_finder(self, options, finder, requirement_set, constraints):
+        used[options.requirements[0]] = list(finder.index_urls)
+
+    monkeypatch.setattr(pip_compile.command.CompileCommand,
+                        'fail_if_any_unpinned_packages', record_finder)
+    tmpdir.join('internal.txt').write(
+        '--index-url https://internal.example.com/simple\n')
+    tmpdir.join('public.txt').write('# only the index of the batch\n')
+    manifest = write_manifest(tmpdir, [
+        {'requirements': ['internal.txt'], 'output': 'internal.lock'},
+        {'requirements': ['public.txt'], 'output': 'public.lock'},
+        {'requirements': ['internal.txt'], 'output': 'internal2.lock'},
+        {'requirements': ['public.txt'], 'output': 'public2.lock'}])
+    assert pip_compile.command.CompileCommand().main(
+        ['--no-cache-dir', '-i', 'https://public.example.com/simple',
+         '--batch-jobs', batch_jobs, '--batch', manifest]) == 0
+    assert used[str(tmpdir.join('internal.txt'))] == [
+        'https://internal.example.com/simple']
+    public = used[str(tmpdir.join('public.txt'))]
+    assert public[0] == 'https://public.example.com/simple'
+    assert 'https://internal.example.com/simple' not in public
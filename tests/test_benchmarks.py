@@ -0,0 +1,69 @@
+import os
+import zipfile
+
+import pytest
+
+from benchmarks.graphs import SHAPES, generate, publish
+from benchmarks.run import compare, run_case, run_startup
+
+
+def reachable(graph):
+    seen = set()
+    stack = [next(iter(graph))]
+    while stack:
+        name = stack.pop()
+        if name not in seen:
+            seen.add(name)
+            stack.extend(graph[name].dependencies)
+    return seen
+
+
+@pytest.mark.parametrize('shape', SHAPES)
+def test_generate(shape):
+    graph = generate(shape, 20)
+    assert len(graph) == 20
+    assert reachable(graph) == set(graph)
+    assert all(package.sdist == (shape == 'sdist')
+               for package in graph.values())
+
+
+def test_generate_shapes():
+    assert len(generate('wide', 10)['pkg0'].dependencies) == 9
+    assert max(len(package.dependencies)
+               for package in generate('deep', 10).values()) == 1
+    diamond = generate('diamond', 30)
+    dependents = {}
+    for package in diamond.values():
+        for dependency in package.dependencies:
+            dependents[dependency] = dependents.get(dependency, 0) + 1
+    assert max(dependents.values()) > 1
+
+
+def test_publish(tmpdir):
+    graph = generate('deep', 3)
+    args = publish(graph, str(tmpdir), versions=2, layout='simple')
+    assert args[-2:] == ['--index-url',
+                         'file://{}'.format(tmpdir.join('simple'))]
+    assert tmpdir.join('constraints.txt').read() == (
+        'pkg0==2.0\npkg1==2.0\npkg2==2.0\n')
+    assert 'pkg0-1.0-py2.py3-none-any.whl' in tmpdir.join(
+        'simple', 'pkg0', 'index.html').read()
+    with zipfile.ZipFile(str(tmpdir.join(
+            'packages', 'pkg0-2.0-py2.py3-none-any.whl'))) as wheel:
+        metadata = wheel.read('pkg0-2.0.dist-info/METADATA').decode('utf-8')
+    assert 'Requires-Dist: pkg1\n' in metadata
+
+
+def test_run_case():
+    results = run_case('wide', 3, 'find-links', versions=1)
+    assert [result['run'] for result in results] == ['cold', 'warm']
+    assert all(result['status'] == 0 for result in results)
+    assert all(result['max_rss_kb'] > 0 for result in results)
+    assert compare(results, {'results': results}, 1.2) == []
+
+
+def test_run_startup():
+    results = run_startup(repeat=1)
+    assert [result['run'] for result in results] == [
+        'version', 'import', 'resolution', 'shortcut']
+    assert all(result['status'] == 0 for result in results)
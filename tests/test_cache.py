@@ -0,0 +1,101 @@
+import os
+
+import pytest
+
+import pip_compile.command
+from pip_compile.cache import (ResolutionCache, requirement_file_digests,
+                               resolution_key)
+
+
+@pytest.fixture
+def requirements_dir(tmpdir):
+    tmpdir.join('base.txt').write('Flask\n')
+    tmpdir.join('requirements.txt').write('-r base.txt  # shared\nJinja2\n')
+    tmpdir.join('constraints.txt').write('Flask==0.11.1\nJinja2==2.8\n')
+    return tmpdir
+
+
+def parse_args(*argv):
+    return pip_compile.command.CompileCommand().parse_args(list(argv))
+
+
+def test_requirement_file_digests_follow_includes(requirements_dir):
+    digests = requirement_file_digests(
+        str(requirements_dir.join('requirements.txt')))
+    assert list(digests) == [str(requirements_dir.join('requirements.txt')),
+                             str(requirements_dir.join('base.txt'))]
+
+
+def test_requirement_file_digests_remote_include(requirements_dir):
+    requirements_dir.join('remote.txt').write(
+        '-r https://example.com/requirements.txt\n')
+    assert requirement_file_digests(
+        str(requirements_dir.join('remote.txt'))) is None
+
+
+def test_resolution_key_changes_with_nested_file(requirements_dir):
+    options, args = parse_args(
+        '-r', str(requirements_dir.join('requirements.txt')),
+        '-c', str(requirements_dir.join('constraints.txt')))
+    key = resolution_key(options, args, '9.0.1')
+    assert resolution_key(options, args, '9.0.1') == key
+    requirements_dir.join('base.txt').write('Flask\nWerkzeug\n')
+    assert resolution_key(options, args, '9.0.1') != key
+
+
+def test_resolution_key_changes_with_options(requirements_dir):
+    constraints = str(requirements_dir.join('constraints.txt'))
+    options, args = parse_args('-c', constraints, 'Flask')
+    flat_options, flat_args = parse_args('-c', constraints, '--flat', 'Flask')
+    assert (resolution_key(options, args, '9.0.1') !=
+            resolution_key(flat_options, flat_args, '9.0.1'))
+    assert (resolution_key(options, args, '9.0.1') !=
+            resolution_key(options, args, '8.1.2'))
+
+
+def test_resolution_key_ignores_output_paths(requirements_dir):
+    constraints = str(requirements_dir.join('constraints.txt'))
+    options, args = parse_args('-c', constraints, 'Flask')
+    output_options, output_args = parse_args('-c', constraints, '-o', '-',
+                                             'Flask')
+    assert (resolution_key(options, args, '9.0.1') ==
+            resolution_key(output_options, output_args, '9.0.1'))
+
+
+def test_resolution_cache_round_trip(tmpdir):
+    cache = ResolutionCache(str(tmpdir))
+    assert cache.get('abcdef') is None
+    graph = {'Flask==0.11.1': ['Jinja2==2.8'], 'Jinja2==2.8': []}
+    cache.put('abcdef', 'Jinja2==2.8\nFlask==0.11.1\n', graph)
+    assert cache.get('abcdef') == {
+        'requirements': 'Jinja2==2.8\nFlask==0.11.1\n', 'graph': graph}
+
+
+def test_resolution_cache_corrupt_entry(tmpdir):
+    cache = ResolutionCache(str(tmpdir))
+    cache.put('abcdef', '', {})
+    with open(cache._path('abcdef'), 'w') as f:
+        f.write('{"requirements"')
+    assert cache.get('abcdef') is None
+
+
+def test_resolution_key_changes_with_local_files(requirements_dir,
+                                                  monkeypatch):
+    monkeypatch.chdir(requirements_dir)
+    requirements_dir.join('pkg-1.0.tar.gz').write('archive')
+    requirements_dir.join('other-1.0.tar.gz').write('archive')
+    requirements_dir.join('local.txt').write(
+        './pkg-1.0.tar.gz ; python_version > "2.6"\n'
+        'file://{}#egg=other\n'.format(
+            requirements_dir.join('other-1.0.tar.gz')))
+    digests = requirement_file_digests(str(requirements_dir.join('local.txt')))
+    assert list(digests)[1:] == [
+        str(requirements_dir.join('pkg-1.0.tar.gz')),
+        str(requirements_dir.join('other-1.0.tar.gz'))]
+    options, args = parse_args('-r', 'local.txt', 'pkg-1.0.tar.gz[extra]')
+    key = resolution_key(options, args, '9.0.1')
+    requirements_dir.join('other-1.0.tar.gz').write('changed')
+    changed_key = resolution_key(options, args, '9.0.1')
+    assert changed_key != key
+    requirements_dir.join('pkg-1.0.tar.gz').write('changed')
+    assert resolution_key(options, args, '9.0.1') != changed_key
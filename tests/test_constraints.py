@@ -0,0 +1,114 @@
+import pip_compile.command
+from pip_compile import context
+from pip_compile.cache import requirement_file_digests
+from pip_compile.constraints import (ConstraintCache, ConstraintIndex,
+                                     load_requirement, serialize_requirement)
+from pip_compile.context import CompileContext
+from pip.req import InstallRequirement
+
+
+def test_constraint_index_canonical_names():
+    index = ConstraintIndex([
+        InstallRequirement.from_line('Foo_Bar==1.0', constraint=True),
+        InstallRequirement.from_line('Jinja2==2.8', constraint=True)])
+    assert index.names == {'foo-bar', 'jinja2'}
+    assert 'foo.bar' in index
+    assert 'JINJA2' in index
+    assert 'flask' not in index
+    assert None not in index
+    assert len(index) == 2
+
+
+def test_serialize_requirement_round_trip():
+    requirements = [
+        InstallRequirement.from_line(
+            'six==1.10.0', 'constraints.txt', constraint=True,
+            options={'hashes': {'sha256': ['abc']}}),
+        InstallRequirement.from_line(
+            'git+https://server/pkg.git@1.0#egg=pkg; python_version>"2.6"',
+            'constraints.txt', constraint=True),
+        InstallRequirement.from_editable(
+            'git+https://server/other.git@2.0#egg=other',
+            comes_from='constraints.txt', constraint=True)]
+    loaded = [load_requirement(serialize_requirement(req))
+              for req in requirements]
+    assert [str(req) for req in loaded] == [str(req) for req in requirements]
+    assert [req.editable for req in loaded] == [False, False, True]
+    assert all(req.constraint for req in loaded)
+    assert loaded[0].options == {'hashes': {'sha256': ['abc']}}
+    assert str(loaded[1].markers) == 'python_version > "2.6"'
+
+
+def test_constraint_cache(tmpdir):
+    path = str(tmpdir.join('constraints.txt'))
+    tmpdir.join('constraints.txt').write('Flask==0.11.1\n')
+    digests = requirement_file_digests(path)
+    cache = ConstraintCache(str(tmpdir.join('cache')))
+    assert cache.get(path, digests) is None
+    cache.put(path, digests,
+              [InstallRequirement.from_line('Flask==0.11.1', constraint=True)])
+    assert [str(req.req) for req in cache.get(path, digests)] == [
+        'Flask==0.11.1']
+    tmpdir.join('constraints.txt').write('Flask==0.12\n')
+    assert cache.get(path, requirement_file_digests(path)) is None
+
+
+def test_constraint_cache_skips_option_lines(tmpdir):
+    path = str(tmpdir.join('constraints.txt'))
+    tmpdir.join('constraints.txt').write(
+        '--index-url https://example.com/simple\nFlask==0.11.1\n')
+    digests = requirement_file_digests(path)
+    cache = ConstraintCache(str(tmpdir.join('cache')))
+    cache.put(path, digests,
+              [InstallRequirement.from_line('Flask==0.11.1', constraint=True)])
+    assert cache.get(path, digests) is None
+
+
+def test_context_uses_constraint_cache(tmpdir, monkeypatch):
+    tmpdir.join('constraints.txt').write('Flask==0.11.1\nJinja2==2.8\n')
+    options, args = pip_compile.command.CompileCommand().parse_args(
+        ['--no-index', '--cache-dir', str(tmpdir.join('cache')),
+         '--constraint-cache', '-c', str(tmpdir.join('constraints.txt'))])
+    with CompileContext(pip_compile.command.CompileCommand(), options) as ctx:
+        ctx.constraint_index(options)
+
+    def parse_requirements(filename, **kwargs):
+        raise AssertionError('parsed {} again'.format(filename))
+
+    monkeypatch.setattr(context, 'parse_requirements', parse_requirements)
+    with CompileContext(pip_compile.command.CompileCommand(), options) as ctx:
+        index = ctx.constraint_index(options)
+    assert index.names == {'flask', 'jinja2'}
+    assert [str(req.req) for req in index.requirements()] == [
+        'Flask==0.11.1', 'Jinja2==2.8']
+
+
+def test_constraint_cache_is_opt_in(tmpdir):
+    options, args = pip_compile.command.CompileCommand().parse_args(
+        ['--no-index', '--cache-dir', str(tmpdir.join('cache'))])
+    with CompileContext(pip_compile.command.CompileCommand(), options) as ctx:
+        assert ctx.constraint_cache is None
+
+
+def test_constraint_cache_keeps_markers_and_extras(tmpdir):
+    tmpdir.join('constraints.txt').write(
+        'pkg==1.0 ; python_version < "3"\n'
+        'pkg==2.0 ; python_version >= "3"\n'
+        'other[extra]==1.0 ; sys_platform == "linux"\n')
+    argv = ['--flat', '--cache-dir', str(tmpdir.join('cache')),
+            '--constraint-cache', '-c', str(tmpdir.join('constraints.txt')),
+            '-o', str(tmpdir.join('requirements.txt')), 'pkg', 'other']
+    options, args = pip_compile.command.CompileCommand().parse_args(argv)
+    loaded = []
+    for _ in range(2):
+        with CompileContext(pip_compile.command.CompileCommand(),
+                            options) as ctx:
+            loaded.append([(str(req.req), str(req.markers), req.extras)
+                           for req in ctx.constraint_index(options)
+                           .requirements()])
+    assert loaded[0] == loaded[1] == [
+        ('pkg==1.0', 'python_version < "3"', set()),
+        ('pkg==2.0', 'python_version >= "3"', set()),
+        ('other[extra]==1.0', 'sys_platform == "linux"', {'extra'})]
+    for _ in range(2):
+        assert pip_compile.command.CompileCommand().main(argv) == 0
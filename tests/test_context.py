@@ -0,0 +1,92 @@
+from pip_compile import context
+from pip_compile.command import CompileCommand
+from pip_compile.context import CompileContext
+
+
+def test_parse_requirements_once(tmpdir, monkeypatch):
+    tmpdir.join('constraints.txt').write('Flask==0.11.1\nJinja2==2.8\n')
+    calls = []
+    original = context.parse_requirements
+
+    def parse_requirements(filename, **kwargs):
+        calls.append(filename)
+        return original(filename, **kwargs)
+
+    options, args = CompileCommand().parse_args(['--no-index'])
+    monkeypatch.setattr(context, 'parse_requirements', parse_requirements)
+    with CompileContext(CompileCommand(), options) as ctx:
+        first = ctx.parse_requirements(str(tmpdir.join('constraints.txt')),
+                                       options, constraint=True)
+        second = ctx.parse_requirements(str(tmpdir.join('constraints.txt')),
+                                        options, constraint=True)
+    assert len(calls) == 1
+    assert [str(req.req) for req in first] == ['Flask==0.11.1', 'Jinja2==2.8']
+    assert [str(req.req) for req in second] == ['Flask==0.11.1', 'Jinja2==2.8']
+    assert all(req.constraint for req in second)
+    assert not any(req is copy for req, copy in zip(first, second))
+
+
+def test_parse_requirements_require_hashes(tmpdir):
+    tmpdir.join('requirements.txt').write(
+        '--require-hashes\nsix==1.10.0 --hash=sha256:abc\n')
+    options, args = CompileCommand().parse_args(['--no-index'])
+    with CompileContext(CompileCommand(), options) as ctx:
+        ctx.parse_requirements(str(tmpdir.join('requirements.txt')), options)
+        options.require_hashes = False
+        ctx.parse_requirements(str(tmpdir.join('requirements.txt')), options)
+    assert options.require_hashes
+
+
+def test_parse_requirements_after_change(tmpdir):
+    tmpdir.join('base.txt').write('Flask==0.11.1\n')
+    tmpdir.join('constraints.txt').write('-c base.txt\n')
+    options, args = CompileCommand().parse_args(['--no-index'])
+    with CompileContext(CompileCommand(), options) as ctx:
+        first = ctx.parse_requirements(str(tmpdir.join('constraints.txt')),
+                                       options, constraint=True)
+        tmpdir.join('base.txt').write('Flask==0.12\n')
+        second = ctx.parse_requirements(str(tmpdir.join('constraints.txt')),
+                                        options, constraint=True)
+    assert [str(req.req) for req in first] == ['Flask==0.11.1']
+    assert [str(req.req) for req in second] == ['Flask==0.12']
+
+
+def test_finder_options_apply_to_one_compile(tmpdir):
+    tmpdir.join('internal.txt').write(
+        '--index-url https://internal.example.com/simple\n'
+        '--extra-index-url https://extra.example.com/simple\n'
+        '--find-links {}\n'
+        '--pre\n'
+        'Flask\n'.format(tmpdir))
+    tmpdir.join('public.txt').write('Jinja2\n')
+    options, args = CompileCommand().parse_args(
+        ['--index-url', 'https://public.example.com/simple'])
+    with CompileContext(CompileCommand(), options) as ctx:
+        for _ in range(2):
+            internal = ctx.new_finder()
+            ctx.parse_requirements(str(tmpdir.join('internal.txt')), options,
+                                   finder=internal)
+            assert internal.index_urls == [
+                'https://internal.example.com/simple',
+                'https://extra.example.com/simple']
+            assert internal.find_links == [str(tmpdir)]
+            assert internal.allow_all_prereleases
+            public = ctx.new_finder()
+            ctx.parse_requirements(str(tmpdir.join('public.txt')), options,
+                                   finder=public)
+            assert public.index_urls == ctx.finder.index_urls
+            assert public.find_links == ctx.finder.find_links
+            assert not public.allow_all_prereleases
+        assert 'https://internal.example.com/simple' not in \
+            ctx.finder.index_urls
+
+
+def test_git_mirrors_are_opt_in(tmpdir):
+    cache_dir = str(tmpdir.join('cache'))
+    options, args = CompileCommand().parse_args(['--cache-dir', cache_dir])
+    with CompileContext(CompileCommand(), options) as ctx:
+        assert ctx.git_mirrors is None
+    options, args = CompileCommand().parse_args(['--cache-dir', cache_dir,
+                                                 '--git-mirrors'])
+    with CompileContext(CompileCommand(), options) as ctx:
+        assert ctx.git_mirrors is not None
@@ -0,0 +1,64 @@
+import pytest
+from pip.exceptions import InstallationError
+from pip.locations import PIP_DELETE_MARKER_FILENAME
+from pip.req import InstallRequirement
+
+import pip_compile.footprint
+from pip_compile.footprint import Footprint, release_build
+from pip_compile.index import LinkPage
+
+
+def prepared_requirement(source_dir, marked=True):
+    source_dir.join('setup.py').write('', ensure=True)
+    if marked:
+        source_dir.join(PIP_DELETE_MARKER_FILENAME).write('')
+    req = InstallRequirement.from_line('pkg==1.0')
+    req.source_dir = str(source_dir)
+    page = LinkPage('https://example.com/simple/pkg/',
+                    [('https://example.com/pkg-1.0.tar.gz', '>=2.7')])
+    req.link = page.links[0]
+    return req
+
+
+def test_release_build(tmpdir):
+    req = prepared_requirement(tmpdir.join('build', 'pkg'))
+    assert release_build(req)
+    assert not tmpdir.join('build', 'pkg').exists()
+    assert req.source_dir is None
+    assert req.link.comes_from == 'https://example.com/simple/pkg/'
+    assert req.link.url == 'https://example.com/pkg-1.0.tar.gz'
+
+    local = prepared_requirement(tmpdir.join('local'), marked=False)
+    assert not release_build(local)
+    assert tmpdir.join('local', 'setup.py').exists()
+
+
+def test_footprint_limits(tmpdir, monkeypatch):
+    build = tmpdir.join('build')
+    req = prepared_requirement(build.join('pkg'))
+    build.join('pkg', 'data').write('x' * 2 * 1024 * 1024)
+    size = 2 * 1024 * 1024 + build.join('pkg', 'setup.py').size() + \
+        build.join('pkg', PIP_DELETE_MARKER_FILENAME).size()
+    footprint = Footprint(str(build))
+    footprint.check(req)
+    assert footprint.build_size == footprint.peak_build_size == size
+
+    def fail(path):
+        raise AssertionError('measured {} again'.format(path))
+
+    monkeypatch.setattr(pip_compile.footprint, 'tree_size', fail)
+    footprint.check(req)
+    local = prepared_requirement(tmpdir.join('local'), marked=False)
+    footprint.check(local)
+    assert footprint.build_size == size
+    assert footprint.release(req)
+    assert not build.join('pkg').exists()
+    assert footprint.build_size == 0
+    assert footprint.peak_build_size == size
+    monkeypatch.undo()
+
+    req = prepared_requirement(build.join('pkg'))
+    build.join('pkg', 'data').write('x' * 2 * 1024 * 1024)
+    with pytest.raises(InstallationError) as exc_info:
+        Footprint(str(build), max_build_size=1).check(req)
+    assert '--max-build-size 1 MB' in str(exc_info.value)
@@ -0,0 +1,70 @@
+import json
+from collections import OrderedDict
+from io import StringIO
+
+import pytest
+from pip.req import InstallRequirement, RequirementSet
+
+from pip_compile.graph import DependencyGraph, why_main
+
+GRAPH = OrderedDict([('app==1.0', ['lib==2.0', 'Web_Kit==3.0']),
+                     ('Web_Kit==3.0', ['lib==2.0']),
+                     ('lib==2.0', []),
+                     ('tool==0.1', ['Web_Kit==3.0'])])
+
+
+def test_topological_order_matches_pip():
+    requirement_set = RequirementSet(None, None, None, session='dummy')
+    for line, parent in [('app==1.0', None), ('tool==0.1', None),
+                         ('lib==2.0', 'app'), ('webkit==3.0', 'app'),
+                         ('lib==2.0', 'webkit'), ('webkit==3.0', 'tool')]:
+        requirement_set.add_requirement(
+            InstallRequirement.from_line(line), parent)
+    graph = DependencyGraph.from_requirement_set(requirement_set)
+    assert [graph.requirements[node]
+            for node in graph.topological_order()] == \
+        requirement_set._to_install()
+
+
+def test_deep_graph_has_no_recursion_limit():
+    size = 5000
+    graph = DependencyGraph(['pkg{}==1.0'.format(index)
+                             for index in range(size)],
+                            [[index + 1] for index in range(size - 1)] + [[]])
+    assert graph.topological_order() == list(reversed(range(size)))
+
+
+@pytest.mark.parametrize('json_format', ['json', 'ndjson'])
+def test_write_and_load(tmpdir, json_format):
+    graph = DependencyGraph.from_dict(GRAPH)
+    output = StringIO()
+    graph.write(output, json_format)
+    if json_format == 'json':
+        assert output.getvalue() == json.dumps(
+            OrderedDict((graph.labels[node], GRAPH[graph.labels[node]])
+                        for node in graph.topological_order()),
+            indent=4, separators=(',', ': '))
+    else:
+        assert json.loads(output.getvalue().splitlines()[0]) == {
+            'package': 'lib==2.0', 'dependencies': []}
+    tmpdir.join('graph').write(output.getvalue())
+    assert DependencyGraph.load(str(tmpdir.join('graph'))).to_dict() == GRAPH
+
+
+def test_why(tmpdir):
+    graph = DependencyGraph.from_dict(GRAPH)
+    assert [graph.labels[node]
+            for node in graph.dependents(graph.find('web-kit'))] == [
+        'app==1.0', 'tool==0.1']
+    assert graph.why(graph.find('lib')) == ['lib==2.0',
+                                            '  app==1.0',
+                                            '  Web_Kit==3.0',
+                                            '    app==1.0 (see above)',
+                                            '    tool==0.1']
+
+    tmpdir.join('graph.json').write(json.dumps(GRAPH))
+    output = StringIO()
+    assert why_main(['Web.Kit', '--graph', str(tmpdir.join('graph.json'))],
+                    output) == 0
+    assert output.getvalue() == 'Web_Kit==3.0\n  app==1.0\n  tool==0.1\n'
+    assert why_main(['missing', '-g', str(tmpdir.join('graph.json'))]) == 1
@@ -0,0 +1,147 @@
+import os
+
+import pytest
+from pip.download import PipSession, path_to_url
+from pip.exceptions import DistributionNotFound
+from pip.index import HTMLPage, Link
+from pip.req import InstallRequirement
+
+from pip_compile import index
+from pip_compile.index import (IndexPageCache, PinnedLinkCache,
+                               PipCompilePackageFinder)
+
+PAGE = b'''<html><body>
+<a href="pkg-1.0.tar.gz#md5=abc">pkg-1.0.tar.gz</a>
+<a href="pkg-1.1.tar.gz" data-requires-python="&gt;=3.4">pkg-1.1.tar.gz</a>
+</body></html>'''
+
+
+def test_get_page_reuses_links(monkeypatch):
+    fetched = []
+
+    def get_page(link, session=None):
+        fetched.append(link.url)
+        return HTMLPage(PAGE, link.url)
+
+    monkeypatch.setattr(index.HTMLPage, 'get_page', staticmethod(get_page))
+    finder = PipCompilePackageFinder([], [], session='dummy')
+    link = Link('https://example.com/simple/pkg/')
+    page = finder._get_page(link)
+    assert finder._get_page(link) is page
+    assert fetched == ['https://example.com/simple/pkg/']
+    assert [str(link) for link in page.links] == [
+        'https://example.com/simple/pkg/pkg-1.0.tar.gz#md5=abc '
+        '(from https://example.com/simple/pkg/)',
+        'https://example.com/simple/pkg/pkg-1.1.tar.gz '
+        '(from https://example.com/simple/pkg/) (requires-python:>=3.4)']
+
+    finder.page_ttl = 0
+    finder._get_page(link)
+    assert len(fetched) == 2
+
+
+def write_project_page(index_dir, versions, mtime):
+    page = index_dir.join('pkg', 'index.html')
+    page.ensure()
+    page.write('<html><body>{}</body></html>'.format(''.join(
+        '<a href="pkg-{0}.tar.gz">pkg-{0}.tar.gz</a>'.format(version)
+        for version in versions)))
+    os.utime(str(page), (mtime, mtime))
+
+
+@pytest.fixture
+def simple_index(tmpdir):
+    index_dir = tmpdir.join('simple')
+    write_project_page(index_dir, ['1.0'], 1500000000)
+    return index_dir
+
+
+def find_versions(simple_index, cache_dir, **kwargs):
+    finder = PipCompilePackageFinder(
+        [], [path_to_url(str(simple_index))], session=PipSession(),
+        page_cache=IndexPageCache(str(cache_dir)), **kwargs)
+    return [str(candidate.version)
+            for candidate in finder.find_all_candidates('pkg')]
+
+
+def test_index_page_cache_revalidates(simple_index, tmpdir):
+    cache_dir = tmpdir.join('cache')
+    assert find_versions(simple_index, cache_dir, page_ttl=3600) == ['1.0']
+    write_project_page(simple_index, ['1.0', '1.1'], 1500000100)
+    assert find_versions(simple_index, cache_dir, page_ttl=3600) == ['1.0']
+    assert find_versions(simple_index, cache_dir, page_ttl=0) == ['1.0', '1.1']
+
+
+def test_index_page_cache_unchanged_page(simple_index, tmpdir, monkeypatch):
+    cache_dir = tmpdir.join('cache')
+    find_versions(simple_index, cache_dir, page_ttl=0)
+
+    def fail(*args, **kwargs):
+        raise AssertionError('the page was parsed again')
+
+    monkeypatch.setattr(index, 'HTMLPage', fail)
+    assert find_versions(simple_index, cache_dir, page_ttl=0) == ['1.0']
+
+
+def test_index_page_cache_offline(simple_index, tmpdir):
+    cache_dir = tmpdir.join('cache')
+    find_versions(simple_index, cache_dir)
+    write_project_page(simple_index, ['1.0', '1.1'], 1500000100)
+    assert find_versions(simple_index, cache_dir, page_ttl=0,
+                         offline=True) == ['1.0']
+    assert find_versions(tmpdir.join('other').ensure(dir=True), cache_dir,
+                         offline=True) == []
+
+
+def pinned_finder(simple_index, cache_dir=None, **kwargs):
+    pin_cache = PinnedLinkCache(str(cache_dir)) if cache_dir else None
+    return PipCompilePackageFinder(
+        [], [path_to_url(str(simple_index))], session=PipSession(),
+        pin_cache=pin_cache, **kwargs)
+
+
+def test_pinned_requirement_skips_other_versions(simple_index, monkeypatch):
+    write_project_page(simple_index, ['0.9', '1.0', '1.0.1', '1.1'],
+                       1500000100)
+    finder = pinned_finder(simple_index)
+    evaluated = []
+    link_package_versions = finder._link_package_versions
+
+    def evaluate(link, search):
+        evaluated.append(link.filename)
+        return link_package_versions(link, search)
+
+    monkeypatch.setattr(finder, '_link_package_versions', evaluate)
+    link = finder.find_requirement(InstallRequirement.from_line('pkg==1.0'),
+                                   upgrade=False)
+    assert link.filename == 'pkg-1.0.tar.gz'
+    assert evaluated == ['pkg-1.0.tar.gz']
+
+    # Without a file of the pinned version, all versions are listed by pip
+    del evaluated[:]
+    with pytest.raises(DistributionNotFound):
+        finder.find_requirement(InstallRequirement.from_line('pkg==2.0'),
+                                upgrade=False)
+    assert sorted(evaluated) == ['pkg-0.9.tar.gz', 'pkg-1.0.1.tar.gz',
+                                 'pkg-1.0.tar.gz', 'pkg-1.1.tar.gz']
+
+
+def test_pinned_link_cache(simple_index, tmpdir):
+    cache_dir = tmpdir.join('cache')
+    req = InstallRequirement.from_line('pkg==1.0')
+    link = pinned_finder(simple_index, cache_dir).find_requirement(
+        req, upgrade=False)
+    simple_index.remove()
+    assert pinned_finder(simple_index, cache_dir).find_requirement(
+        req, upgrade=False).url == link.url
+    assert pinned_finder(simple_index, cache_dir, page_ttl=0,
+                         offline=True).find_requirement(
+        req, upgrade=False).url == link.url
+    with pytest.raises(DistributionNotFound):
+        pinned_finder(simple_index, cache_dir, page_ttl=0).find_requirement(
+            req, upgrade=False)
+    # Links are recorded separately for each finder configuration
+    with pytest.raises(DistributionNotFound):
+        pinned_finder(simple_index, cache_dir,
+                      allow_all_prereleases=True).find_requirement(
+            req, upgrade=False)
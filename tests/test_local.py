@@ -0,0 +1,82 @@
+import pytest
+from pip.req import InstallRequirement
+
+from pip_compile.local import (LocalMetadataStore, local_directory,
+                               static_metadata)
+
+METADATA = {'name': 'pkg', 'version': '1.0', 'requires_python': None,
+            'requires_txt': [[None, ['dep==2.0']]]}
+
+
+def test_local_directory(tmpdir):
+    tmpdir.join('pkg', 'setup.py').write('', ensure=True)
+    path = str(tmpdir.join('pkg'))
+    assert local_directory(InstallRequirement.from_line(path)) == path
+    assert local_directory(InstallRequirement.from_line('pkg==1.0')) is None
+    assert local_directory(InstallRequirement.from_line(
+        'git+https://server/pkg.git#egg=pkg')) is None
+
+
+def test_local_metadata_store(tmpdir):
+    tmpdir.join('pkg', 'setup.py').write('# version 1\n', ensure=True)
+    path = str(tmpdir.join('pkg'))
+    store = LocalMetadataStore(str(tmpdir.join('cache')))
+    assert store.get(path) is None
+    store.put(path, METADATA)
+    assert LocalMetadataStore(str(tmpdir.join('cache'))).get(path) == METADATA
+    tmpdir.join('pkg', 'setup.cfg').write('[metadata]\n')
+    assert store.get(path) is None
+    assert LocalMetadataStore(str(tmpdir.join('cache'))).get(path) is None
+
+
+def test_local_metadata_store_per_interpreter(tmpdir):
+    tmpdir.join('pkg', 'setup.py').write('', ensure=True)
+    path = str(tmpdir.join('pkg'))
+    cache_dir = str(tmpdir.join('cache'))
+    LocalMetadataStore(cache_dir, interpreter='cpython-2.7').put(path,
+                                                                 METADATA)
+    assert LocalMetadataStore(cache_dir,
+                              interpreter='cpython-3.6').get(path) is None
+    assert LocalMetadataStore(cache_dir,
+                              interpreter='cpython-2.7').get(path) == METADATA
+
+
+def test_local_metadata_store_in_memory(tmpdir):
+    tmpdir.join('pkg', 'setup.py').write('', ensure=True)
+    path = str(tmpdir.join('pkg'))
+    store = LocalMetadataStore()
+    store.put(path, METADATA)
+    assert store.get(path) == METADATA
+    assert not tmpdir.join('cache').check()
+
+
+@pytest.mark.parametrize('files,expect', [
+    ({'setup.py': "from setuptools import setup\n"
+                  "setup(name='pkg', version='1.0.0',\n"
+                  "      python_requires='>=2.7', install_requires=deps)\n"},
+     ('pkg', '1.0.0', '>=2.7')),
+    ({'setup.py': "import setuptools\nsetuptools.setup(version='01.2')\n",
+      'setup.cfg': '[metadata]\nname = pkg\nversion = 3.0\n'},
+     ('pkg', '1.2', None)),
+    ({'setup.py': "from setuptools import setup\nsetup()\n",
+      'setup.cfg': '[metadata]\nname = pkg\nversion = attr: pkg.VERSION\n'},
+     None),
+    ({'setup.py': "from setuptools import setup\n"
+                  "setup(name='pkg', version=get_version())\n"},
+     None),
+    ({'setup.py': "from setuptools import setup\n"
+                  "setup(name='pkg', version='1.0', **kwargs)\n"},
+     None),
+    ({'setup.py': "raise SystemExit(1)\n",
+      'PKG-INFO': 'Metadata-Version: 1.1\nName: pkg\nVersion: 2.0\n'},
+     ('pkg', '2.0', None)),
+])
+def test_static_metadata(tmpdir, files, expect):
+    for name, text in files.items():
+        tmpdir.join(name).write(text)
+    metadata = static_metadata(str(tmpdir))
+    if expect is None:
+        assert metadata is None
+    else:
+        assert (metadata['name'], metadata['version'],
+                metadata['requires_python']) == expect
@@ -0,0 +1,177 @@
+import pytest
+from pip._vendor import pkg_resources
+from pip.index import Link
+from pip.req import InstallRequirement
+
+import pip_compile.metadata
+from pip_compile.metadata import (INTERPRETER, MetadataStore, PreviousGraph,
+                                  extract_metadata, metadata_extras,
+                                  metadata_requires, pinned_version,
+                                  requires_python_matches)
+
+PY2 = {'python_version': '2.7'}
+PY3 = {'python_version': '3.6'}
+
+
+@pytest.fixture
+def egg_info_dist(tmpdir):
+    egg_info = tmpdir.join('pkg.egg-info')
+    egg_info.ensure(dir=True)
+    egg_info.join('PKG-INFO').write(
+        'Metadata-Version: 1.1\nName: pkg\nVersion: 1.0\n')
+    egg_info.join('requires.txt').write(
+        'six\n\n[ssl]\npyopenssl\n\n[:python_version < "3"]\nenum34\n')
+    return pkg_resources.Distribution(
+        str(tmpdir),
+        metadata=pkg_resources.PathMetadata(str(tmpdir), str(egg_info)),
+        project_name='pkg', version='1.0')
+
+
+@pytest.fixture
+def dist_info_dist(tmpdir):
+    dist_info = tmpdir.join('pkg-1.0.dist-info')
+    dist_info.ensure(dir=True)
+    dist_info.join('METADATA').write(
+        'Metadata-Version: 2.0\n'
+        'Name: pkg\n'
+        'Version: 1.0\n'
+        'Requires-Python: >=2.7\n'
+        'Requires-Dist: six\n'
+        'Requires-Dist: enum34; python_version < "3"\n'
+        'Requires-Dist: pyopenssl; extra == "ssl"\n'
+        'Provides-Extra: ssl\n')
+    return next(pkg_resources.find_distributions(str(tmpdir)))
+
+
+@pytest.mark.parametrize('dist_fixture', ['egg_info_dist', 'dist_info_dist'])
+def test_dependencies_match_pkg_resources(request, dist_fixture):
+    dist = request.getfixturevalue(dist_fixture)
+    metadata = extract_metadata(dist)
+    assert metadata_extras(metadata) == list(dist.extras)
+    for extras in [], ['ssl']:
+        assert (sorted(map(str, metadata_requires(metadata, extras))) ==
+                sorted(map(str, dist.requires(extras))))
+
+
+def test_egg_info_dependencies_for_environment(egg_info_dist):
+    metadata = extract_metadata(egg_info_dist)
+    assert list(map(str, metadata_requires(metadata, ['ssl'], PY2))) == [
+        'six', 'enum34', 'pyopenssl']
+    assert list(map(str, metadata_requires(metadata, [], PY3))) == ['six']
+
+
+def test_dist_info_dependencies_for_environment(dist_info_dist):
+    metadata = extract_metadata(dist_info_dist)
+    requires = metadata_requires(metadata, ['ssl'], PY2)
+    assert [req.project_name for req in requires] == [
+        'six', 'enum34', 'pyopenssl']
+    requires = metadata_requires(metadata, [], PY3)
+    assert [req.project_name for req in requires] == ['six']
+
+
+def test_requires_python_matches(dist_info_dist):
+    metadata = extract_metadata(dist_info_dist)
+    assert requires_python_matches(metadata, '2.7.13')
+    assert not requires_python_matches(metadata, '2.6.9')
+
+
+@pytest.mark.parametrize('line,expect', [
+    ('pkg==1.0', '1.0'),
+    ('pkg==01.0', '1.0'),
+    ('pkg==1.*', None),
+    ('pkg>=1.0', None),
+    ('pkg==1.0,!=1.1', None),
+    ('pkg', None),
+])
+def test_pinned_version(line, expect):
+    assert pinned_version(InstallRequirement.from_line(line)) == expect
+
+
+def test_pinned_version_link():
+    req = InstallRequirement('pkg==1.0', None,
+                             link=Link('git+ssh://git@server/pkg.git@1.0'))
+    assert pinned_version(req) is None
+
+
+def test_metadata_store_round_trip(tmpdir, egg_info_dist):
+    store = MetadataStore(str(tmpdir))
+    link = Link('https://example.com/pkg-1.0.tar.gz#md5=abc')
+    assert store.get('pkg', '1.0', link=link) is None
+    assert not store.has_version('pkg', '1.0')
+    metadata = extract_metadata(egg_info_dist)
+    store.put(metadata, link)
+    stored = MetadataStore(str(tmpdir)).get('Pkg', '1.0', link=link)
+    assert stored['artifact'] == {'url': 'https://example.com/pkg-1.0.tar.gz',
+                                  'hash_name': 'md5',
+                                  'hash': 'abc'}
+    assert stored['interpreter'] == INTERPRETER
+    del stored['artifact'], stored['interpreter']
+    assert stored == metadata
+    assert MetadataStore(str(tmpdir)).has_version('Pkg', '1.0')
+    assert not MetadataStore(str(tmpdir)).has_version('pkg', '1.1')
+
+
+def test_metadata_store_keys(tmpdir, monkeypatch, egg_info_dist):
+    metadata = extract_metadata(egg_info_dist)
+    sdist = Link('https://example.com/pkg-1.0.tar.gz#sha256=abc')
+    mirrored_sdist = Link('https://mirror.example.com/pkg-1.0.tar.gz'
+                          '#sha256=abc')
+    unhashed_sdist = Link('https://example.com/pkg-1.0.tar.gz')
+    wheel = Link('https://example.com/pkg-1.0-py2.py3-none-any.whl')
+    store = MetadataStore(str(tmpdir))
+    store.put(metadata, sdist)
+    store.put(metadata, wheel)
+    assert store.get('pkg', '1.0', link=mirrored_sdist) is not None
+    assert store.get('pkg', '1.0', link=unhashed_sdist) is None
+    assert store.get('pkg', '1.0') is None
+    monkeypatch.setattr(pip_compile.metadata, 'INTERPRETER', 'pypy-2.7')
+    store = MetadataStore(str(tmpdir))
+    assert store.get('pkg', '1.0', link=sdist) is None
+    assert store.get('pkg', '1.0', link=wheel) is not None
+
+
+def test_metadata_store_in_memory(tmpdir, egg_info_dist):
+    store = MetadataStore()
+    metadata = extract_metadata(egg_info_dist)
+    store.put(metadata)
+    stored = store.get('PKG', '1.0')
+    assert stored.pop('interpreter') == INTERPRETER
+    assert stored == metadata
+    assert store.get('pkg', '2.0') is None
+    assert not tmpdir.join('pip_compile').check()
+
+
+@pytest.fixture
+def previous_graph():
+    graph = PreviousGraph({'Flask==0.11.1': ['Jinja2==2.8', 'Werkzeug==0.11'],
+                           'requests[security]==2.18.1': ['idna==2.5'],
+                           'Jinja2==2.8': ['MarkupSafe==0.23'],
+                           'pkg from git+ssh://git@server/pkg.git': []})
+    graph.constrained_names = {'jinja2', 'werkzeug', 'idna'}
+    return graph
+
+
+def test_previous_graph_reuses_unchanged_pin(previous_graph):
+    metadata = previous_graph.get('flask', '0.11.1')
+    assert list(map(str, metadata_requires(metadata))) == [
+        'Jinja2==2.8', 'Werkzeug==0.11']
+    assert previous_graph.reused == {('flask', '0.11.1', frozenset())}
+
+
+@pytest.mark.parametrize('name,version,extras', [
+    ('Flask', '0.12', ()),
+    ('requests', '2.18.1', ()),
+    ('Jinja2', '2.8', ()),
+    ('pkg', '1.0', ()),
+])
+def test_previous_graph_prepares_changed_packages(previous_graph, name,
+                                                  version, extras):
+    assert previous_graph.get(name, version, extras) is None
+    assert previous_graph.reused == set()
+
+
+def test_previous_graph_extras(previous_graph):
+    metadata = previous_graph.get('requests', '2.18.1', ('Security',))
+    assert metadata_extras(metadata) == ['security']
+    assert list(map(str, metadata_requires(metadata, ['security']))) == [
+        'idna==2.5']
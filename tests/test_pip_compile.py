@@ -1,3 +1,4 @@
+import time
 from contextlib import contextmanager
 from io import StringIO
 from unittest import TestCase
@@ -8,6 +9,8 @@ from pip.index import Link
 from pip.req import InstallRequirement, RequirementSet
 
 import pip_compile
+from pip_compile.metadata import MetadataStore
+from pip_compile.targets import Target
 
 
 class PipCompileRequirementSetTestCase(TestCase):
@@ -130,6 +133,16 @@ class PipCompileRequirementSetTestCase(TestCase):
         self.expected = ['pkg==1.0.1']
         self.expected_editable = [True]
 
+    def test_constraint_with_different_name_normalization(self):
+        """Names differing only in case, - and _ refer to the same package"""
+        self.requirement_set.add_requirement(
+            InstallRequirement('Foo_Bar==1.0', None, constraint=True))
+        self.requirement_set.add_requirement(
+            InstallRequirement('foo-bar', None))
+        assert self.requirement_set.has_requirement('foo.bar')
+        self.expected = ['Foo_Bar==1.0']
+        self.expected_editable = [False]
+
 
 @pytest.mark.parametrize('allow_double,constraints,expect', [
     (False, [], InstallationError),
@@ -189,3 +202,190 @@ class PrintRequirementsTestCase(TestCase):
         self.requirement_set.add_requirement(
             InstallRequirement('pkg==1.0.2-ignored', None))
         self.expected = 'pkg==1.0.1\n'
+
+
+DEPENDENCY_GRAPH = {
+    'a': ['c', 'd', 'b'],
+    'b': ['d', 'e'],
+    'c': ['e', 'f'],
+    'd': ['f'],
+    'e': [],
+    'f': ['g'],
+    'g': [],
+}
+
+
+class FakePreparationRequirementSet(pip_compile.PipCompileRequirementSet):
+    """Prepares requirements from DEPENDENCY_GRAPH instead of the network"""
+    def _prepare_file(self, finder, req_to_install, require_hashes=False,
+                      ignore_dependencies=False):
+        if req_to_install.constraint or req_to_install.prepared:
+            return []
+        req_to_install.prepared = True
+        # Finish later dependencies first to shuffle the completion order
+        time.sleep(0.01 * (ord('g') - ord(req_to_install.name)))
+        more_reqs = []
+        for dependency in DEPENDENCY_GRAPH[req_to_install.name]:
+            more_reqs.extend(self.add_requirement(
+                InstallRequirement(dependency, req_to_install),
+                req_to_install.name))
+        return more_reqs
+
+
+@pytest.mark.parametrize('constraints', [[], ['d==1.0', 'f==2.0', 'b==3.0']])
+def test_concurrent_prepare_files_matches_serial(constraints):
+    results = []
+    for jobs in 1, 4:
+        requirement_set = FakePreparationRequirementSet(
+            None, None, None, session='dummy', jobs=jobs)
+        for constraint in constraints:
+            requirement_set.add_requirement(
+                InstallRequirement(constraint, None, constraint=True))
+        requirement_set.add_requirement(InstallRequirement('a', None))
+        requirement_set.prepare_files(finder=None)
+        results.append(([str(req) for req in requirement_set._to_install()],
+                        requirement_set.to_dict()))
+    assert results[0] == results[1]
+
+
+def test_concurrent_prepare_files_propagates_errors():
+    class FailingRequirementSet(FakePreparationRequirementSet):
+        def _prepare_file(self, finder, req_to_install, **kwargs):
+            if req_to_install.name == 'd':
+                raise InstallationError('d failed')
+            return super(FailingRequirementSet, self)._prepare_file(
+                finder, req_to_install, **kwargs)
+
+    requirement_set = FailingRequirementSet(
+        None, None, None, session='dummy', jobs=4)
+    requirement_set.add_requirement(InstallRequirement('a', None))
+    with pytest.raises(InstallationError):
+        requirement_set.prepare_files(finder=None)
+
+
+def test_prepare_files_from_metadata_store(tmpdir):
+    store = MetadataStore(str(tmpdir))
+    store.put({'name': 'pkg', 'version': '1.0', 'requires_python': None,
+               'requires_txt': [[None, ['dep==2.0']],
+                                ['extra', ['extradep==3.0']]]})
+    store.put({'name': 'dep', 'version': '2.0', 'requires_python': None,
+               'requires_txt': []})
+    store.put({'name': 'extradep', 'version': '3.0', 'requires_python': None,
+               'requires_txt': []})
+    requirement_set = pip_compile.PipCompileRequirementSet(
+        None, None, None, session='dummy', metadata_store=store)
+    requirement_set.add_requirement(InstallRequirement('pkg[extra]==1.0', None))
+    requirement_set.prepare_files(finder=None)
+    assert [str(req) for req in requirement_set._to_install()] == [
+        'dep==2.0 (from pkg[extra]==1.0)',
+        'extradep==3.0 (from pkg[extra]==1.0)',
+        'pkg[extra]==1.0']
+
+
+def test_parse_args_does_not_accumulate_list_options():
+    command = pip_compile.CompileCommand()
+    command.parse_args(['-f', 'links1', '-c', 'constraints1.txt'])
+    options, args = command.parse_args(['-f', 'links2'])
+    assert options.find_links == ['links2']
+    assert options.constraints == []
+    options, args = pip_compile.CompileCommand().parse_args([])
+    assert options.find_links == []
+
+
+@pytest.mark.parametrize('jobs', [1, 4])
+def test_prepare_unnamed_requirements_from_metadata_store(tmpdir, jobs):
+    store = MetadataStore(str(tmpdir.join('cache')))
+    requirement_set = pip_compile.PipCompileRequirementSet(
+        None, None, None, session='dummy', metadata_store=store, jobs=jobs)
+    for name in 'pkg1', 'pkg2':
+        tmpdir.join(name, 'setup.py').write('raise SystemExit(1)\n',
+                                            ensure=True)
+        store.local.put(str(tmpdir.join(name)),
+                        {'name': name, 'version': '1.0',
+                         'requires_python': None,
+                         'requires_txt': [[None, ['dep==2.0']]]})
+        requirement_set.add_requirement(
+            InstallRequirement.from_line(str(tmpdir.join(name))))
+    requirement_set.prepare_unnamed_requirements(finder=None)
+    assert [req.name for req in requirement_set.unnamed_requirements] == [
+        'pkg1', 'pkg2']
+    assert [str(req) for req in requirement_set._to_install()] == [
+        'dep==2.0 (from pkg1==1.0)',
+        'pkg1==1.0 from file://{}'.format(tmpdir.join('pkg1')),
+        'pkg2==1.0 from file://{}'.format(tmpdir.join('pkg2'))]
+
+
+def test_flat_compile_without_session(tmpdir, monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError('--flat built a session')
+
+    monkeypatch.setattr(pip_compile.CompileCommand, '_build_session', fail)
+    tmpdir.join('constraints.txt').write('pkg==1.0\nother==2.0\n')
+    tmpdir.join('local', 'setup.py').write(
+        "from setuptools import setup\n"
+        "setup(name='local', version='0.1', install_requires=['dep'])\n",
+        ensure=True)
+    output = tmpdir.join('requirements.txt')
+    assert pip_compile.CompileCommand().main(
+        ['--flat', '--no-cache-dir',
+         '-c', str(tmpdir.join('constraints.txt')),
+         '-o', str(output), 'pkg', str(tmpdir.join('local'))]) == 0
+    assert output.read() == 'pkg==1.0\nlocal==0.1\n'
+
+
+def test_prepare_files_for_target(tmpdir):
+    store = MetadataStore()
+    store.put({'name': 'pkg', 'version': '1.0', 'requires_python': None,
+               'requires_txt': [[None, []],
+                                [':python_version < "3"', ['dep==2.0']]]})
+    store.put({'name': 'dep', 'version': '2.0', 'requires_python': None,
+               'requires_txt': []})
+    requirement_set = pip_compile.PipCompileRequirementSet(
+        None, None, None, session='dummy', metadata_store=store,
+        target=Target('py27', {'python_version': '2.7'}))
+    requirement_set.add_requirement(InstallRequirement.from_line(
+        'pkg==1.0 ; python_version == "2.7"'))
+    requirement_set.add_requirement(InstallRequirement.from_line(
+        'other==1.0 ; python_version >= "3"'))
+    requirement_set.prepare_files(finder=None)
+    assert [str(req) for req in requirement_set._to_install()] == [
+        'dep==2.0 (from pkg==1.0)', 'pkg==1.0']
+
+
+def test_unpinned_lines():
+    assert pip_compile.unpinned_lines(
+        'pkg==1.0\n'
+        '\n'
+        'git+https://server/repo.git@1.0#egg=repo\n'
+        '-e git+https://server/other.git#egg=other\n'
+        'loose>=1.0\n') == ['loose>=1.0']
+
+
+def test_check(tmpdir, capsys):
+    tmpdir.join('constraints.txt').write('pkg==1.0\nother==2.0\n')
+    lock = tmpdir.join('requirements.txt')
+
+    def check():
+        return pip_compile.CompileCommand().main(
+            ['--flat', '--no-cache-dir',
+             '-c', str(tmpdir.join('constraints.txt')),
+             '--check', str(lock), 'pkg', 'other'])
+
+    lock.write('pkg==1.0\nother==2.0\n')
+    assert check() == 0
+    lock.write('pkg==1.0\nother==1.9\n')
+    assert check() == 1
+    assert '-other==1.9\n+other==2.0\n' in capsys.readouterr()[0]
+    lock.write('pkg==1.0\nother\n')
+    assert check() == 1
+    assert lock.read() == 'pkg==1.0\nother\n'
+
+
+def test_check_ignores_order(tmpdir):
+    tmpdir.join('constraints.txt').write('pkg==1.0\nother==2.0\n')
+    lock = tmpdir.join('requirements.txt')
+    lock.write('other==2.0\n\npkg==1.0\n')
+    assert pip_compile.CompileCommand().main(
+        ['--flat', '--no-cache-dir',
+         '-c', str(tmpdir.join('constraints.txt')),
+         '--check', str(lock), 'pkg', 'other']) == 0
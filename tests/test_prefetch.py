@@ -0,0 +1,106 @@
+import hashlib
+import io
+import os
+
+from pip._vendor import requests
+from pip._vendor.requests.adapters import HTTPAdapter
+from pip._vendor.requests.packages.urllib3.response import HTTPResponse
+from pip.download import url_to_path
+from pip.index import FormatControl, Link
+from pip.req import InstallRequirement
+from pip.wheel import WheelCache
+
+import pip_compile
+from pip_compile.prefetch import Prefetcher
+
+ARTIFACT = b'artifact contents'
+DIGEST = hashlib.sha256(ARTIFACT).hexdigest()
+
+
+class FakeFinder(object):
+    def __init__(self):
+        self.found = []
+
+    def find_requirement(self, req, upgrade):
+        self.found.append(req.name)
+        return Link('https://example.com/files/{}-1.0.tar.gz#sha256={}'
+                    .format(req.name, DIGEST))
+
+
+class FakeAdapter(HTTPAdapter):
+    def __init__(self):
+        super(FakeAdapter, self).__init__()
+        self.urls = []
+
+    def send(self, request, **kwargs):
+        self.urls.append(request.url)
+        raw = HTTPResponse(body=io.BytesIO(ARTIFACT), status=200,
+                           preload_content=False)
+        return self.build_response(request, raw)
+
+
+def prefetcher(jobs=2):
+    adapter = FakeAdapter()
+    session = requests.Session()
+    session.mount('https://', adapter)
+    wheel_cache = WheelCache(None, FormatControl(set(), set()))
+    return Prefetcher(FakeFinder(), session, wheel_cache, jobs), adapter
+
+
+def test_prefetch():
+    fetcher, adapter = prefetcher()
+    with fetcher:
+        fetcher.submit(InstallRequirement.from_line('pkg==1.0'))
+        fetcher.submit(InstallRequirement.from_line('constraint==1.0'),
+                       download=False)
+        fetcher.submit(InstallRequirement.from_line('other==1.0'))
+        link, local_link = fetcher.get(InstallRequirement.from_line(
+            'pkg==1.0'))
+        assert link.url_without_fragment == \
+            'https://example.com/files/pkg-1.0.tar.gz'
+        assert local_link.hash == DIGEST
+        with open(url_to_path(local_link.url_without_fragment), 'rb') as f:
+            assert f.read() == ARTIFACT
+        # Each artifact is handed out once
+        assert fetcher.get(InstallRequirement.from_line('pkg==1.0')) is None
+        assert fetcher.get(InstallRequirement.from_line(
+            'constraint==1.0')) is None
+        assert fetcher.get(InstallRequirement.from_line('other==2.0')) is None
+    assert sorted(fetcher._finder.found) == ['constraint', 'other', 'pkg']
+    assert sorted(adapter.urls) == [
+        'https://example.com/files/other-1.0.tar.gz',
+        'https://example.com/files/pkg-1.0.tar.gz']
+    assert not os.path.exists(fetcher.directory)
+
+
+def test_prefetch_disabled():
+    fetcher, adapter = prefetcher(jobs=0)
+    with fetcher:
+        fetcher.submit(InstallRequirement.from_line('pkg==1.0'))
+        assert fetcher.get(InstallRequirement.from_line('pkg==1.0')) is None
+    assert not fetcher._finder.found
+    assert not fetcher.directory
+
+
+class RecordingPrefetcher(object):
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, install_req, download=True):
+        self.submitted.append(str(install_req.req))
+
+
+def test_requirement_set_prefetches_reachable_constraints():
+    requirement_set = pip_compile.PipCompileRequirementSet(
+        None, None, None, session='dummy')
+    for line in 'pkg==1.0', 'dep==2.0', 'unused==3.0':
+        requirement_set.add_requirement(InstallRequirement.from_line(
+            line, 'constraints.txt', constraint=True))
+    requirement_set.add_requirement(InstallRequirement.from_line('pkg'))
+    requirement_set.add_requirement(InstallRequirement.from_line('loose'))
+    fetcher = RecordingPrefetcher()
+    requirement_set.prefetch(fetcher)
+    assert fetcher.submitted == ['pkg==1.0']
+    requirement_set.add_requirement(InstallRequirement.from_line('dep'),
+                                    parent_req_name='pkg')
+    assert fetcher.submitted == ['pkg==1.0', 'dep==2.0']
@@ -0,0 +1,89 @@
+import gzip
+import io
+
+import pytest
+from pip._vendor import requests
+from pip._vendor.requests.adapters import HTTPAdapter
+from pip._vendor.requests.packages.urllib3._collections import HTTPHeaderDict
+from pip._vendor.requests.packages.urllib3.response import HTTPResponse
+from pip.download import PipSession
+
+from pip_compile.replay import (RecordingAdapter, ReplayAdapter,
+                                TrafficArchive, record, replay)
+
+
+def gzipped(data):
+    buf = io.BytesIO()
+    with gzip.GzipFile(fileobj=buf, mode='wb') as f:
+        f.write(data)
+    return buf.getvalue()
+
+
+class FakeAdapter(HTTPAdapter):
+    """Answers every request with a gzipped body and records request headers"""
+    def __init__(self):
+        super(FakeAdapter, self).__init__()
+        self.sent = []
+
+    def send(self, request, **kwargs):
+        self.sent.append(dict(request.headers))
+        headers = HTTPHeaderDict()
+        headers.add('Content-Type', 'text/html')
+        headers.add('Content-Encoding', 'gzip')
+        headers.add('ETag', '"abc"')
+        raw = HTTPResponse(body=io.BytesIO(gzipped(b'<html>page</html>')),
+                           headers=headers, status=200, reason='OK',
+                           preload_content=False, decode_content=False)
+        return self.build_response(request, raw)
+
+
+def session_with(adapter):
+    session = requests.Session()
+    session.mount('https://', adapter)
+    return session
+
+
+def test_record_and_replay(tmpdir):
+    fake = FakeAdapter()
+    archive = TrafficArchive(str(tmpdir))
+    session = session_with(RecordingAdapter(fake, archive))
+    response = session.get('https://example.com/simple/pkg/',
+                           headers={'If-None-Match': '"old"'})
+    assert response.content == b'<html>page</html>'
+    assert 'If-None-Match' not in fake.sent[0]
+
+    session = session_with(ReplayAdapter(archive))
+    response = session.get('https://example.com/simple/pkg/')
+    assert response.status_code == 200
+    assert response.headers['ETag'] == '"abc"'
+    assert response.content == b'<html>page</html>'
+    streamed = session.get('https://example.com/simple/pkg/', stream=True)
+    assert streamed.raw.read(decode_content=False) == gzipped(
+        b'<html>page</html>')
+    assert len(fake.sent) == 1
+
+    with pytest.raises(requests.ConnectionError) as excinfo:
+        session.get('https://example.com/simple/other/')
+    assert 'was not recorded' in str(excinfo.value)
+
+
+def test_bodies_are_stored_once(tmpdir):
+    archive = TrafficArchive(str(tmpdir))
+    archive.put('GET', 'https://example.com/a', 200, 'OK', [], b'same')
+    archive.put('GET', 'https://example.com/b', 200, 'OK', [], b'same')
+    assert len(tmpdir.join('objects').listdir()) == 1
+    assert len(tmpdir.join('requests').listdir()) == 2
+    assert archive.get('GET', 'https://example.com/a') == (200, 'OK', [],
+                                                            b'same')
+    assert archive.get('HEAD', 'https://example.com/a') is None
+
+
+def test_mount(tmpdir):
+    session = PipSession()
+    record(session, str(tmpdir))
+    assert isinstance(session.get_adapter('https://pypi.python.org/'),
+                      RecordingAdapter)
+    assert not isinstance(session.get_adapter('file:///tmp'),
+                          RecordingAdapter)
+    replay(session, str(tmpdir))
+    assert isinstance(session.get_adapter('http://localhost/'), ReplayAdapter)
@@ -0,0 +1,100 @@
+import os
+import sys
+import threading
+
+import pytest
+from pip._vendor.six import StringIO
+
+import pip_compile.command
+from pip_compile.client import run, split_connect_option
+from pip_compile.server import CompileServer, ServerContext
+
+
+class EchoCommand(object):
+    """Reports the arguments, directory and environment it runs in"""
+    server = None
+
+    def main(self, argv):
+        sys.stdout.write('{} {}\n'.format(' '.join(argv), os.getcwd()))
+        sys.stderr.write('{}\n'.format(os.environ.get('PIP_INDEX_URL')))
+        return 3
+
+
+@pytest.fixture
+def server(tmpdir):
+    server = CompileServer(str(tmpdir.join('pip-compile.sock')), EchoCommand)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    yield server
+    server.shutdown()
+    thread.join()
+    server.server_close()
+
+
+@pytest.mark.parametrize('argv,expect', [
+    (['-c', 'c.txt', 'Flask'], (None, ['-c', 'c.txt', 'Flask'])),
+    (['--connect', 'sock', 'Flask'], ('sock', ['Flask'])),
+    (['Flask', '--connect=sock'], ('sock', ['Flask'])),
+])
+def test_split_connect_option(argv, expect):
+    assert split_connect_option(argv) == expect
+
+
+def test_run_in_server(server, tmpdir, monkeypatch):
+    monkeypatch.chdir(tmpdir)
+    monkeypatch.setenv('PIP_INDEX_URL', 'https://example.com/simple')
+    stdout, stderr = StringIO(), StringIO()
+    assert run(server.server_address, ['-c', 'c.txt'], stdout, stderr) == 3
+    assert stdout.getvalue() == '-c c.txt {}\n'.format(tmpdir)
+    assert stderr.getvalue() == 'https://example.com/simple\n'
+    assert os.getcwd() == str(tmpdir)
+    assert sys.stdout is not None
+
+
+def test_run_without_server(tmpdir):
+    stderr = StringIO()
+    assert run(str(tmpdir.join('missing.sock')), [], StringIO(), stderr) == 1
+    assert 'Could not connect' in stderr.getvalue()
+
+
+def test_server_shares_contexts(server, tmpdir, monkeypatch):
+    monkeypatch.chdir(tmpdir)
+    tmpdir.join('links').ensure(dir=True)
+    command = pip_compile.command.CompileCommand()
+
+    def context(*argv):
+        options, args = command.parse_args(list(argv))
+        return server.context(command, options, None)
+
+    first = context('--no-index', '-f', 'links')
+    assert isinstance(first, ServerContext)
+    assert first is context('--no-index', '-f', str(tmpdir.join('links')))
+    assert first is not context('--no-index')
+    assert first.metadata_store is context('--no-index', '-f',
+                                           'links').metadata_store
+    assert first.metadata_store is not context('--no-index').metadata_store
+
+
+def test_server_requests_keep_index_options_of_their_files(server, tmpdir,
+                                                           monkeypatch):
+    monkeypatch.chdir(tmpdir)
+    command = pip_compile.command.CompileCommand()
+    used = {}
+
+    def record_finder(options, finder, requirement_set, constraints):
+        used[options.requirements[0]] = list(finder.index_urls)
+
+    monkeypatch.setattr(command, 'fail_if_any_unpinned_packages',
+                        record_finder)
+    tmpdir.join('internal.txt').write(
+        '--index-url https://internal.example.com/simple\n')
+    tmpdir.join('public.txt').write(
+        '--index-url https://public.example.com/simple\n')
+    for filename in 'internal.txt', 'public.txt', 'internal.txt':
+        options, args = command.parse_args(['--no-cache-dir', '-r', filename])
+        context = server.context(command, options, None)
+        command.compile(options, args, context)
+        assert used[filename] == [
+            'https://{}.example.com/simple'.format(filename[:-4])]
+    assert ('https://internal.example.com/simple'
+            not in context.finder.index_urls)
@@ -0,0 +1,82 @@
+import sys
+
+import pytest
+
+import pip_compile
+from pip_compile import shortcuts
+from pip_compile.command import CompileCommand
+
+
+def test_default_cache_dir(tmpdir, monkeypatch):
+    monkeypatch.chdir(tmpdir)
+    assert shortcuts.default_cache_dir(
+        ['--cache-dir', 'cache', 'pkg'], {}) == str(tmpdir.join('cache'))
+    assert shortcuts.default_cache_dir(
+        ['--cache-dir=/cache'], {'PIP_CACHE_DIR': '/env'}) == '/cache'
+    assert shortcuts.default_cache_dir([], {'PIP_CACHE_DIR': '/env'}) == \
+        '/env'
+    assert shortcuts.default_cache_dir(['--no-cache-dir'], {}) is None
+    assert shortcuts.default_cache_dir([], {'PIP_NO_CACHE_DIR': '1'}) is None
+
+
+def test_shortcut_key():
+    key = shortcuts.shortcut_key(['pkg'], '/work', {'PIP_PRE': '1'})
+    assert key == shortcuts.shortcut_key(['pkg'], '/work',
+                                         {'PIP_PRE': '1', 'TERM': 'xterm'})
+    assert key != shortcuts.shortcut_key(['pkg'], '/other', {'PIP_PRE': '1'})
+    assert key != shortcuts.shortcut_key(['pkg'], '/work', {})
+    assert key != shortcuts.shortcut_key(['other'], '/work', {'PIP_PRE': '1'})
+
+
+def test_run(tmpdir, monkeypatch, capsys):
+    monkeypatch.chdir(tmpdir)
+    tmpdir.join('constraints.txt').write('pkg==1.0\nother==2.0\n')
+    tmpdir.join('requirements.txt').write('pkg\nother\n')
+    argv = ['--flat', '--resolution-cache',
+            '--cache-dir', str(tmpdir.join('cache')),
+            '-c', 'constraints.txt', '-r', 'requirements.txt',
+            '-o', 'requirements.lock']
+    assert shortcuts.run(argv) is None
+    assert CompileCommand().main(argv) == 0
+    compiled = tmpdir.join('requirements.lock').read()
+    tmpdir.join('requirements.lock').remove()
+    capsys.readouterr()
+
+    assert shortcuts.run(argv) == 0
+    assert tmpdir.join('requirements.lock').read() == compiled
+    assert 'Using cached resolution' in capsys.readouterr()[0]
+    assert shortcuts.run(argv + ['-q']) is None
+
+    check = argv[:-2] + ['--check', 'requirements.lock']
+    assert CompileCommand().main(check) == 0
+    assert shortcuts.run(check) == 0
+    tmpdir.join('requirements.lock').write(
+        ''.join(reversed(compiled.splitlines(True))))
+    assert shortcuts.run(check) == 0
+    tmpdir.join('requirements.lock').write('pkg==1.0\nother==1.0\n')
+    # Differences are left for the full compile to show
+    assert shortcuts.run(check) is None
+
+    tmpdir.join('constraints.txt').write('pkg==1.0\nother==2.1\n')
+    assert shortcuts.run(argv) is None
+
+
+def test_version(monkeypatch, capsys):
+    monkeypatch.setattr(sys, 'argv', ['pip-compile', '--version'])
+    assert pip_compile.main() == 0
+    assert capsys.readouterr()[0] == pip_compile.version_line()
+    assert CompileCommand().main(['-q', '--version']) == 0
+    assert capsys.readouterr()[0] == pip_compile.version_line()
+    assert '(python {}.{})'.format(*sys.version_info[:2]) in \
+        pip_compile.version_line()
+
+
+def test_command_names():
+    import pip_compile.command
+
+    for name in pip_compile.COMMAND_NAMES:
+        assert getattr(pip_compile, name) is getattr(pip_compile.command,
+                                                     name)
+        assert name in dir(pip_compile)
+    with pytest.raises(AttributeError):
+        pip_compile.missing
@@ -0,0 +1,71 @@
+import pytest
+
+from pip_compile.targets import Target, merge_requirements, target_options
+
+
+def test_parse():
+    target = Target.parse('py38-arm:python_version=3.8,platform=linux_aarch64,'
+                          'sys_platform=linux')
+    assert target.name == 'py38-arm'
+    assert dict(target.markers) == {'python_version': '3.8',
+                                    'sys_platform': 'linux'}
+    assert target.tags == {'platform': 'linux_aarch64'}
+    assert target.environment['python_full_version'] == '3.8'
+    assert target.marker() == ('python_version == "3.8" and '
+                               'sys_platform == "linux"')
+    assert target.key == ('py38-arm:python_version=3.8,sys_platform=linux,'
+                          'platform=linux_aarch64')
+    assert ('cp38', 'cp38', 'linux_aarch64') in target.supported_tags()
+    assert Target.parse('native').marker() is None
+
+
+@pytest.mark.parametrize('spec', [':python_version=3.8',
+                                  'py38:python_version',
+                                  'py38:colour=blue'])
+def test_parse_errors(spec):
+    with pytest.raises(Exception):
+        Target.parse(spec)
+
+
+def test_target_options():
+    class Options(object):
+        targets = ['a:python_version=2.7']
+        output = 'requirements-{target}.txt'
+        json_output = '-'
+
+    options = target_options(Options(), Target('a'))
+    assert options.targets == []
+    assert options.output == 'requirements-a.txt'
+    assert options.json_output is None
+
+
+def test_merge_requirements():
+    py27 = Target('py27', {'python_version': '2.7'})
+    py38 = Target('py38', {'python_version': '3.8'})
+    win = Target('win', {'python_version': '3.8', 'sys_platform': 'win32'})
+    assert merge_requirements([
+        (py27, 'six==1.10.0\nenum34==1.1.6\nfuture==0.16.0\n'),
+        (py38, 'six==1.10.0\n'),
+        (win, 'six==1.10.0\nfuture==0.16.0\n'),
+    ]) == ('six==1.10.0\n'
+           'enum34==1.1.6 ; python_version == "2.7"\n'
+           'future==0.16.0 ; python_version == "2.7" or '
+           '(python_version == "3.8" and sys_platform == "win32")\n')
+    with pytest.raises(Exception):
+        merge_requirements([(py27, ''), (Target('native'), 'enum34==1.1.6\n')])
+
+
+@pytest.mark.parametrize('line', [
+    '-e git+https://server/pkg.git@abc#egg=pkg',
+    'git+https://server/pkg.git@abc#egg=pkg',
+    '-e pkg',
+])
+def test_merge_requirements_with_links(line):
+    py27 = Target('py27', {'python_version': '2.7'})
+    py38 = Target('py38', {'python_version': '3.8'})
+    same = '{}\nsix==1.10.0\n'.format(line)
+    assert merge_requirements([(py27, same), (py38, same)]) == same
+    with pytest.raises(Exception) as excinfo:
+        merge_requirements([(py27, same), (py38, 'six==1.10.0\n')])
+    assert 'only pinned for targets py27' in str(excinfo.value)
+    assert '{target}' in str(excinfo.value)
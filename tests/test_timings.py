@@ -0,0 +1,62 @@
+import json
+import threading
+
+import pip.req.req_set
+from pip._vendor.packaging.requirements import Requirement
+from pip.req import InstallRequirement
+
+from pip_compile import timings
+
+
+def test_no_recording():
+    with timings.span('phase'):
+        timings.count('cache.hits')
+        timings.annotate('source', 'prepared', package='pkg')
+    assert timings._active is None
+
+
+def test_recording(tmpdir):
+    path = str(tmpdir.join('timings.json'))
+    unpack_url = pip.req.req_set.unpack_url
+    req = InstallRequirement.from_line('file:///tmp/pkg')
+    with timings.recording(path) as recorder:
+        assert pip.req.req_set.unpack_url is not unpack_url
+        with timings.span('check_pins'):
+            with timings.span('prepare', package=req):
+                with timings.span('egg_info'):
+                    timings.count('cache.misses')
+                req.req = Requirement('pkg==1.0')
+                timings.annotate('source', 'prepared')
+
+            def worker():
+                with timings.span('prepare', package='other'):
+                    timings.count('cache.hits', 3)
+
+            thread = threading.Thread(target=worker, name='worker')
+            thread.start()
+            thread.join()
+    assert pip.req.req_set.unpack_url is unpack_url
+
+    with open(path) as f:
+        report = json.load(f)
+    assert list(report['phases']) == ['check_pins']
+    assert report['counters'] == {'cache.misses': 1, 'cache.hits': 3,
+                                  'cache.hit_rate': 0.75}
+    assert sorted(report['packages']) == ['other', 'pkg']
+    assert sorted(report['packages']['pkg']['seconds']) == ['egg_info',
+                                                            'prepare']
+    assert report['packages']['pkg']['source'] == 'prepared'
+    assert report['packages']['pkg']['cache.misses'] == 1
+    assert report['packages']['other']['cache.hits'] == 3
+
+    events = report['traceEvents']
+    threads = {event['args']['name'] for event in events
+               if event['ph'] == 'M'}
+    assert 'worker' in threads
+    spans = [(event['name'], event['cat'], event['args'].get('package'))
+             for event in events if event['ph'] == 'X']
+    assert spans == [('egg_info', 'package', 'pkg'),
+                     ('prepare', 'package', 'pkg'),
+                     ('prepare', 'package', 'other'),
+                     ('check_pins', 'phase', None)]
+    assert all(event['dur'] >= 0 for event in events if event['ph'] == 'X')
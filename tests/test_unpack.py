@@ -0,0 +1,75 @@
+import hashlib
+import os
+
+from pip.download import path_to_url
+from pip.index import Link
+
+from pip_compile.unpack import UnpackCache, artifact_digest
+
+DIGEST = 'a' * 64
+
+
+def unpacked_sdist(tmpdir, name='pkg', version='1.0', size=0):
+    source_dir = tmpdir.join('build', name)
+    egg_info = source_dir.join('pip-egg-info', '{}.egg-info'.format(name))
+    egg_info.join('PKG-INFO').write(
+        'Metadata-Version: 1.1\nName: {}\nVersion: {}\n'.format(name,
+                                                               version),
+        ensure=True)
+    egg_info.join('requires.txt').write('dep==2.0\n\n[extra]\nother\n')
+    source_dir.join('data').write('x' * size)
+    return str(source_dir), str(egg_info)
+
+
+def test_artifact_digest(tmpdir):
+    assert artifact_digest(Link(
+        'https://server/pkg-1.0.tar.gz#sha256={}'.format(DIGEST))) == DIGEST
+    assert artifact_digest(Link(
+        'https://server/pkg-1.0.tar.gz#md5={}'.format('a' * 32))) is None
+    assert artifact_digest(Link(
+        'https://server/pkg-1.0-py2.py3-none-any.whl#sha256={}'.format(
+            DIGEST))) is None
+    archive = tmpdir.join('pkg-1.0.tar.gz')
+    archive.write_binary(b'archive')
+    assert artifact_digest(Link(path_to_url(str(archive)))) == \
+        hashlib.sha256(b'archive').hexdigest()
+    assert artifact_digest(Link(path_to_url(str(tmpdir)))) is None
+    assert artifact_digest(Link('git+https://server/pkg.git#egg=pkg')) is None
+
+
+def test_put_get(tmpdir):
+    cache = UnpackCache(str(tmpdir.join('cache')))
+    assert cache.get(DIGEST) is None
+    assert DIGEST not in cache
+    cache.put(DIGEST, *unpacked_sdist(tmpdir))
+    assert DIGEST in cache
+    metadata = UnpackCache(str(tmpdir.join('cache'))).get(DIGEST)
+    assert metadata['name'] == 'pkg'
+    assert metadata['version'] == '1.0'
+    assert [requires for _, requires in metadata['requires_txt']] == [
+        ['dep==2.0'], ['other']]
+
+
+def test_entries_per_interpreter(tmpdir):
+    UnpackCache(str(tmpdir.join('cache')), interpreter='cpython-2.7').put(
+        DIGEST, *unpacked_sdist(tmpdir))
+    cache = UnpackCache(str(tmpdir.join('cache')), interpreter='cpython-3.6')
+    assert DIGEST not in cache
+    assert cache.get(DIGEST) is None
+    assert [name for name, _, _ in cache.entries()] == [
+        '{}-cpython-2.7'.format(DIGEST)]
+
+
+def test_evict_least_recently_used(tmpdir):
+    cache = UnpackCache(str(tmpdir.join('cache')), max_size=1)
+    size = 400 * 1024
+    for index, digest in enumerate(['a' * 64, 'b' * 64]):
+        cache.put(digest, *unpacked_sdist(tmpdir, 'pkg{}'.format(index),
+                                          size=size))
+    os.utime(cache._path(cache._name('a' * 64)), (0, 0))
+    assert cache.get('b' * 64)
+    cache.put('c' * 64, *unpacked_sdist(tmpdir, 'pkg2', size=size))
+    # The oldest entry is removed to get under 1 MB
+    assert sorted(name for name, _, _ in cache.entries()) == [
+        cache._name('b' * 64), cache._name('c' * 64)]
+    assert cache.get('c' * 64)['name'] == 'pkg2'
@@ -0,0 +1,94 @@
+import os
+
+import pytest
+from pip._vendor.six import StringIO
+
+from pip_compile import usage
+from pip_compile.usage import UsageIndex, cache_main
+
+
+def cache_entry(cache_dir, relative_path, size, mtime=None):
+    entry = cache_dir.join(relative_path)
+    entry.write('x' * size, ensure=True)
+    if mtime is not None:
+        os.utime(str(entry), (mtime, mtime))
+    return str(entry)
+
+
+def test_recording(tmpdir):
+    cache_dir = tmpdir.join('cache')
+    metadata = cache_entry(cache_dir, 'pip_compile/metadata/pkg/1.0.json',
+                           100)
+    wheel = cache_entry(cache_dir,
+                        'wheels/aa/bb/cc/dd/pkg-1.0-py3-none-any.whl', 300)
+    with usage.recording(str(cache_dir)):
+        usage.hit('metadata', metadata)
+        usage.miss('metadata')
+        usage.use('wheels', os.path.dirname(wheel))
+        # Outside the cache directory
+        usage.use('wheels', str(tmpdir))
+    usage.hit('metadata', metadata)
+
+    index = UsageIndex(str(cache_dir))
+    assert sorted(index.load()['entries']) == [
+        os.path.join('pip_compile', 'metadata', 'pkg', '1.0.json'),
+        os.path.join('wheels', 'aa', 'bb', 'cc', 'dd')]
+    stats = index.stats()
+    assert dict(stats['metadata']) == {'entries': 1, 'size': 100,
+                                       'hits': 1, 'misses': 1}
+    assert dict(stats['wheels']) == {'entries': 1, 'size': 300,
+                                     'hits': 0, 'misses': 0}
+
+
+def test_recording_only_misses(tmpdir):
+    cache_dir = tmpdir.join('cache')
+    with usage.recording(str(cache_dir)):
+        usage.miss('metadata')
+    assert not cache_dir.join(usage.INDEX_PATH).check()
+    with usage.recording(str(cache_dir), max_size=1024):
+        usage.miss('metadata')
+    assert UsageIndex(str(cache_dir)).stats()['metadata']['misses'] == 1
+
+
+def test_prune_least_recently_used(tmpdir):
+    cache_dir = tmpdir.join('cache')
+    cache_entry(cache_dir, 'pip_compile/resolutions/aa/old.json', 1024 * 1024,
+                mtime=1000)
+    used = cache_entry(cache_dir, 'pip_compile/metadata/pkg/1.0.json',
+                       1024 * 1024, mtime=1000)
+    cache_entry(cache_dir, 'wheels/aa/bb/cc/dd/pkg-1.0-py3-none-any.whl',
+                1024 * 1024, mtime=2000)
+    with usage.recording(str(cache_dir)):
+        usage.hit('metadata', used)
+
+    index = UsageIndex(str(cache_dir))
+    assert index.prune(2) == (1, 1024 * 1024)
+    assert not cache_dir.join('pip_compile', 'resolutions', 'aa',
+                              'old.json').exists()
+    assert index.prune(1) == (1, 1024 * 1024)
+    assert not cache_dir.join('wheels', 'aa', 'bb', 'cc', 'dd').exists()
+    assert [entry[1] for entry in index.entries()] == [
+        os.path.join('pip_compile', 'metadata', 'pkg', '1.0.json')]
+
+    # Compiles prune when finishing
+    with usage.recording(str(cache_dir), max_size=0):
+        pass
+    assert index.entries() == []
+
+
+def test_cache_main(tmpdir):
+    cache_dir = tmpdir.join('cache')
+    cache_entry(cache_dir, 'pip_compile/metadata/pkg/1.0.json', 2048)
+    output = StringIO()
+    assert cache_main(['stats', '--cache-dir', str(cache_dir)], output) == 0
+    lines = output.getvalue().splitlines()
+    assert lines[0] == 'Cache directory: {}'.format(cache_dir)
+    assert lines[3].split() == ['metadata', '1', '2.0', 'kB', '0', '0', '-']
+
+    output = StringIO()
+    assert cache_main(['prune', '--max-size', '0',
+                       '--cache-dir', str(cache_dir)], output) == 0
+    assert output.getvalue() == 'Removed 1 entries, 2.0 kB from {}\n'.format(
+        cache_dir)
+    with pytest.raises(SystemExit):
+        cache_main(['prune', '--cache-dir', str(cache_dir)])
@@ -0,0 +1,51 @@
+import hashlib
+
+from pip_compile.utils import (atomic_copy, atomic_write, file_digest,
+                               normalized_output)
+
+
+def test_file_digest(tmpdir):
+    path = tmpdir.join('file.txt')
+    path.write_binary(b'content')
+    assert file_digest(str(path)) == hashlib.sha256(b'content').hexdigest()
+
+
+def test_file_digest_missing_file(tmpdir):
+    assert file_digest(str(tmpdir.join('missing.txt'))) is None
+
+
+def test_atomic_write_creates_directories(tmpdir):
+    path = tmpdir.join('a', 'b', 'file.txt')
+    atomic_write(str(path), b'content')
+    atomic_write(str(path), b'new content')
+    assert path.read_binary() == b'new content'
+    assert tmpdir.join('a', 'b').listdir() == [path]
+
+
+def test_atomic_copy(tmpdir):
+    source = tmpdir.join('source.whl')
+    source.write_binary(b'wheel')
+    target = tmpdir.join('cache', 'target.whl')
+    atomic_copy(str(source), str(target))
+    assert target.read_binary() == b'wheel'
+    assert tmpdir.join('cache').listdir() == [target]
+
+
+def test_normalized_output():
+    assert normalized_output('pkg==1.0\n# comment\n\nother==2.0\n') == \
+        normalized_output('other==2.0\npkg==1.0') == ['other==2.0', 'pkg==1.0']
+    graph = normalized_output(
+        '{\n    "dep==1.0": [],\n'
+        '    "pkg==1.0": [\n        "dep==1.0",\n        "other==2.0"\n    ]'
+        ',\n    "other==2.0": []\n}')
+    assert graph == normalized_output(
+        '{"other==2.0": [], "pkg==1.0": ["other==2.0", "dep==1.0"], '
+        '"dep==1.0": []}')
+    assert graph == ['"dep==1.0": []', '"other==2.0": []',
+                     '"pkg==1.0": ["dep==1.0", "other==2.0"]']
+    ndjson = normalized_output(
+        '{"package": "pkg==1.0", "dependencies": ["dep==1.0"]}\n'
+        '{"package": "dep==1.0", "dependencies": []}\n')
+    assert ndjson == [
+        '{"package": "dep==1.0", "dependencies": []}',
+        '{"package": "pkg==1.0", "dependencies": ["dep==1.0"]}']
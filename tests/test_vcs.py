@@ -0,0 +1,108 @@
+import subprocess
+
+import pytest
+from pip import InstallationError
+from pip.index import Link
+from pip.req import InstallRequirement
+
+import pip_compile.command
+from pip_compile.metadata import MetadataStore
+from pip_compile.vcs import GitMirrors, VcsMetadataStore, is_git_requirement
+
+METADATA = {'name': 'pkg', 'version': '1.0', 'requires_python': None,
+            'requires_txt': [[None, ['dep==2.0']]]}
+
+
+def git(cwd, *args):
+    return subprocess.check_output(
+        ['git', '-c', 'user.name=test', '-c', 'user.email=test@example.com']
+        + list(args), cwd=str(cwd)).decode('ascii').strip()
+
+
+def commit_version(repo, version):
+    repo.join('setup.py').write(
+        "from setuptools import setup\n"
+        "setup(name='pkg', version='{}')\n".format(version), ensure=True)
+    git(repo, 'add', 'setup.py')
+    git(repo, 'commit', '-q', '-m', version)
+    git(repo, 'tag', version)
+    return git(repo, 'rev-parse', 'HEAD')
+
+
+@pytest.fixture
+def repo(tmpdir):
+    repo = tmpdir.join('repo')
+    repo.ensure(dir=True)
+    git(repo, 'init', '-q')
+    git(repo, 'symbolic-ref', 'HEAD', 'refs/heads/master')
+    return repo
+
+
+def test_is_git_requirement():
+    assert is_git_requirement(InstallRequirement.from_line(
+        'git+https://server/pkg.git@1.0#egg=pkg'))
+    assert not is_git_requirement(InstallRequirement.from_editable(
+        'git+https://server/pkg.git@1.0#egg=pkg'))
+    assert not is_git_requirement(InstallRequirement.from_line('pkg==1.0'))
+
+
+def test_resolve_fetches_only_missing_revisions(tmpdir, repo):
+    url = 'file://{}'.format(repo)
+    first = commit_version(repo, '1.0')
+    mirrors = GitMirrors(str(tmpdir.join('cache')))
+    assert mirrors.resolve(url, '1.0') == first
+    assert mirrors.resolve(url, first[:10]) == first
+
+    second = commit_version(repo, '2.0')
+    assert mirrors.resolve(url, '2.0') == second
+    assert mirrors.resolve(url, 'master') == second
+
+    repo.move(tmpdir.join('moved'))
+    # Tags and commits in the mirror don't need the remote
+    assert mirrors.resolve(url, '1.0') == first
+    assert mirrors.resolve(url, second) == second
+    with pytest.raises(InstallationError):
+        mirrors.resolve(url, 'master')
+    assert GitMirrors(str(tmpdir.join('cache')),
+                      offline=True).resolve(url, 'master') == second
+    with pytest.raises(InstallationError):
+        GitMirrors(str(tmpdir.join('cache')), offline=True).resolve(
+            url, '3.0')
+
+
+def test_mirror_link(tmpdir):
+    mirrors = GitMirrors(str(tmpdir))
+    link = mirrors.mirror_link(Link(
+        'git+ssh://git@server/pkg.git@1.0#egg=pkg&subdirectory=src'))
+    assert link.url == 'git+file://{}@1.0#egg=pkg&subdirectory=src'.format(
+        mirrors.path('ssh://git@server/pkg.git'))
+
+
+def test_vcs_metadata_store(tmpdir):
+    link = Link('git+https://server/pkg.git@1.0#egg=pkg')
+    store = VcsMetadataStore(str(tmpdir))
+    store.put(link, 'a' * 40, METADATA)
+    assert VcsMetadataStore(str(tmpdir)).get(
+        Link('git+https://server/pkg.git@master'), 'a' * 40) == METADATA
+    assert store.get(link, 'b' * 40) is None
+    assert store.get(Link('git+https://server/pkg.git@1.0#subdirectory=src'),
+                     'a' * 40) is None
+    assert VcsMetadataStore(str(tmpdir), interpreter='pypy-2.7').get(
+        link, 'a' * 40) is None
+
+
+def test_prepare_files_from_commit_metadata(tmpdir, repo):
+    commit = commit_version(repo, '1.0')
+    link = 'git+file://{}@1.0#egg=pkg'.format(repo)
+    store = MetadataStore()
+    store.vcs.put(Link(link), commit, METADATA)
+    store.put({'name': 'dep', 'version': '2.0', 'requires_python': None,
+               'requires_txt': []})
+    requirement_set = pip_compile.command.PipCompileRequirementSet(
+        None, None, None, session='dummy', metadata_store=store,
+        git_mirrors=GitMirrors(str(tmpdir.join('cache'))))
+    requirement_set.add_requirement(InstallRequirement.from_line(link))
+    requirement_set.add_requirement(InstallRequirement.from_line('dep==2.0'))
+    requirement_set.prepare_files(finder=None)
+    assert [str(req) for req in requirement_set._to_install()] == [
+        'dep==2.0', 'pkg from {}'.format(link)]
@@ -0,0 +1,45 @@
+import os
+
+from pip.req import InstallRequirement, RequirementSet
+from pip.wheel import WheelCache
+
+from pip_compile.wheels import PipCompileWheelBuilder
+
+
+def make_builder(tmpdir, build_one):
+    class FakeWheelBuilder(PipCompileWheelBuilder):
+        _WheelBuilder__build_one = build_one
+
+    requirement_set = RequirementSet(
+        None, None, None, session='dummy',
+        wheel_cache=WheelCache(str(tmpdir.join('cache')), None))
+    return FakeWheelBuilder(requirement_set, None, jobs=2)
+
+
+def test_build_one_stores_wheel_and_time(tmpdir):
+    def build_one(self, req, tempd, python_tag=None):
+        with open(os.path.join(tempd, 'pkg-1.0-py3-none-any.whl'), 'w') as f:
+            f.write('wheel')
+        return True
+
+    builder = make_builder(tmpdir, build_one)
+    output_dir = str(tmpdir.join('output'))
+    wheel_path = builder._build_one(InstallRequirement('pkg==1.0', None),
+                                    output_dir)
+    assert wheel_path == os.path.join(output_dir, 'pkg-1.0-py3-none-any.whl')
+    assert os.listdir(output_dir) == ['pkg-1.0-py3-none-any.whl']
+    assert set(builder.build_times) == {'pkg'}
+
+
+def test_build_one_failure(tmpdir):
+    def build_one(self, req, tempd, python_tag=None):
+        return False
+
+    builder = make_builder(tmpdir, build_one)
+    builder._clean_one = lambda req: True
+    output_dir = tmpdir.join('output')
+    output_dir.ensure(dir=True)
+    assert builder._build_one(InstallRequirement('pkg==1.0', None),
+                              str(output_dir)) is None
+    assert output_dir.listdir() == []
+    assert set(builder.build_times) == {'pkg'}